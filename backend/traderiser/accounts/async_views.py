@@ -0,0 +1,42 @@
+# accounts/async_views.py
+"""
+Async-capable APIView for the hot endpoints served under ASGI.
+
+Authentication, permissions and throttling still run through DRF, in one
+sync_to_async hop per request; the handler itself is a coroutine, so waiting on
+the database or on asyncio.sleep no longer holds a worker thread.
+"""
+from asgiref.sync import sync_to_async
+from rest_framework.views import APIView
+
+
+class AsyncAPIView(APIView):
+    """APIView whose get/post/... handlers are coroutines."""
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            # Resolves request.user, so later handler code can read it without the ORM
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if hasattr(response, '__await__'):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+async def serialize(serializer_class, instance, **kwargs):
+    """Serializer data built off the event loop, for serializers that may touch the ORM."""
+    return await sync_to_async(lambda: serializer_class(instance, **kwargs).data)()
@@ -0,0 +1,144 @@
+# accounts/authentication.py
+"""
+Stateless JWT authentication for the API.
+
+Tokens minted by issue_tokens() carry what most requests need, so
+ClaimsJWTAuthentication builds request.user from them without reading the user
+row:
+- 'sashi', 'staff' and 'active' flags, and 'ver' (the user's token_version)
+- 'accounts', the user's account ids keyed by account type
+
+request.user is then an accounts.models.ClaimsUser: a real User instance whose
+remaining fields are deferred and load together, through a small LRU of full
+users, the first time a view reads one.
+
+User.save() bumps token_version when a claimed flag changes (the Sashi toggle,
+deactivation) and creating an Account bumps it too. A token whose 'ver' is
+behind, or that predates these claims, still authenticates but gets the full
+user instead of its claims; an inactive user is refused either way. Current
+versions are read through the cache, so use a shared CACHES backend when
+running more than one worker.
+"""
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from dashboard import metrics
+from .models import ClaimsUser, User
+
+
+def _version_key(user_id):
+    return f'token_version:{user_id}'
+
+
+def current_token_version(user_id):
+    """The user's token_version, or None when there is no such user."""
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = User.objects.filter(pk=user_id).values_list('token_version', flat=True).first()
+        if version is not None:
+            cache.set(key, version, timeout=getattr(settings, 'AUTH_TOKEN_VERSION_TTL', 300))
+    return version
+
+
+class UserCache:
+    """LRU of full user rows as field values; each lookup builds a fresh instance from them."""
+
+    def __init__(self, max_users, ttl):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._users = OrderedDict()  # user_id -> (expiry, token_version, {attname: value})
+
+    def values(self, user_id, version):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and entry[0] > now and entry[1] == version:
+                self._users.move_to_end(user_id)
+                return entry[2]
+        values = User.objects.filter(pk=user_id).values(*(f.attname for f in User._meta.concrete_fields)).first()
+        if values is None:
+            return None
+        with self._lock:
+            self._users[user_id] = (now + self.ttl, values['token_version'], values)
+            self._users.move_to_end(user_id)
+            if len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return values
+
+    def get(self, user_id, version):
+        values = self.values(user_id, version)
+        if values is None:
+            return None
+        return User.from_db('default', list(values), list(values.values()))
+
+    def discard(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+
+user_cache = UserCache(
+    getattr(settings, 'AUTH_USER_CACHE_SIZE', 1024),
+    getattr(settings, 'AUTH_USER_CACHE_TTL', 60),
+)
+
+
+def _forget(user_id):
+    cache.delete(_version_key(user_id))
+    user_cache.discard(user_id)
+
+
+def forget_user(user_id):
+    """Drop this process's cached copy and the cached token_version, now and again on commit."""
+    _forget(user_id)
+    transaction.on_commit(lambda: _forget(user_id))
+
+
+def bump_token_version(user_id):
+    """Mark every outstanding token of the user as carrying stale claims."""
+    User.objects.filter(pk=user_id).update(token_version=F('token_version') + 1)
+    forget_user(user_id)
+
+
+def issue_tokens(user):
+    """RefreshToken for the user, carrying the claims ClaimsJWTAuthentication reads; its access token copies them."""
+    refresh = RefreshToken.for_user(user)
+    refresh['ver'] = current_token_version(user.pk)
+    refresh['active'] = user.is_active
+    refresh['staff'] = user.is_staff
+    refresh['sashi'] = user.is_sashi
+    refresh['accounts'] = {account.account_type: account.id for account in user.accounts.all()}
+    return refresh
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = int(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, TypeError, ValueError):
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        version = current_token_version(user_id)
+        if version is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        if validated_token.get('ver') == version and 'accounts' in validated_token:
+            user = ClaimsUser.from_claims(user_id, validated_token)
+            metrics.incr('auth.claims')
+        else:
+            # Stale or pre-claims token: the full user, from the LRU when possible
+            user = user_cache.get(user_id, version)
+            if user is None:
+                raise AuthenticationFailed('User not found', code='user_not_found')
+            metrics.incr('auth.full_user')
+        if not user.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        return user
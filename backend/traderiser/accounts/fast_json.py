@@ -0,0 +1,76 @@
+# accounts/fast_json.py
+"""
+orjson-backed JSON renderer and parser for DRF.
+
+FastJSONRenderer is the default application/json renderer. Its output is
+byte-for-byte what rest_framework's JSONRenderer would produce:
+- datetimes, Decimals and other non-JSON types go through DRF's own
+  JSONEncoder.default()
+- \\u2028 and \\u2029 are escaped the same way
+
+Serializer DecimalFields already arrive as exact strings (DRF's
+COERCE_DECIMAL_TO_STRING), so they pass straight through. A Decimal placed in
+a Response directly keeps DRF's float encoding.
+
+A few inputs are left to the stock renderer rather than risk a difference:
+- indented output (the browsable API, or "application/json; indent=4")
+- non-default UNICODE_JSON or COMPACT_JSON settings
+- what orjson refuses: non-string keys, integers beyond 64 bits
+- a Decimal whose float needs an exponent, which orjson writes as 1e-6 or
+  1e16 where json writes 1e-06 or 1e+16
+
+Plain Python floats are written by orjson itself, so one outside
+[1e-4, 1e16) would differ in its exponent; no model here has a FloatField.
+A NaN or infinite float renders as null, where DRF's strict mode raises.
+
+FastJSONParser reads bodies with orjson, and hands any body orjson rejects to
+the stdlib parser so errors read as before. Unlike json, orjson returns an
+integer beyond 64 bits as a float; the serializer fields that read numbers
+reject values that large either way.
+"""
+import codecs
+import io
+import orjson
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME  # Dates and times are formatted by DRF's encoder
+_drf_default = JSONEncoder().default
+
+
+def _default(obj):
+    value = _drf_default(obj)
+    if isinstance(value, float) and value and not 1e-4 <= abs(value) < 1e16:
+        raise TypeError('Exponent form differs from json')  # Falls back to the stock renderer
+    return value
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.ensure_ascii or not self.compact or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_default, option=_OPTIONS)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'\xe2\x80' in ret:  # Lead bytes of both separators; rare, so usually one scan
+            ret = ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        if codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return super().parse(io.BytesIO(body), media_type, parser_context)
@@ -0,0 +1,93 @@
+# accounts/fieldsets.py
+"""
+Sparse fieldsets for list endpoints.
+
+SparseFieldsMixin lets a ModelSerializer render a subset of its fields:
+- fields: the top-level field names to keep, in declaration order; unknown
+  names are ignored, and None or empty keeps every field
+- expand: the nested relations to render as objects; the others render as
+  primary keys. None keeps every nested relation expanded, as before.
+
+Views read both from the query string (?fields=id,profit&expand=market) with
+requested_fields(), and pass the result to the serializer and to narrow(),
+which restricts the queryset to the columns (only()) and joins
+(select_related()) the chosen fields read. A field whose source is not a plain
+column or forward relation (a property, a method, a reverse relation) turns
+only() off, so nothing is ever loaded lazily row by row; its joins are kept.
+
+Nested serializers always render in full.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+def _names(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def requested_fields(request):
+    """Serializer and narrow() kwargs from the request's ?fields= and ?expand=."""
+    params = request.query_params
+    return {
+        'fields': _names(params['fields']) if 'fields' in params else None,
+        'expand': _names(params['expand']) if 'expand' in params else None,
+    }
+
+
+def _columns(serializer, model, prefix, only, related):
+    """Add the lookups `serializer` reads to `only` and its joins to `related`; False if any field isn't a column."""
+    complete = True
+    for field in serializer.fields.values():
+        if field.source == '*':
+            complete = False
+            continue
+        current, path = model, prefix
+        for position, attr in enumerate(field.source_attrs):
+            try:
+                model_field = current._meta.get_field(attr)
+            except FieldDoesNotExist:
+                complete = False
+                break
+            if not model_field.concrete or model_field.many_to_many:
+                complete = False
+                break
+            lookup = path + model_field.name
+            only.add(lookup)
+            if not model_field.is_relation:
+                break
+            if position < len(field.source_attrs) - 1:
+                related.add(lookup)
+                current, path = model_field.related_model, lookup + '__'
+            elif isinstance(field, serializers.BaseSerializer):
+                related.add(lookup)
+                complete = _columns(field, model_field.related_model, lookup + '__', only, related) and complete
+    return complete
+
+
+class SparseFieldsMixin:
+    """ModelSerializer mixin taking `fields` and `expand` kwargs; see the module docstring."""
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        self.selected_fields = fields
+        self.expanded = expand
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.selected_fields:
+            fields = {name: field for name, field in fields.items() if name in self.selected_fields}
+        if self.expanded is not None:
+            for name, field in fields.items():
+                if isinstance(field, serializers.BaseSerializer) and not isinstance(field, serializers.ListSerializer) \
+                        and name not in self.expanded:
+                    fields[name] = serializers.PrimaryKeyRelatedField(source=field.source, read_only=True)
+        return fields
+
+    @classmethod
+    def narrow(cls, queryset, fields=None, expand=None):
+        """`queryset` loading only the columns and joins the serializer reads with these kwargs."""
+        only, related = set(), set()
+        complete = _columns(cls(fields=fields, expand=expand), cls.Meta.model, '', only, related)
+        if related:
+            queryset = queryset.select_related(*sorted(related))
+        return queryset.only(*sorted(only)) if complete else queryset
@@ -0,0 +1,265 @@
+# accounts/idempotency.py
+"""
+Idempotency-Key support for APIView handlers.
+
+The first request with a given key claims a row in IdempotencyKey, runs the
+handler and stores its response. Replays with the same key and body get the
+stored response back without re-running the handler; a duplicate that arrives
+while the first is still running waits for it to finish (asynchronously, for
+coroutine handlers).
+
+Views with an @idempotent handler and throttle_classes mix in IdempotencyMixin,
+which holds the throttles back until the request is known not to be a replay:
+replays and duplicates spend no throttle tokens. Put @idempotent outermost
+among the handler's decorators (above @admission_controlled) for the same reason.
+
+A coroutine handler whose side effects outlive a cancelled request (a shielded
+settlement task) passes that task to settling(). If the client then goes away,
+the key is not released for a retry that would repeat them: it stays claimed
+and stores the task's result once it completes.
+"""
+import asyncio
+import contextvars
+import hashlib
+import inspect
+import json
+import threading
+import time
+from datetime import timedelta
+from functools import partial, wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+WAIT_TIMEOUT = 10  # Seconds a duplicate waits for the in-flight request
+POLL_INTERVAL = 0.05
+
+_inflight = {}  # (user_id, key) -> threading.Event for requests running in this process
+_inflight_lock = threading.Lock()
+_settlement = contextvars.ContextVar('idempotency_settlement', default=None)
+_storing = set()  # Tasks storing the result of a settlement that outlived its request
+
+
+def _fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, cls=JSONEncoder)
+    return hashlib.sha256(f"{request.method} {request.path} {body}".encode()).hexdigest()
+
+
+def _claim(user, key, fingerprint):
+    """Insert the in-flight row; returns None when we own the key, else the existing row."""
+    ttl = getattr(settings, 'IDEMPOTENCY_KEY_TTL', timedelta(hours=24))
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(
+                    user=user, key=key, fingerprint=fingerprint, expires_at=timezone.now() + ttl
+                )
+            return None
+        except IntegrityError:
+            existing = IdempotencyKey.objects.filter(user=user, key=key).first()
+            if existing is None:
+                continue  # Released between our insert and read
+            if existing.expires_at > timezone.now():
+                return existing
+            existing.delete()  # Expired but not yet purged
+    return IdempotencyKey.objects.filter(user=user, key=key).first()
+
+
+def _wait_for(record):
+    """Block until the in-flight request for this key has stored its response."""
+    event = _inflight.get((record.user_id, record.key))
+    if event is not None:
+        event.wait(WAIT_TIMEOUT)  # Owner runs in this process
+        return IdempotencyKey.objects.filter(pk=record.pk).first()
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while record is not None and record.response_status is None and time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)  # Owner runs in another process
+        record = IdempotencyKey.objects.filter(pk=record.pk).first()
+    return record
+
+
+async def _await_for(record):
+    """_wait_for without holding a thread while the owner runs."""
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while record is not None and record.response_status is None and time.monotonic() < deadline:
+        await asyncio.sleep(POLL_INTERVAL)
+        event = _inflight.get((record.user_id, record.key))
+        if event is not None and not event.is_set():
+            continue  # Owner runs in this process and hasn't finished; nothing to read yet
+        record = await IdempotencyKey.objects.filter(pk=record.pk).afirst()
+    return record
+
+
+def _replay(record):
+    response = Response(json.loads(record.response_body) if record.response_body else None,
+                        status=record.response_status)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _begin(request):
+    """Returns (response, key, pending).
+
+    Only one is set: a response to send as-is, the key this request now owns,
+    or the in-flight record of an identical request to wait for.
+    """
+    key = request.headers.get(HEADER)
+    if not key:
+        return None, None, None
+    if len(key) > 64:
+        return Response({'error': f'{HEADER} must be at most 64 characters'},
+                        status=status.HTTP_400_BAD_REQUEST), None, None
+
+    user = request.user
+    fingerprint = _fingerprint(request)
+    existing = _claim(user, key, fingerprint)
+    if existing is not None:
+        if existing.fingerprint != fingerprint:
+            return Response({'error': f'{HEADER} was already used with a different request'},
+                            status=status.HTTP_422_UNPROCESSABLE_ENTITY), None, None
+        if existing.response_status is None:
+            return None, None, existing
+        return _replay(existing), None, None
+
+    with _inflight_lock:
+        _inflight[(user.id, key)] = threading.Event()
+    return None, key, None
+
+
+def _resolve(record):
+    """The response for a duplicate once it has waited on the in-flight `record`."""
+    if record is None:
+        return Response({'error': 'Original request failed; retry'}, status=status.HTTP_409_CONFLICT)
+    if record.response_status is None:
+        response = Response({'error': 'Original request is still in progress'}, status=status.HTTP_409_CONFLICT)
+        response['Retry-After'] = '1'
+        return response
+    return _replay(record)
+
+
+def _throttle(view, request):
+    """Run the throttles IdempotencyMixin held back, now that the request is not a replay."""
+    if getattr(request, '_throttles_deferred', False):
+        request._throttles_deferred = False
+        view.check_throttles(request)
+
+
+def _finish(request, key, response):
+    """Store the owner's response, or release the key when there is none to store."""
+    user = request.user
+    try:
+        if response is None or response.status_code >= 500:
+            # Server errors are not final; let the client retry with the same key
+            IdempotencyKey.objects.filter(user=user, key=key).delete()
+        else:
+            IdempotencyKey.objects.filter(user=user, key=key).update(
+                response_status=response.status_code,
+                response_body=json.dumps(response.data, cls=JSONEncoder) if response.data is not None else '',
+            )
+    finally:
+        with _inflight_lock:
+            event = _inflight.pop((user.id, key), None)
+        if event is not None:
+            event.set()
+
+
+def settling(task):
+    """Mark the current @idempotent request's side effects as started; `task` resolves to its (data, status).
+
+    Does nothing outside an idempotent request.
+    """
+    settlements = _settlement.get()
+    if settlements is not None:
+        settlements.append(task)
+
+
+def _store_settled(request, key, task):
+    """Done callback of a settlement whose request was cancelled: store its result under the key."""
+    response = None
+    if not task.cancelled() and task.exception() is None:
+        data, code = task.result()
+        response = Response(data, status=code)
+    storing = asyncio.ensure_future(sync_to_async(_finish)(request, key, response))
+    _storing.add(storing)
+    storing.add_done_callback(_storing.discard)
+
+
+def idempotent(handler):
+    """Decorate an APIView method so repeats of an Idempotency-Key replay the first response."""
+    if inspect.iscoroutinefunction(handler):
+        @wraps(handler)
+        async def async_wrapper(self, request, *args, **kwargs):
+            response, key, pending = await sync_to_async(_begin)(request)
+            if pending is not None:
+                return _resolve(await _await_for(pending))
+            if response is not None:
+                return response
+            if key is None:
+                await sync_to_async(_throttle)(self, request)
+                return await handler(self, request, *args, **kwargs)
+            response = None
+            settlements = []
+            token = _settlement.set(settlements)
+            try:
+                await sync_to_async(_throttle)(self, request)
+                response = await handler(self, request, *args, **kwargs)
+                return response
+            except asyncio.CancelledError:
+                if settlements:
+                    # The side effects are under way; keep the key until they finish
+                    settlements[-1].add_done_callback(partial(_store_settled, request, key))
+                    key = None
+                raise
+            finally:
+                _settlement.reset(token)
+                if key is not None:
+                    await sync_to_async(_finish)(request, key, response)
+        async_wrapper.idempotent = True
+        return async_wrapper
+
+    @wraps(handler)
+    def wrapper(self, request, *args, **kwargs):
+        response, key, pending = _begin(request)
+        if pending is not None:
+            return _resolve(_wait_for(pending))
+        if response is not None:
+            return response
+        if key is None:
+            _throttle(self, request)
+            return handler(self, request, *args, **kwargs)
+        response = None
+        try:
+            _throttle(self, request)
+            response = handler(self, request, *args, **kwargs)
+            return response
+        finally:
+            _finish(request, key, response)
+    wrapper.idempotent = True
+    return wrapper
+
+
+class IdempotencyMixin:
+    """APIView mixin that throttles @idempotent handlers only once the request is known not to be a replay."""
+
+    def check_throttles(self, request):
+        handler = getattr(self, request.method.lower(), None)
+        if getattr(handler, 'idempotent', False) and not hasattr(request, '_throttles_deferred'):
+            request._throttles_deferred = True  # The decorator runs them after its replay check
+            return
+        super().check_throttles(request)
+
+
+def purge_expired(batch_size=5000):
+    """Delete expired keys in batches; returns the number removed."""
+    removed = 0
+    while True:
+        ids = list(IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return removed
+        removed += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
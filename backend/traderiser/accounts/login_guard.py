@@ -0,0 +1,164 @@
+# accounts/login_guard.py
+"""
+Cheap checks in front of password hashing for LoginView and SignupView.
+
+Before any PBKDF2 work an attempt must pass, in order:
+1. A per-IP sliding window on attempts.
+2. A per-email sliding window on failures.
+3. A negative cache of recently failed email/password pairs. A repeat of one
+   of those pairs fails straight away.
+
+Hashing itself runs in a fixed number of slots, so a credential-stuffing burst
+can use at most LOGIN_HASH_WORKERS cores and trading requests keep the rest.
+All state is per process.
+"""
+import hashlib
+import hmac
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from django.conf import settings
+from django.contrib.auth import authenticate
+from dashboard import metrics
+
+MAX_TRACKED_KEYS = 100000  # Per structure; least recently used keys are forgotten first
+
+
+class LoginRejected(Exception):
+    def __init__(self, message, status_code, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class SlidingWindow:
+    """Approximate sliding-window counter: the previous fixed window, weighted by overlap, plus the current one."""
+
+    def __init__(self, limit, seconds):
+        self.limit = limit
+        self.seconds = seconds
+        self._lock = threading.Lock()
+        self._windows = OrderedDict()  # key -> [window start, previous count, current count]
+
+    def _roll(self, key, now):
+        start = now - now % self.seconds
+        window = self._windows.get(key)
+        if window is None:
+            window = self._windows[key] = [start, 0, 0]
+            if len(self._windows) > MAX_TRACKED_KEYS:
+                self._windows.popitem(last=False)
+        else:
+            self._windows.move_to_end(key)
+            if start - window[0] >= 2 * self.seconds:
+                window[:] = [start, 0, 0]
+            elif start != window[0]:
+                window[:] = [start, window[2], 0]
+        overlap = 1 - (now - start) / self.seconds
+        return window, window[1] * overlap + window[2]
+
+    def blocked(self, key, now=None):
+        """Seconds until the key is back under its limit, or 0."""
+        now = time.time() if now is None else now
+        with self._lock:
+            window, count = self._roll(key, now)
+        if count < self.limit:
+            return 0
+        return max(1, math.ceil(window[0] + self.seconds - now))
+
+    def hit(self, key, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            window, _ = self._roll(key, now)
+            window[2] += 1
+
+
+class NegativeCache:
+    """Keyed HMACs of failed email/password pairs; no password is kept."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # digest -> expiry
+
+    @staticmethod
+    def _digest(email, password):
+        message = f'{email}\0{password}'.encode()
+        return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).digest()
+
+    def __contains__(self, pair):
+        digest = self._digest(*pair)
+        with self._lock:
+            expiry = self._entries.get(digest)
+            if expiry is None:
+                return False
+            if expiry < time.monotonic():
+                del self._entries[digest]
+                return False
+            return True
+
+    def add(self, email, password):
+        digest = self._digest(email, password)
+        with self._lock:
+            self._entries[digest] = time.monotonic() + self.ttl
+            self._entries.move_to_end(digest)
+            if len(self._entries) > MAX_TRACKED_KEYS:
+                self._entries.popitem(last=False)
+
+
+ip_attempts = SlidingWindow(*getattr(settings, 'LOGIN_IP_LIMIT', (30, 60)))
+email_failures = SlidingWindow(*getattr(settings, 'LOGIN_EMAIL_FAILURE_LIMIT', (5, 300)))
+failed_pairs = NegativeCache(getattr(settings, 'LOGIN_NEGATIVE_CACHE_TTL', 300))
+_hash_slots = threading.BoundedSemaphore(getattr(settings, 'LOGIN_HASH_WORKERS', 2))
+
+
+def client_ip(request):
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def check_ip(request):
+    """Count an attempt from this client; raises LoginRejected once the IP is over its limit."""
+    ip = client_ip(request)
+    retry_after = ip_attempts.blocked(ip)
+    if retry_after:
+        metrics.incr('login.rejected.ip')
+        raise LoginRejected('Too many attempts; try again later', 429, retry_after)
+    ip_attempts.hit(ip)
+
+
+@contextmanager
+def hashing_slot():
+    """Hold one of the LOGIN_HASH_WORKERS password-hashing slots."""
+    if not _hash_slots.acquire(timeout=getattr(settings, 'LOGIN_HASH_WAIT', 2)):
+        metrics.incr('login.rejected.busy')
+        raise LoginRejected('Login is busy; retry shortly', 503, 1)
+    try:
+        yield
+    finally:
+        _hash_slots.release()
+
+
+def authenticate_login(request, email, password):
+    """Authenticate behind the per-email checks; returns the user or None, or raises LoginRejected.
+
+    Call check_ip() first.
+    """
+    if not email or not password:
+        return None
+    key = email.strip().lower()
+    retry_after = email_failures.blocked(key)
+    if retry_after:
+        metrics.incr('login.rejected.email')
+        raise LoginRejected('Too many failed attempts for this email; try again later', 429, retry_after)
+    if (key, password) in failed_pairs:
+        metrics.incr('login.negative_cache_hits')
+        email_failures.hit(key)
+        return None
+
+    with hashing_slot():
+        user = authenticate(request, username=email, password=password)
+    if user is None:
+        email_failures.hit(key)
+        failed_pairs.add(key, password)
+    return user
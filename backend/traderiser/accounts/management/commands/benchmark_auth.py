@@ -0,0 +1,47 @@
+import json
+import time
+from types import SimpleNamespace
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+from accounts.authentication import ClaimsJWTAuthentication, issue_tokens
+from accounts.models import User
+
+
+class Command(BaseCommand):
+    help = 'Measure the per-request cost of JWT authentication, per-row lookup versus claims.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', required=True, help='User to authenticate as')
+        parser.add_argument('--requests', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(email=options['email']).first()
+        if user is None:
+            raise CommandError(f"No user with email {options['email']}")
+        cases = [
+            ('simplejwt', JWTAuthentication(), AccessToken.for_user(user)),
+            ('claims', ClaimsJWTAuthentication(), issue_tokens(user).access_token),
+            ('claims_stale_token', ClaimsJWTAuthentication(), AccessToken.for_user(user)),
+        ]
+        for name, authenticator, token in cases:
+            request = SimpleNamespace(META={'HTTP_AUTHORIZATION': f'Bearer {token}'})
+            authenticator.authenticate(request)  # Warm caches
+            queries = 0
+
+            def count(execute, *args):
+                nonlocal queries
+                queries += 1
+                return execute(*args)
+
+            with connection.execute_wrapper(count):
+                started = time.perf_counter()
+                for _ in range(options['requests']):
+                    authenticator.authenticate(request)
+                elapsed = time.perf_counter() - started
+            self.stdout.write(json.dumps({
+                'authenticator': name, 'requests': options['requests'],
+                'microseconds_per_request': round(elapsed / options['requests'] * 1e6, 2),
+                'queries_per_request': round(queries / options['requests'], 3),
+            }))
@@ -0,0 +1,56 @@
+import json
+import time
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from accounts.models import User
+from accounts.provisioning import PROVISION_QUERIES, provision_users
+from wallet import conversion
+
+
+class Command(BaseCommand):
+    help = ('Provision synthetic signups in batches, rolled back afterwards; with --batch 1 (a signup) fail if one '
+            'takes more than the pinned query count. Passwords are left unusable, so hashing is not measured.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--signups', type=int, default=1000)
+        parser.add_argument('--batch', type=int, default=1, help='Signups per provision_users() call')
+        parser.add_argument('--account-type', default='standard')
+
+    def handle(self, *args, **options):
+        account_types = [options['account_type']]
+        if options['account_type'] != 'demo':
+            account_types.append('demo')
+        batches = range(0, options['signups'], options['batch'])
+        queries = 0
+
+        def count(execute, *args):
+            nonlocal queries
+            queries += 1
+            return execute(*args)
+
+        conversion.rates()  # Built once per process, not per signup
+        worst = 0
+        started = time.perf_counter()
+        with transaction.atomic():
+            for start in batches:
+                signups = []
+                for _ in range(start, min(start + options['batch'], options['signups'])):
+                    name = f'bench-{uuid.uuid4().hex[:12]}'
+                    user = User(username=name, email=f'{name}@example.com')
+                    user.set_unusable_password()
+                    signups.append((user, account_types))
+                before = queries
+                with connection.execute_wrapper(count):
+                    provision_users(signups)
+                worst = max(worst, queries - before)
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+
+        self.stdout.write(json.dumps({
+            'signups': options['signups'], 'batch': options['batch'],
+            'queries_per_batch': worst, 'pinned': PROVISION_QUERIES,
+            'microseconds_per_signup': round(elapsed / options['signups'] * 1e6, 2),
+        }))
+        if options['batch'] == 1 and worst > PROVISION_QUERIES:
+            raise CommandError(f'provision_users() ran {worst} queries, more than the pinned {PROVISION_QUERIES}')
@@ -0,0 +1,37 @@
+import json
+import time
+from types import SimpleNamespace
+from django.core.management.base import BaseCommand
+from accounts import throttling
+
+
+class Command(BaseCommand):
+    help = 'Measure the per-check cost of TokenBucketThrottle for each bucket backend.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checks', type=int, default=200000)
+        parser.add_argument('--users', type=int, default=1000, help='Distinct users the checks are spread over')
+        parser.add_argument('--scope', default='trade')
+
+    def handle(self, *args, **options):
+        view = SimpleNamespace(throttle_scope=options['scope'])
+        requests = [
+            SimpleNamespace(user=SimpleNamespace(pk=user_id, is_authenticated=True))
+            for user_id in range(options['users'])
+        ]
+        results = []
+        for name, backend_class in throttling.BACKENDS.items():
+            throttling._backend = backend_class()
+            throttle = throttling.TokenBucketThrottle()
+            allowed = 0
+            started = time.perf_counter()
+            for index in range(options['checks']):
+                allowed += throttle.allow_request(requests[index % len(requests)], view)
+            elapsed = time.perf_counter() - started
+            results.append({
+                'backend': name, 'checks': options['checks'], 'allowed': allowed,
+                'microseconds_per_check': round(elapsed / options['checks'] * 1e6, 2),
+            })
+        throttling._backend = None
+        for result in results:
+            self.stdout.write(json.dumps(result))
@@ -1,9 +1,11 @@
 # accounts/models.py
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.contrib.auth.validators import UnicodeUsernameValidator
 from decimal import Decimal
 from django.apps import apps  # For lazy model loading to avoid circular imports
+from .response_cache import bump_user_state
 
 class User(AbstractUser):
     username_validator = UnicodeUsernameValidator()
@@ -18,10 +20,40 @@ class User(AbstractUser):
     phone = models.CharField(max_length=20, blank=True)
     is_sashi = models.BooleanField(default=False)
     is_email_verified = models.BooleanField(default=False)
+    token_version = models.PositiveIntegerField(default=0)  # Bumped when token claims go stale (accounts.authentication)
+
+    CLAIMED_FIELDS = ('is_active', 'is_staff', 'is_sashi')
 
     def __str__(self):
         return self.username
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        user._stored_claims = {name: user.__dict__[name] for name in cls.CLAIMED_FIELDS if name in user.__dict__}
+        return user
+
+    def _claims_changed(self):
+        stored = getattr(self, '_stored_claims', {})
+        if len(stored) < len(self.CLAIMED_FIELDS):
+            # Deferred when loaded (or built by hand), so there is nothing to compare against yet
+            stored = User.objects.filter(pk=self.pk).values(*self.CLAIMED_FIELDS).first() or {}
+        return any(name in stored and stored[name] != getattr(self, name) for name in self.CLAIMED_FIELDS)
+
+    def save(self, *args, **kwargs):
+        from .authentication import bump_token_version, forget_user
+        update_fields = kwargs.get('update_fields')
+        claims_changed = not self._state.adding and (
+            update_fields is None or set(update_fields) & set(self.CLAIMED_FIELDS)
+        ) and self._claims_changed()
+        super().save(*args, **kwargs)
+        self._stored_claims = {name: self.__dict__[name] for name in self.CLAIMED_FIELDS if name in self.__dict__}
+        if claims_changed:
+            bump_token_version(self.pk)  # An UPDATE ... + 1, so a concurrent bump is not lost
+            self.refresh_from_db(fields=['token_version'])
+        bump_user_state(self.pk)
+        forget_user(self.pk)
+
     def can_create_account(self, account_type):
         """Check if user can create an account of the given type."""
         existing_accounts = self.accounts.all()
@@ -33,6 +65,59 @@ class User(AbstractUser):
             return False
         return True
 
+class ClaimsUser(User):
+    """A User rebuilt from access-token claims by accounts.authentication.ClaimsJWTAuthentication.
+
+    Only id, the claimed flags and token_version are set; the other fields are
+    deferred and all load together the first time one is read.
+    """
+    class Meta:
+        proxy = True
+
+    @classmethod
+    def from_claims(cls, user_id, token):
+        claimed = {
+            'id': user_id,
+            'is_active': token.get('active', True),
+            'is_staff': token.get('staff', False),
+            'is_sashi': token['sashi'],
+            'token_version': token['ver'],
+        }
+        names = [field.attname for field in cls._meta.concrete_fields if field.attname in claimed]
+        user = cls.from_db('default', names, [claimed[name] for name in names])
+        user.account_ids = token['accounts']  # account type -> account id, read by Account.objects.owned_by()
+        return user
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        if fields is not None and from_queryset is None and deferred.issuperset(fields):
+            from .authentication import user_cache
+            values = user_cache.values(self.pk, self.token_version)
+            if values is not None:
+                for name in deferred:
+                    self.__dict__[name] = values[name]
+                return
+        super().refresh_from_db(using, fields, from_queryset)
+
+class AccountQuerySet(models.QuerySet):
+    def with_balance(self):
+        """Annotate the main USD wallet balance so `balance` needs no extra queries."""
+        Wallet = apps.get_model('wallet', 'Wallet')
+        main_wallet = Wallet.objects.filter(
+            account=models.OuterRef('pk'), wallet_type='main', currency__code='USD'
+        ).values('balance')[:1]
+        return self.annotate(main_balance=models.Subquery(main_wallet))
+
+    def owned_by(self, user, account_type):
+        """The user's account of this type, looked up by the id in their access token's claims when it has one.
+
+        The type still matches when that account has been deleted since the token was issued.
+        """
+        account_id = getattr(user, 'account_ids', {}).get(account_type)
+        if account_id is not None:
+            return self.filter(models.Q(pk=account_id) | models.Q(account_type=account_type), user_id=user.pk)
+        return self.filter(user=user, account_type=account_type)
+
 class Account(models.Model):
     ACCOUNT_TYPES = [
         ('standard', 'TradeRiser Standard'),
@@ -45,12 +130,23 @@ class Account(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='accounts')
     account_type = models.CharField(max_length=50, choices=ACCOUNT_TYPES)
 
+    objects = AccountQuerySet.as_manager()
+
     class Meta:
         unique_together = ('user', 'account_type')
 
     @property
     def balance(self):
         """Property to fetch balance from the main USD wallet."""
+        from trading.demo_engine import demo_engine
+        state = demo_engine.peek(self.pk)
+        if state is not None:
+            return state.balance  # Live in-memory demo balance
+        if 'main_balance' in self.__dict__:
+            # Annotated by AccountQuerySet.with_balance()
+            if self.main_balance is not None:
+                return self.main_balance
+            return Decimal('10000.00') if self.account_type == 'demo' else Decimal('0.00')
         try:
             # Lazy-load Wallet and Currency models to avoid circular imports
             Wallet = apps.get_model('wallet', 'Wallet')
@@ -65,6 +161,8 @@ class Account(models.Model):
     @balance.setter
     def balance(self, value):
         """Setter to update the main USD wallet balance."""
+        from trading.demo_engine import demo_engine
+        demo_engine.evict(self.pk)  # Persist and drop any in-memory state first
         Wallet = apps.get_model('wallet', 'Wallet')
         Currency = apps.get_model('wallet', 'Currency')
         usd = Currency.objects.get_or_create(code='USD', defaults={'name': 'US Dollar', 'symbol': '$'})[0]
@@ -75,18 +173,115 @@ class Account(models.Model):
         if not created:
             wallet.balance = value
             wallet.save()  # Triggers wallet signals to sync across all wallets
+        if 'main_balance' in self.__dict__:
+            self.main_balance = value
+
+    def adjust_balance(self, delta):
+        """Add delta to the main USD wallet in one UPDATE; returns the new balance, or None when a debit exceeds it.
+
+        Unlike the balance setter this never writes back a value read earlier, so
+        concurrent trades on one account cannot overwrite each other's changes.
+        """
+        Wallet = apps.get_model('wallet', 'Wallet')
+        wallets = Wallet.objects.filter(account=self, wallet_type='main', currency__code='USD')
+        with transaction.atomic():
+            target = wallets.filter(balance__gte=-delta) if delta < 0 else wallets
+            if not target.update(balance=models.F('balance') + delta, updated_at=timezone.now()):
+                return None
+            wallet_id, balance = wallets.values_list('id', 'balance').get()
+        bump_user_state(self.user_id)
+        from dashboard.events import publish_balance
+        publish_balance(self.user_id, self.pk, balance, wallet_id=wallet_id)
+        if 'main_balance' in self.__dict__:
+            self.main_balance = balance
+        return balance
 
     def save(self, *args, **kwargs):
         is_new = not self.pk
         super().save(*args, **kwargs)  # Save to trigger wallet creation signals
+        bump_user_state(self.user_id)
         if is_new:
+            from .authentication import bump_token_version
+            bump_token_version(self.user_id)  # Tokens list the user's accounts
             # Set initial balance via setter (signals create wallet)
             initial_balance = Decimal('10000.00') if self.account_type == 'demo' else Decimal('0.00')
             self.balance = initial_balance
 
     def reset_demo_balance(self):
-        if self.account_type == 'demo':
-            self.balance = Decimal('10000.00')  # Uses setter to update wallet
+        """Wipe demo history and restore the starting balance using bulk statements only."""
+        if self.account_type != 'demo':
+            return
+        Wallet = apps.get_model('wallet', 'Wallet')
+        ExchangeRate = apps.get_model('wallet', 'ExchangeRate')
+        WalletTransaction = apps.get_model('wallet', 'WalletTransaction')
+        OTPCode = apps.get_model('wallet', 'OTPCode')
+        Transaction = apps.get_model('dashboard', 'Transaction')
+        ArchivedTransaction = apps.get_model('dashboard', 'ArchivedTransaction')
+        ArchivedWalletTransaction = apps.get_model('wallet', 'ArchivedWalletTransaction')
+        initial_balance = Decimal('10000.00')
+        from trading.demo_engine import demo_engine
+        demo_engine.evict(self.pk)
+        with transaction.atomic():
+            # _raw_delete issues one DELETE per table without loading rows into the collector
+            Transaction.objects.filter(account=self)._raw_delete(Transaction.objects.db)
+            OTPCode.objects.filter(transaction__wallet__account=self)._raw_delete(OTPCode.objects.db)
+            WalletTransaction.objects.filter(wallet__account=self)._raw_delete(WalletTransaction.objects.db)
+            ArchivedTransaction.objects.filter(account=self)._raw_delete(ArchivedTransaction.objects.db)
+            ArchivedWalletTransaction.objects.filter(wallet__account=self)._raw_delete(ArchivedWalletTransaction.objects.db)
+            # Single UPDATE; skips the save() signal cascade
+            main_wallet = models.Q(wallet_type='main', currency__code='USD')
+            updated = Wallet.objects.filter(main_wallet, account=self).update(
+                balance=initial_balance, updated_at=timezone.now()
+            )
+            if not updated:
+                self.balance = initial_balance  # Setter creates the missing wallet
+            # Mirror wallets in other currencies (the KSH trading wallet) restart at the same value
+            from wallet import conversion
+            matrix = conversion.rates()
+            mirrors = []
+            for wallet_id, wallet_type, currency_id in Wallet.objects.filter(account=self).exclude(main_wallet) \
+                    .values_list('id', 'wallet_type', 'currency_id'):
+                try:
+                    balance = matrix.convert(initial_balance, 'USD', matrix.code(currency_id)).quantize(Decimal('0.01'))
+                except ExchangeRate.DoesNotExist:
+                    continue  # Unpriced, so never mirrored either
+                Wallet.objects.filter(pk=wallet_id).update(balance=balance, updated_at=timezone.now())
+                mirrors.append((wallet_id, wallet_type, balance))
+        bump_user_state(self.user_id)
+        from dashboard.events import publish_balance
+        if updated:
+            publish_balance(self.user_id, self.pk, initial_balance)
+        for wallet_id, wallet_type, balance in mirrors:
+            publish_balance(self.user_id, self.pk, balance, wallet_type=wallet_type, wallet_id=wallet_id)
+        if 'main_balance' in self.__dict__:
+            self.main_balance = initial_balance
+
+    def __str__(self):
+        return f"{self.user.username} - {self.account_type}"
+
+class IdempotencyKey(models.Model):
+    """Outcome of a request sent with an Idempotency-Key header; see accounts/idempotency.py."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=64)
+    fingerprint = models.CharField(max_length=64)  # sha256 of method, path and body
+    response_status = models.PositiveSmallIntegerField(null=True)  # Null while the request is in flight
+    response_body = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ('user', 'key')
+
+    def __str__(self):
+        return f"{self.user_id} - {self.key}"
+
+
+class RevokedToken(models.Model):
+    """A refresh token that may not be used again; see accounts/revocation.py."""
+    jti = models.CharField(max_length=64, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    revoked_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)  # When the token lapses anyway; the row can go then
 
     def __str__(self):
-        return f"{self.user.username} - {self.account_type}"
\ No newline at end of file
+        return f"{self.user_id} - {self.jti}"
@@ -0,0 +1,93 @@
+# accounts/provisioning.py
+"""
+Signup provisioning in a fixed number of queries.
+
+provision_users() creates users, their accounts and each account's default
+wallets in one transaction with one bulk_create per table:
+- a main USD wallet at the starting balance
+- a trading KSH wallet mirroring it at the current rate
+
+Currencies and rates come from the in-memory rate matrix (wallet.conversion),
+so once it is built a signup always takes PROVISION_QUERIES queries, and a
+burst of signups costs the same per user as a quiet hour. Larger batches add
+an INSERT only where the database caps the rows per statement.
+
+bulk_create skips save() and post_save. New rows have nothing for those hooks
+to do: no cached responses, token version or in-memory demo state to
+invalidate, and no existing wallets to sync.
+"""
+from decimal import Decimal
+from django.db import transaction
+from wallet import conversion
+from wallet.models import Currency, ExchangeRate, Wallet
+from .models import Account, User
+
+# Transaction begin and commit (or savepoint and release), then one INSERT each for users, accounts and
+# wallets; building the rate matrix adds two more the first time
+PROVISION_QUERIES = 5
+CENT = Decimal('0.01')
+DEFAULT_CURRENCIES = {
+    'USD': {'name': 'US Dollar', 'symbol': '$'},
+    'KSH': {'name': 'Kenyan Shilling', 'symbol': 'KSh'},
+}
+
+
+def starting_balance(account_type):
+    return Decimal('10000.00') if account_type == 'demo' else Decimal('0.00')
+
+
+def _rates():
+    """The rate matrix, after creating any missing default currency."""
+    matrix = conversion.rates()
+    missing = [Currency(code=code, **fields) for code, fields in DEFAULT_CURRENCIES.items() if code not in matrix.ids]
+    if missing:
+        # Only on a fresh database; another signup may be creating them too
+        Currency.objects.bulk_create(missing, ignore_conflicts=True)
+        conversion.invalidate()
+        matrix = conversion.rates()
+    return matrix
+
+
+def _prefetch_accounts(user, accounts):
+    """Store accounts as the user's prefetched `accounts`, as prefetch_related() would."""
+    queryset = Account.objects.filter(user=user)
+    queryset._result_cache = accounts
+    queryset._prefetch_done = True
+    user._prefetched_objects_cache = {'accounts': queryset}
+
+
+@transaction.atomic
+def provision_users(signups):
+    """Create each (unsaved user, account types) pair with its accounts and default wallets; returns the users.
+
+    Passwords must already be set. Each user's accounts come back prefetched,
+    with their balance, so issue_tokens() and UserSerializer need no queries.
+    """
+    matrix = _rates()
+    usd, ksh = matrix.currency_id('USD'), matrix.currency_id('KSH')
+    try:
+        rate = matrix.rate('USD', 'KSH')
+    except ExchangeRate.DoesNotExist:
+        rate = None
+    users = User.objects.bulk_create([user for user, _ in signups])
+    accounts = Account.objects.bulk_create([
+        Account(user=user, account_type=account_type)
+        for user, account_types in signups for account_type in account_types
+    ])
+
+    wallets = []
+    by_user = {user.pk: [] for user in users}
+    for account in accounts:
+        balance = starting_balance(account.account_type)
+        account.main_balance = balance  # As AccountQuerySet.with_balance() would annotate
+        by_user[account.user_id].append(account)
+        wallets.append(Wallet(account=account, wallet_type='main', currency_id=usd, balance=balance))
+        wallets.append(Wallet(
+            account=account, wallet_type='trading', currency_id=ksh,
+            balance=(balance * rate).quantize(CENT) if rate else Decimal('0.00'),
+        ))
+    Wallet.objects.bulk_create(wallets)
+
+    for user in users:
+        _prefetch_accounts(user, by_user[user.pk])
+    return users
@@ -0,0 +1,120 @@
+# accounts/response_cache.py
+"""
+Short-lived per-user cache for polled GET endpoints.
+
+Cache keys embed a per-user state version; writes that change what those
+endpoints show call bump_user_state(), which moves the user onto fresh keys.
+Concurrent misses for one key are coalesced so only one request recomputes.
+Use a shared CACHES backend when running more than one worker process.
+
+A version evicted from the cache restarts at the current time in nanoseconds,
+never at a low number: every earlier version of that user was seeded no later
+and bumped far fewer times than nanoseconds have since passed, so no response
+cached under an old version is served again.
+"""
+import asyncio
+import inspect
+import threading
+import time
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+from dashboard import metrics
+
+_fill_locks = {}
+_fill_locks_guard = threading.Lock()
+_async_fill_locks = {}  # Used by coroutine handlers; only touched from the event loop
+_stats = {}  # view name -> [hits, misses]
+_stats_lock = threading.Lock()
+
+
+def _version_key(user_id):
+    return f'user_state:{user_id}'
+
+
+def state_version(user_id):
+    return cache.get_or_set(_version_key(user_id), time.time_ns, timeout=None)
+
+
+def bump_user_state(user_id):
+    """Invalidate every cached response of this user."""
+    if user_id is None:
+        return
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.set(_version_key(user_id), time.time_ns(), timeout=None)
+
+
+def _record(view_name, hit):
+    with _stats_lock:
+        counts = _stats.setdefault(view_name, [0, 0])
+        counts[0 if hit else 1] += 1
+        ratio = counts[0] / (counts[0] + counts[1])
+    metrics.incr(f'response_cache.{view_name}.{"hits" if hit else "misses"}')
+    metrics.set_gauge(f'response_cache.{view_name}.hit_ratio', round(ratio, 4))
+
+
+def _cache_key(view_name, request):
+    user_id = request.user.id
+    return f'resp:{view_name}:{user_id}:{state_version(user_id)}:{request.get_full_path()}'
+
+
+def cached_per_user(view_name):
+    """Cache a GET handler's 200 responses per user for RESPONSE_CACHE_TTL seconds."""
+    def decorator(handler):
+        if inspect.iscoroutinefunction(handler):
+            @wraps(handler)
+            async def async_wrapper(self, request, *args, **kwargs):
+                key = await sync_to_async(_cache_key)(view_name, request)
+                data = await cache.aget(key)
+                if data is not None:
+                    _record(view_name, hit=True)
+                    return Response(data)
+
+                lock = _async_fill_locks.setdefault(key, asyncio.Lock())
+                async with lock:
+                    data = await cache.aget(key)  # Filled while we waited
+                    if data is not None:
+                        _record(view_name, hit=True)
+                        metrics.incr(f'response_cache.{view_name}.coalesced')
+                        return Response(data)
+                    try:
+                        response = await handler(self, request, *args, **kwargs)
+                        if response.status_code == 200:
+                            await cache.aset(key, response.data, getattr(settings, 'RESPONSE_CACHE_TTL', 5))
+                    finally:
+                        _async_fill_locks.pop(key, None)
+                _record(view_name, hit=False)
+                return response
+            return async_wrapper
+
+        @wraps(handler)
+        def wrapper(self, request, *args, **kwargs):
+            key = _cache_key(view_name, request)
+            data = cache.get(key)
+            if data is not None:
+                _record(view_name, hit=True)
+                return Response(data)
+
+            with _fill_locks_guard:
+                lock = _fill_locks.setdefault(key, threading.Lock())
+            with lock:
+                data = cache.get(key)  # Filled while we waited
+                if data is not None:
+                    _record(view_name, hit=True)
+                    metrics.incr(f'response_cache.{view_name}.coalesced')
+                    return Response(data)
+                try:
+                    response = handler(self, request, *args, **kwargs)
+                    if response.status_code == 200:
+                        cache.set(key, response.data, getattr(settings, 'RESPONSE_CACHE_TTL', 5))
+                finally:
+                    with _fill_locks_guard:
+                        _fill_locks.pop(key, None)
+            _record(view_name, hit=False)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,146 @@
+# accounts/revocation.py
+"""
+Refresh-token revocation for TokenRefreshView.
+
+A refresh token is revoked when it is rotated: its jti goes into the
+RevokedToken table and into this process's RevocationList, a Bloom filter in
+front of the table. Almost every jti checked was never revoked, and the filter
+rules those out with a few bit tests and no query; a filter hit is confirmed
+against the table, which also weeds out false positives.
+
+Each process builds its filter from the unexpired rows the first time it needs
+it, sized for twice that many and at least REVOKED_TOKEN_FILTER_CAPACITY. When
+the newest filter is full, another one twice its size is stacked on top rather
+than reloading. The list is only rebuilt, dropping expired entries, after
+purge_expired() has deleted rows.
+
+The table stays the source of truth: revoke() inserts under a unique jti, so a
+token replayed on another worker, whose list has not seen it yet, still fails
+there.
+"""
+import hashlib
+import math
+import threading
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from dashboard import metrics
+from .models import RevokedToken
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        # Double hashing: the k positions come from two halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        step = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + index * step) % self.size for index in range(self.hashes)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationList:
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self._layers = None  # Bloom filters, newest last; None until loaded from the table
+        self._layer_capacity = 0
+        self._layer_count = 0  # jtis in the newest layer
+        self._size = 0
+
+    def _ensure_loaded(self):
+        """The current layers, loaded from the table first if need be.
+
+        Callers use the list returned rather than re-reading self._layers, which
+        a concurrent reset() may set back to None at any time.
+        """
+        layers = self._layers
+        if layers is not None:
+            return layers
+        with self._lock:
+            if self._layers is not None:
+                return self._layers
+            jtis = list(RevokedToken.objects.filter(expires_at__gt=timezone.now()).values_list('jti', flat=True))
+            capacity = max(self.capacity, 2 * len(jtis))
+            bloom = BloomFilter(capacity, self.error_rate)
+            for jti in jtis:
+                bloom.add(jti)
+            self._layer_capacity = capacity
+            self._layer_count = self._size = len(jtis)
+            self._layers = layers = [bloom]
+        metrics.set_gauge('revocation.size', len(jtis))
+        return layers
+
+    def __contains__(self, jti):
+        if not any(jti in layer for layer in self._ensure_loaded()):
+            return False
+        return RevokedToken.objects.filter(jti=jti).exists()
+
+    def add(self, jti):
+        self._ensure_loaded()
+        with self._lock:
+            if self._layers is None:
+                return  # Being rebuilt; the reload reads this jti from the table
+            if self._layer_count >= self._layer_capacity:
+                # Full: grow by stacking a larger filter instead of reloading the table
+                self._layer_capacity *= 2
+                self._layer_count = 0
+                self._layers = self._layers + [BloomFilter(self._layer_capacity, self.error_rate)]
+            self._layers[-1].add(jti)
+            self._layer_count += 1
+            self._size += 1
+            size = self._size
+        metrics.set_gauge('revocation.size', size)
+
+    def reset(self):
+        """Rebuild from the table on next use, e.g. after expired rows were purged."""
+        with self._lock:
+            self._layers = None
+
+
+revoked_tokens = RevocationList(
+    getattr(settings, 'REVOKED_TOKEN_FILTER_CAPACITY', 100000),
+    getattr(settings, 'REVOKED_TOKEN_FILTER_ERROR_RATE', 0.001),
+)
+
+
+def revoke(token):
+    """Revoke a validated refresh token; returns False when it already was, i.e. it is being replayed."""
+    jti = token[api_settings.JTI_CLAIM]
+    try:
+        with transaction.atomic():
+            RevokedToken.objects.create(
+                jti=jti,
+                user_id=int(token[api_settings.USER_ID_CLAIM]),
+                expires_at=datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc),
+            )
+        revoked = True
+    except IntegrityError:
+        revoked = False
+    revoked_tokens.add(jti)
+    return revoked
+
+
+def purge_expired(batch_size=5000):
+    """Delete rows for tokens past their expiry in batches; returns the number removed."""
+    removed = 0
+    while True:
+        ids = list(RevokedToken.objects.filter(expires_at__lte=timezone.now()).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            if removed:
+                revoked_tokens.reset()
+            return removed
+        removed += RevokedToken.objects.filter(id__in=ids).delete()[0]
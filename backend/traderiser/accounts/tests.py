@@ -1,3 +1,281 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import uuid
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+from wallet.models import Currency, ExchangeRate, Wallet
+from .async_views import AsyncAPIView
+from .authentication import issue_tokens
+from .fast_json import FastJSONParser, FastJSONRenderer
+from .idempotency import IdempotencyMixin, idempotent, settling
+from .login_guard import LoginRejected, NegativeCache, SlidingWindow, authenticate_login
+from .models import User, Account, IdempotencyKey
+from .response_cache import bump_user_state, state_version
+from .revocation import RevocationList
+from .throttling import MemoryBuckets, TokenBucketThrottle
 
-# Create your tests here.
+
+class CountingView(IdempotencyMixin, APIView):
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'idempotency-test'
+    calls = 0
+
+    @idempotent
+    def post(self, request):
+        CountingView.calls += 1
+        return Response({'call': CountingView.calls}, status=201)
+
+
+class SettlingView(AsyncAPIView):
+    """Takes its side effect in a shielded task that finishes once `release` is set."""
+    started = release = None
+
+    @idempotent
+    async def post(self, request):
+        async def settle():
+            await self.release.wait()
+            return {'settled': True}, 201
+
+        task = asyncio.ensure_future(settle())
+        settling(task)
+        self.started.set()
+        data, code = await asyncio.shield(task)
+        return Response(data, status=code)
+
+
+class IdempotencyReplayTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='trader', email='trader@example.com', password='pw12345!')
+        CountingView.calls = 0
+        patches = [
+            mock.patch('accounts.throttling._backend', MemoryBuckets()),
+            mock.patch.dict(TokenBucketThrottle._rates, {'idempotency-test': (1, 1 / 60)}),  # One request a minute
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def post(self, key, amount='1.00'):
+        request = APIRequestFactory().post('/count/', {'amount': amount}, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        force_authenticate(request, user=self.user)
+        return CountingView.as_view()(request)
+
+    def test_replay_returns_the_first_response_without_spending_a_token(self):
+        first = self.post('k1')
+        replay = self.post('k1')
+        self.assertEqual((first.status_code, first.data), (201, {'call': 1}))
+        self.assertEqual((replay.status_code, replay.data), (201, {'call': 1}))
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(CountingView.calls, 1)
+
+    def test_key_reused_with_a_different_body_is_refused(self):
+        self.post('k1')
+        self.assertEqual(self.post('k1', amount='2.00').status_code, 422)
+        self.assertEqual(CountingView.calls, 1)
+
+    def test_throttled_request_releases_its_key(self):
+        self.post('k1')
+        self.assertEqual(self.post('k2').status_code, 429)
+        self.assertFalse(IdempotencyKey.objects.filter(user=self.user, key='k2').exists())
+
+
+class IdempotencyCancellationTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='trader', email='trader@example.com', password='pw12345!')
+
+    async def test_cancelled_request_stores_the_settled_response(self):
+        started, release = asyncio.Event(), asyncio.Event()
+        view = SettlingView.as_view(started=started, release=release)
+        request = APIRequestFactory().post('/settle/', {'amount': '1.00'}, format='json', HTTP_IDEMPOTENCY_KEY='k1')
+        force_authenticate(request, user=self.user)
+
+        task = asyncio.create_task(view(request))
+        await started.wait()
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        record = await IdempotencyKey.objects.aget(user=self.user, key='k1')
+        self.assertIsNone(record.response_status)  # Still claimed, not released for a retry
+
+        release.set()
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            record = await IdempotencyKey.objects.aget(user=self.user, key='k1')
+            if record.response_status is not None:
+                break
+        self.assertEqual(record.response_status, 201)
+        self.assertEqual(json.loads(record.response_body), {'settled': True})
+
+    async def test_duplicate_waits_for_the_in_flight_request_without_blocking(self):
+        started, release = asyncio.Event(), asyncio.Event()
+        view = SettlingView.as_view(started=started, release=release)
+        requests = []
+        for _ in range(2):
+            request = APIRequestFactory().post('/settle/', {'amount': '1.00'}, format='json', HTTP_IDEMPOTENCY_KEY='k1')
+            force_authenticate(request, user=self.user)
+            requests.append(request)
+
+        first = asyncio.create_task(view(requests[0]))
+        await started.wait()
+        duplicate = asyncio.create_task(view(requests[1]))
+        await asyncio.sleep(0.2)
+        self.assertFalse(duplicate.done())
+        release.set()  # Needs the sync thread to store the response, so a blocking wait would deadlock
+
+        first, duplicate = await asyncio.gather(first, duplicate)
+        self.assertEqual((first.status_code, first.data), (201, {'settled': True}))
+        self.assertEqual((duplicate.status_code, duplicate.data), (201, {'settled': True}))
+        self.assertEqual(duplicate['Idempotent-Replayed'], 'true')
+
+
+class ResponseCacheVersionTests(TestCase):
+    def test_evicted_version_never_restarts_below_one_already_used(self):
+        bump_user_state(7)
+        used = state_version(7)
+        cache.delete('user_state:7')  # As a LocMem cull would
+        self.assertGreater(state_version(7), used)
+        cache.delete('user_state:7')
+        bump_user_state(7)  # Bumping an evicted version reseeds it too
+        self.assertGreater(state_version(7), used)
+
+
+class UserClaimsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='trader', email='trader@example.com', password='pw12345!')
+
+    def test_save_without_a_claim_change_is_a_single_update(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.phone = '0700000000'
+        with self.assertNumQueries(1):
+            user.save()
+        self.assertEqual(User.objects.get(pk=user.pk).token_version, user.token_version)
+
+    def test_claim_change_bumps_the_token_version(self):
+        user = User.objects.get(pk=self.user.pk)
+        version = user.token_version
+        user.is_sashi = True
+        user.save(update_fields=['is_sashi'])
+        self.assertEqual(user.token_version, version + 1)
+        self.assertEqual(User.objects.get(pk=user.pk).token_version, version + 1)
+
+    def test_claimed_account_deleted_since_the_token_was_issued_falls_back_to_its_type(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.account_ids = {'standard': Account.objects.create(user=user, account_type='standard').pk}
+        Account.objects.filter(user=user).delete()
+        replacement = Account.objects.create(user=user, account_type='standard')
+        self.assertEqual(Account.objects.owned_by(user, 'standard').get(), replacement)
+
+
+class ResetDemoBalanceTests(TestCase):
+    def test_reset_restores_the_main_wallet_and_its_mirror(self):
+        user = User.objects.create_user(username='trader', email='trader@example.com', password='pw12345!')
+        account = Account.objects.create(user=user, account_type='demo')
+        usd = Currency.objects.get_or_create(code='USD', defaults={'name': 'US Dollar'})[0]
+        ksh = Currency.objects.get_or_create(code='KSH', defaults={'name': 'Kenyan Shilling', 'symbol': 'KSh'})[0]
+        ExchangeRate.objects.update_or_create(base_currency=usd, target_currency=ksh, defaults={
+            'live_rate': Decimal('130'), 'admin_withdrawal_rate': Decimal('125'),
+        })
+        main = Wallet.objects.update_or_create(account=account, wallet_type='main', currency=usd,
+                                               defaults={'balance': Decimal('50.00')})[0]
+        mirror = Wallet.objects.update_or_create(account=account, wallet_type='trading', currency=ksh,
+                                                 defaults={'balance': Decimal('6500.00')})[0]
+        version = state_version(user.id)
+
+        account.reset_demo_balance()
+
+        main.refresh_from_db()
+        mirror.refresh_from_db()
+        self.assertEqual(main.balance, Decimal('10000.00'))
+        self.assertEqual(mirror.balance, Decimal('1300000.00'))
+        self.assertGreater(state_version(user.id), version)
+
+
+class RevocationListTests(TestCase):
+    def test_membership_survives_a_reset_right_after_loading(self):
+        class ResetRightAfterLoading(RevocationList):
+            def _ensure_loaded(self):
+                layers = super()._ensure_loaded()
+                self.reset()  # As purge_expired() on another thread could
+                return layers
+
+        self.assertNotIn('never-revoked', ResetRightAfterLoading(100, 0.01))
+
+
+class TokenBucketTests(TestCase):
+    def test_burst_up_to_capacity_then_refill_at_the_rate(self):
+        now = [100.0]
+        buckets = MemoryBuckets()
+        buckets.clock = lambda: now[0]
+        self.assertEqual([buckets.take('trade:1', 2, 1.0) for _ in range(2)], [0.0, 0.0])
+        self.assertAlmostEqual(buckets.take('trade:1', 2, 1.0), 1.0)  # Empty: a token in one second
+        self.assertEqual(buckets.take('trade:2', 2, 1.0), 0.0)  # Other users have their own bucket
+        now[0] += 1
+        self.assertEqual(buckets.take('trade:1', 2, 1.0), 0.0)
+
+
+class LoginLockoutTests(TestCase):
+    def setUp(self):
+        User.objects.create_user(username='trader', email='trader@example.com', password='pw12345!')
+        patches = [
+            mock.patch('accounts.login_guard.email_failures', SlidingWindow(2, 60)),
+            mock.patch('accounts.login_guard.failed_pairs', NegativeCache(300)),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.request = APIRequestFactory().post('/api/accounts/login/')
+
+    def test_failures_lock_the_email_even_for_the_right_password(self):
+        for password in ('wrong-1', 'wrong-2'):
+            self.assertIsNone(authenticate_login(self.request, 'trader@example.com', password))
+        with self.assertRaises(LoginRejected) as rejected:
+            authenticate_login(self.request, 'Trader@Example.com ', 'pw12345!')
+        self.assertEqual(rejected.exception.status_code, 429)
+        self.assertGreater(rejected.exception.retry_after, 0)
+
+    def test_lockout_lifts_once_the_window_has_passed(self):
+        window = SlidingWindow(2, 60)
+        window.hit('trader@example.com', now=1000)
+        window.hit('trader@example.com', now=1001)
+        self.assertEqual(window.blocked('trader@example.com', now=1002), 18)  # Until its window (960-1020) ends
+        self.assertEqual(window.blocked('trader@example.com', now=1140), 0)
+
+
+class TokenRefreshTests(TestCase):
+    def test_rotated_refresh_token_is_rejected_on_replay(self):
+        user = User.objects.create_user(username='trader', email='trader@example.com', password='pw12345!')
+        client = APIClient()
+        original = str(issue_tokens(user))
+
+        rotated = client.post('/api/token/refresh/', {'refresh': original}, format='json')
+        self.assertEqual(rotated.status_code, 200)
+        replayed = client.post('/api/token/refresh/', {'refresh': original}, format='json')
+        self.assertEqual((replayed.status_code, replayed.data), (401, {'error': 'Token has been revoked'}))
+        self.assertEqual(client.post('/api/token/refresh/', {'refresh': rotated.data['refresh']}, format='json').status_code, 200)
+
+
+class FastJSONTests(SimpleTestCase):
+    def test_output_is_byte_identical_to_drf(self):
+        samples = [
+            None,
+            {'amount': '12.50', 'nested': [1, 2.5, True, None, 'caf\u00e9']},
+            {'when': datetime(2026, 1, 2, 3, 4, 5, 678901, tzinfo=dt_timezone.utc), 'day': date(2026, 1, 2)},
+            {'id': uuid.UUID(int=1), 'decimal': Decimal('1.10'), 'tiny': Decimal('0.000001'), 'huge': 2 ** 70},
+            {'separators': 'a\u2028b\u2029c', 1: 'non-string key'},
+        ]
+        for data in samples:
+            with self.subTest(data=data):
+                self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_parser_matches_drf(self):
+        body = b'{"amount": "1.00", "market_id": 3, "flags": [true, null], "ratio": 0.5}'
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body)))
@@ -0,0 +1,121 @@
+# accounts/throttling.py
+"""
+Token-bucket throttling per user and scope.
+
+A view opts in with `throttle_classes = [TokenBucketThrottle]` and a
+`throttle_scope`. The scope's rate in REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']
+("30/min") is both the bucket size and how many tokens refill per period, so a
+client can burst up to the full rate and then keeps the steady pace.
+
+THROTTLE_BUCKET_BACKEND picks where buckets live:
+- 'memory' (default) keeps them per process.
+- 'cache' keeps them in the CACHES backend, shared by every worker. It reads
+  and writes without a lock, so near-simultaneous requests in different
+  workers can each spend the same last token.
+"""
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+from dashboard import metrics
+
+MAX_MEMORY_BUCKETS = 100000  # Least recently used buckets are dropped (reset to full) past this
+
+
+class MemoryBuckets:
+    clock = time.monotonic
+
+    def __init__(self, max_buckets=MAX_MEMORY_BUCKETS):
+        self.max_buckets = max_buckets
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # key -> (tokens, last refill time)
+
+    def take(self, key, capacity, per_second):
+        """Spend one token; returns 0 when allowed, else seconds until a token is available."""
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = capacity
+                if len(self._buckets) >= self.max_buckets:
+                    self._buckets.popitem(last=False)
+            else:
+                tokens = min(capacity, bucket[0] + (now - bucket[1]) * per_second)
+                self._buckets.move_to_end(key)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / per_second
+
+
+class CacheBuckets:
+    """The same bucket, stored as its theoretical arrival time (GCRA) in one cache key."""
+    clock = time.time  # Shared by every worker, so wall-clock rather than monotonic
+
+    def take(self, key, capacity, per_second):
+        now = self.clock()
+        interval = 1 / per_second
+        burst = capacity * interval
+        key = f'throttle:{key}'
+        arrival = max(cache.get(key) or now, now) + interval
+        if arrival - now > burst:
+            return arrival - now - burst
+        cache.set(key, arrival, timeout=int(burst) + 1)
+        return 0.0
+
+
+BACKENDS = {'memory': MemoryBuckets, 'cache': CacheBuckets}
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = BACKENDS[getattr(settings, 'THROTTLE_BUCKET_BACKEND', 'memory')]()
+    return _backend
+
+
+class TokenBucketThrottle(BaseThrottle):
+    _rates = {}  # scope -> (capacity, tokens per second), parsed once
+
+    def allow_request(self, request, view):
+        if not request.user.is_authenticated:
+            return True
+        self.wait_time = self.take(getattr(view, 'throttle_scope', None), request.user.pk)
+        return not self.wait_time
+
+    def wait(self):
+        return self.wait_time
+
+    @classmethod
+    def take(cls, scope, user_id):
+        """Spend one of the user's tokens for `scope`; returns 0 when allowed, else seconds to wait.
+
+        Buckets are keyed by scope and user, so other entry points (the order-entry
+        WebSocket) share the HTTP views' limit by calling this directly.
+        """
+        rate = cls.get_rate(scope)
+        if rate is None:
+            return 0.0
+        capacity, per_second = rate
+        wait_time = get_backend().take(f'{scope}:{user_id}', capacity, per_second)
+        if wait_time:
+            metrics.incr(f'throttle.{scope}.rejected')
+        return wait_time
+
+    @classmethod
+    def get_rate(cls, scope):
+        """(capacity, tokens per second) for a scope, or None when it has no rate."""
+        if scope not in cls._rates:
+            rates = getattr(settings, 'REST_FRAMEWORK', {}).get('DEFAULT_THROTTLE_RATES', {})
+            rate = rates.get(scope)
+            if rate is None:
+                cls._rates[scope] = None
+            else:
+                count, period = rate.split('/')
+                seconds = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+                cls._rates[scope] = (int(count), int(count) / seconds)
+        return cls._rates[scope]
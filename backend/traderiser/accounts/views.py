@@ -1,10 +1,26 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import RefreshToken
-from django.contrib.auth import authenticate
+from django.db.models import Prefetch, prefetch_related_objects
 from .models import User, Account
 from .serializers import UserSerializer, AccountSerializer
+from .response_cache import cached_per_user
+from .authentication import issue_tokens
+from .provisioning import provision_users
+from .revocation import revoke, revoked_tokens
+from dashboard import metrics
+from .login_guard import LoginRejected, authenticate_login, check_ip, hashing_slot
+
+
+def _rejected(exc):
+    response = Response({'error': str(exc)}, status=exc.status_code)
+    if exc.retry_after:
+        response['Retry-After'] = str(exc.retry_after)
+    return response
+
 
 class SignupView(APIView):
     permission_classes = [permissions.AllowAny]
@@ -21,9 +37,10 @@ class SignupView(APIView):
             return Response({'error': 'Email and password are required'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
+            check_ip(request)
             existing_user = User.objects.get(email=email)
             # Existing user - add account if password matches and can create
-            if not existing_user.check_password(password):
+            if authenticate_login(request, email, password) is None:
                 return Response({'error': 'Invalid password for existing email'}, status=status.HTTP_401_UNAUTHORIZED)
 
             if not existing_user.can_create_account(account_type):
@@ -31,7 +48,7 @@ class SignupView(APIView):
                                status=status.HTTP_400_BAD_REQUEST)
 
             Account.objects.create(user=existing_user, account_type=account_type)
-            refresh = RefreshToken.for_user(existing_user)
+            refresh = issue_tokens(existing_user)
             return Response({
                 'refresh': str(refresh),
                 'access': str(refresh.access_token),
@@ -39,28 +56,31 @@ class SignupView(APIView):
             }, status=status.HTTP_200_OK)
 
         except User.DoesNotExist:
-            # New user
+            # New user: hash first, then create the user, accounts and wallets in one go
             serializer = UserSerializer(data={
                 'username': data.get('username'),
                 'email': email,
                 'phone': data.get('phone'),
             })
-            if serializer.is_valid():
-                user = serializer.save()
-                user.set_password(password)
-                user.save()
-                # Create the requested account (real or demo)
-                Account.objects.create(user=user, account_type=account_type)
-                # Auto-create demo account if a real account is created
-                if account_type != 'demo' and not user.accounts.filter(account_type='demo').exists():
-                    Account.objects.create(user=user, account_type='demo')
-                refresh = RefreshToken.for_user(user)
-                return Response({
-                    'refresh': str(refresh),
-                    'access': str(refresh.access_token),
-                    'user': UserSerializer(user).data
-                }, status=status.HTTP_201_CREATED)
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            user = User(**serializer.validated_data)
+            try:
+                with hashing_slot():
+                    user.set_password(password)
+            except LoginRejected as exc:
+                return _rejected(exc)
+            # Auto-create a demo account alongside a real one
+            account_types = [account_type] if account_type == 'demo' else [account_type, 'demo']
+            provision_users([(user, account_types)])
+            refresh = issue_tokens(user)
+            return Response({
+                'refresh': str(refresh),
+                'access': str(refresh.access_token),
+                'user': UserSerializer(user).data
+            }, status=status.HTTP_201_CREATED)
+        except LoginRejected as exc:
+            return _rejected(exc)
 
 class CreateAdditionalAccountView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -94,9 +114,16 @@ class LoginView(APIView):
         if account_type not in [choice[0] for choice in Account.ACCOUNT_TYPES]:
             return Response({'error': 'Invalid account type'}, status=status.HTTP_400_BAD_REQUEST)
 
-        user = authenticate(username=email, password=password)
-        if user and user.accounts.filter(account_type=account_type).exists():
-            refresh = RefreshToken.for_user(user)
+        try:
+            check_ip(request)
+            user = authenticate_login(request, email, password)
+        except LoginRejected as exc:
+            return _rejected(exc)
+        if user:
+            # One query for the accounts and their balances, reused by UserSerializer
+            prefetch_related_objects([user], Prefetch('accounts', queryset=Account.objects.with_balance()))
+        if user and any(account.account_type == account_type for account in user.accounts.all()):
+            refresh = issue_tokens(user)
             return Response({
                 'refresh': str(refresh),
                 'access': str(refresh.access_token),
@@ -105,26 +132,59 @@ class LoginView(APIView):
             }, status=status.HTTP_200_OK)
         return Response({'error': 'Invalid credentials or account type not found'}, status=status.HTTP_401_UNAUTHORIZED)
 
+class TokenRefreshView(APIView):
+    """Trade a refresh token for new access and refresh tokens; the old refresh token is revoked."""
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []  # The access token being replaced has usually expired
+
+    def post(self, request):
+        raw_token = request.data.get('refresh')
+        if not raw_token:
+            return Response({'error': 'refresh is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            refresh = RefreshToken(raw_token)
+        except TokenError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_401_UNAUTHORIZED)
+        if refresh[api_settings.JTI_CLAIM] in revoked_tokens or not revoke(refresh):
+            metrics.incr('auth.refresh.reused')
+            return Response({'error': 'Token has been revoked'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        user = User.objects.filter(pk=refresh[api_settings.USER_ID_CLAIM], is_active=True).prefetch_related('accounts').first()
+        if user is None:
+            return Response({'error': 'User not found or inactive'}, status=status.HTTP_401_UNAUTHORIZED)
+        rotated = issue_tokens(user)  # Fresh claims, e.g. after a Sashi toggle
+        metrics.incr('auth.refresh.rotated')
+        return Response({
+            'refresh': str(rotated),
+            'access': str(rotated.access_token),
+        }, status=status.HTTP_200_OK)
+
 class SashiToggleView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request):
         account_type = request.data.get('account_type', 'standard')
         try:
-            account = Account.objects.get(user=request.user, account_type=account_type)
+            account = Account.objects.owned_by(request.user, account_type).get()
             if account.account_type == 'demo':
                 return Response({'error': 'Demo accounts cannot toggle Sashi status'}, 
                                status=status.HTTP_400_BAD_REQUEST)
             user = request.user
             user.is_sashi = not user.is_sashi
-            user.save()
-            return Response({'is_sashi': user.is_sashi}, status=status.HTTP_200_OK)
+            user.save()  # Bumps token_version; the new tokens carry the new flag
+            refresh = issue_tokens(user)
+            return Response({
+                'is_sashi': user.is_sashi,
+                'refresh': str(refresh),
+                'access': str(refresh.access_token),
+            }, status=status.HTTP_200_OK)
         except Account.DoesNotExist:
             return Response({'error': 'Account not found'}, status=status.HTTP_404_NOT_FOUND)
 
 class AccountDetailView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    @cached_per_user('account_detail')
     def get(self, request):
         user = request.user
         serializer = UserSerializer(user)
@@ -137,10 +197,8 @@ class ResetDemoBalanceView(APIView):
 
     def post(self, request):
         try:
-            account = Account.objects.get(user=request.user, account_type='demo')
+            account = Account.objects.owned_by(request.user, 'demo').get()
             account.reset_demo_balance()
-            from dashboard.models import Transaction
-            Transaction.objects.filter(account=account).delete()
             return Response({
                 'balance': account.balance,
                 'message': 'Demo balance reset to 10,000 USD'
@@ -0,0 +1,101 @@
+# dashboard/archive.py
+"""
+Cold storage for history rows.
+
+archive_rows() moves rows older than the cutoff into their Archived* table in
+keyset batches; MergedHistory lets history views read live and archived rows as
+one ordered sequence, only touching the archive when a read reaches past the
+cutoff.
+"""
+import heapq
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+
+def archive_cutoff():
+    """Rows older than this live in the archive tables."""
+    return timezone.now() - timedelta(days=getattr(settings, 'HISTORY_ARCHIVE_AFTER_DAYS', 365))
+
+
+def archive_rows(model, archive_model, date_field, cutoff, batch_size=2000, extra_filter=None, before_delete=None):
+    """Copy rows older than cutoff into archive_model and delete them, one batch per transaction."""
+    field_names = [field.attname for field in model._meta.concrete_fields]
+    rows_qs = model.objects.filter(**{f'{date_field}__lt': cutoff}, **(extra_filter or {})).order_by('pk')
+    total = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            rows = list(rows_qs.filter(pk__gt=last_pk).values(*field_names)[:batch_size])
+            if not rows:
+                break
+            archive_model.objects.bulk_create([archive_model(**row) for row in rows], ignore_conflicts=True)
+            ids = [row['id'] for row in rows]
+            if before_delete:
+                before_delete(ids)
+            # _raw_delete skips the collector, which would load every row again
+            model.objects.filter(pk__in=ids)._raw_delete(model.objects.db)
+        total += len(rows)
+        last_pk = ids[-1]
+    return total
+
+
+class MergedHistory:
+    """
+    Read-only union of a live and an archive queryset sharing the ordering columns.
+
+    Supports the subset of the QuerySet API used by the history views and DRF's
+    CursorPagination: filter(), order_by(), values(), only(), select_related(),
+    slicing and iteration.
+    """
+
+    def __init__(self, live, archived, ordering, cutoff=None):
+        self.live = live.order_by(*ordering)
+        self.archived = archived.order_by(*ordering)
+        self.ordering = tuple(ordering)
+        self.cutoff = cutoff or archive_cutoff()
+
+    def filter(self, *args, **kwargs):
+        return MergedHistory(self.live.filter(*args, **kwargs), self.archived.filter(*args, **kwargs), self.ordering, self.cutoff)
+
+    def order_by(self, *ordering):
+        return MergedHistory(self.live, self.archived, ordering, self.cutoff)
+
+    def values(self, *fields):
+        return MergedHistory(self.live.values(*fields), self.archived.values(*fields), self.ordering, self.cutoff)
+
+    def only(self, *fields):
+        # The merge and the paginator read the ordering columns of every row
+        fields = {*fields, *(field.lstrip('-') for field in self.ordering)}
+        return MergedHistory(self.live.only(*fields), self.archived.only(*fields), self.ordering, self.cutoff)
+
+    def select_related(self, *fields):
+        return MergedHistory(self.live.select_related(*fields), self.archived.select_related(*fields), self.ordering, self.cutoff)
+
+    def iterator(self, chunk_size=2000):
+        return self._merge(self.live.iterator(chunk_size=chunk_size), self.archived.iterator(chunk_size=chunk_size))
+
+    def _key(self, row):
+        if isinstance(row, dict):  # .values() querysets
+            return tuple(row[field.lstrip('-')] for field in self.ordering)
+        return tuple(getattr(row, field.lstrip('-')) for field in self.ordering)
+
+    def _merge(self, live, archived):
+        descending = self.ordering[0].startswith('-')
+        return heapq.merge(live, archived, key=self._key, reverse=descending)
+
+    def __iter__(self):
+        return self.iterator()
+
+    def __getitem__(self, k):
+        if not isinstance(k, slice) or k.stop is None or k.step is not None:
+            raise TypeError('MergedHistory only supports bounded slices')
+        live = list(self.live[:k.stop])
+        date_field = self.ordering[0].lstrip('-')
+        newest_first = self.ordering[0].startswith('-')
+        if newest_first and len(live) == k.stop and getattr(live[-1], date_field) >= self.cutoff:
+            # Every archived row is older than the cutoff, so none can land in this page
+            return live[k.start or 0:]
+        archived = list(self.archived[:k.stop])
+        return list(self._merge(live, archived))[k.start or 0:k.stop]
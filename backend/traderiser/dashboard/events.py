@@ -0,0 +1,116 @@
+# dashboard/events.py
+"""
+Process-local pub/sub for per-user balance and trade events, consumed by the
+Server-Sent Events stream in dashboard.views.event_stream.
+
+publish() may be called from any synchronous code, in any thread. Inside a
+transaction the event waits for the commit, and is dropped on rollback, so
+clients never see a balance or trade that was not persisted. Each subscriber has a bounded queue
+that drops its oldest event when full, and recent events are kept per user so a
+reconnecting client can resume from Last-Event-ID. Event ids are only
+meaningful within one process.
+"""
+import asyncio
+import itertools
+import threading
+from collections import OrderedDict, deque
+from functools import partial
+from django.db import transaction
+from . import metrics
+
+SUBSCRIBER_QUEUE_SIZE = 100
+REPLAY_BUFFER_SIZE = 100  # Recent events kept per user for Last-Event-ID resumes
+REPLAY_USERS = 10000  # Users whose recent events are kept, least recently active dropped first
+
+
+class Subscriber:
+    def __init__(self, user_id, loop):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = deque(maxlen=SUBSCRIBER_QUEUE_SIZE)
+        self.ready = asyncio.Event()
+
+    def push(self, event):
+        if len(self.queue) == self.queue.maxlen:
+            metrics.incr('events.dropped')
+        self.queue.append(event)  # deque(maxlen) drops the oldest
+        self.loop.call_soon_threadsafe(self.ready.set)
+
+    def drain(self):
+        self.ready.clear()
+        events = []
+        while self.queue:
+            events.append(self.queue.popleft())
+        return events
+
+    async def wait(self):
+        await self.ready.wait()
+
+
+class EventBus:
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._subscribers = {}  # user_id -> set of Subscriber
+        self._recent = OrderedDict()  # user_id -> deque of (id, kind, data)
+
+    def publish(self, user_id, kind, data):
+        with self._lock:
+            event = (next(self._ids), kind, data)
+            recent = self._recent.get(user_id)
+            if recent is None:
+                recent = self._recent[user_id] = deque(maxlen=REPLAY_BUFFER_SIZE)
+                if len(self._recent) > REPLAY_USERS:
+                    self._recent.popitem(last=False)
+            else:
+                self._recent.move_to_end(user_id)
+            recent.append(event)
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.push(event)
+            except RuntimeError:
+                self.unsubscribe(subscriber)  # Its event loop has closed
+        metrics.incr('events.published')
+
+    def subscribe(self, user_id, last_event_id=None):
+        """Register a subscriber on the running loop, preloaded with events after last_event_id."""
+        subscriber = Subscriber(user_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscriber)
+            if last_event_id is not None:
+                for event in self._recent.get(user_id, ()):
+                    if event[0] > last_event_id:
+                        subscriber.queue.append(event)
+            count = sum(len(subs) for subs in self._subscribers.values())
+        if subscriber.queue:
+            subscriber.ready.set()
+        metrics.set_gauge('events.subscribers', count)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            subs = self._subscribers.get(subscriber.user_id)
+            if subs is not None:
+                subs.discard(subscriber)
+                if not subs:
+                    del self._subscribers[subscriber.user_id]
+            count = sum(len(subs) for subs in self._subscribers.values())
+        metrics.set_gauge('events.subscribers', count)
+
+
+bus = EventBus()
+
+
+def publish(user_id, kind, data):
+    if user_id is not None:
+        transaction.on_commit(partial(bus.publish, user_id, kind, data))
+
+
+def publish_balance(user_id, account_id, balance, wallet_type='main', wallet_id=None):
+    publish(user_id, 'balance', {
+        'account_id': account_id,
+        'wallet_id': wallet_id,
+        'wallet_type': wallet_type,
+        'balance': str(balance),
+    })
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from dashboard.archive import archive_cutoff, archive_rows
+from dashboard.models import Transaction, ArchivedTransaction
+from trading.models import Trade, ArchivedTrade
+from wallet.models import WalletTransaction, ArchivedWalletTransaction, OTPCode
+
+
+class Command(BaseCommand):
+    help = 'Move trades and transactions older than HISTORY_ARCHIVE_AFTER_DAYS into the archive tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows moved per transaction')
+
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff()
+        batch_size = options['batch_size']
+        self.stdout.write(f"Archiving rows older than {cutoff:%Y-%m-%d %H:%M}")
+
+        moved = archive_rows(Trade, ArchivedTrade, 'timestamp', cutoff, batch_size)
+        self.stdout.write(f"Trades: {moved}")
+
+        moved = archive_rows(Transaction, ArchivedTransaction, 'created_at', cutoff, batch_size)
+        self.stdout.write(f"Transactions: {moved}")
+
+        # Pending wallet transactions stay live; their OTP codes go with them once settled
+        moved = archive_rows(
+            WalletTransaction, ArchivedWalletTransaction, 'created_at', cutoff, batch_size,
+            extra_filter={'status__in': ['completed', 'failed']},
+            before_delete=lambda ids: OTPCode.objects.filter(transaction_id__in=ids)._raw_delete(OTPCode.objects.db),
+        )
+        self.stdout.write(f"Wallet transactions: {moved}")
+        self.stdout.write(self.style.SUCCESS('Archive complete'))
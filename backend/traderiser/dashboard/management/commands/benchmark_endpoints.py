@@ -0,0 +1,90 @@
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+from django.core.management.base import BaseCommand, CommandError
+from accounts.authentication import issue_tokens
+from accounts.models import User
+
+
+async def _call(application, method, url, headers, body):
+    """Drive one request through the ASGI application; returns the status code."""
+    parts = urlsplit(url)
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': method, 'scheme': 'http', 'path': parts.path, 'raw_path': parts.path.encode(),
+        'query_string': parts.query.encode(), 'root_path': '',
+        'headers': [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+        'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    disconnected = asyncio.Event()
+    status = None
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif message['type'] == 'http.response.body' and not message.get('more_body'):
+            disconnected.set()
+
+    await application(scope, receive, send)
+    return status
+
+
+class Command(BaseCommand):
+    help = 'Measure requests/s and latency of API endpoints through the in-process ASGI application.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='Path and query, e.g. /api/trading/trades/history/')
+        parser.add_argument('--email', required=True, help='User to authenticate as')
+        parser.add_argument('--method', default='GET')
+        parser.add_argument('--body', default='', help='JSON request body')
+        parser.add_argument('--requests', type=int, default=5000, help='Total requests to send')
+        parser.add_argument('--concurrency', type=int, default=1000, help='Requests in flight at once')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(email=options['email']).first()
+        if user is None:
+            raise CommandError(f"No user with email {options['email']}")
+        headers = {'Authorization': f'Bearer {issue_tokens(user).access_token}', 'Host': 'testserver'}
+        body = options['body'].encode()
+        if body:
+            headers['Content-Type'] = 'application/json'
+            headers['Content-Length'] = str(len(body))
+        result = asyncio.run(self._run(options, headers, body))
+        self.stdout.write(json.dumps(result))
+
+    async def _run(self, options, headers, body):
+        from traderiser.asgi import application
+        semaphore = asyncio.Semaphore(options['concurrency'])
+        latencies = []
+        statuses = {}
+
+        async def one():
+            async with semaphore:
+                started = time.perf_counter()
+                status = await _call(application, options['method'].upper(), options['url'], headers, body)
+                latencies.append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(options['requests'])))
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 1)
+
+        return {
+            'url': options['url'], 'requests': len(latencies), 'concurrency': options['concurrency'],
+            'duration_seconds': round(elapsed, 3), 'requests_per_second': round(len(latencies) / elapsed, 1),
+            'p50_ms': percentile(0.5), 'p95_ms': percentile(0.95), 'p99_ms': percentile(0.99),
+            'statuses': {str(code): count for code, count in sorted(statuses.items(), key=lambda item: str(item[0]))},
+        }
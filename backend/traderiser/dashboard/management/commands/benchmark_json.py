@@ -0,0 +1,56 @@
+import io
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from accounts.fast_json import FastJSONParser, FastJSONRenderer
+from trading.models import Trade
+from trading.serializers import TradeSerializer
+
+
+def _best(function, repeat):
+    """Fastest of `repeat` runs, in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return round(min(timings) * 1000, 2)
+
+
+class Command(BaseCommand):
+    help = ('Compare DRF\'s JSONRenderer/JSONParser with the orjson-backed ones on a TradeSerializer payload from '
+            'the database (see generate_dataset); fails if the rendered bytes differ.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trades', type=int, default=10000, help='Trades in the payload')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        trades = Trade.objects.select_related(
+            'market__market_type', 'trade_type', 'used_robot'
+        ).order_by('-id')[:options['trades']]
+        started = time.perf_counter()
+        data = {'trades': TradeSerializer(trades, many=True).data}
+        serialize_ms = round((time.perf_counter() - started) * 1000, 2)
+        if not data['trades']:
+            raise CommandError('No trades to render; run generate_dataset first')
+
+        stock, fast = JSONRenderer(), FastJSONRenderer()
+        expected = stock.render(data, 'application/json')
+        if fast.render(data, 'application/json') != expected:
+            raise CommandError('FastJSONRenderer output differs from JSONRenderer')
+
+        render = {
+            'stock_ms': _best(lambda: stock.render(data, 'application/json'), options['repeat']),
+            'fast_ms': _best(lambda: fast.render(data, 'application/json'), options['repeat']),
+        }
+        parse = {
+            'stock_ms': _best(lambda: JSONParser().parse(io.BytesIO(expected)), options['repeat']),
+            'fast_ms': _best(lambda: FastJSONParser().parse(io.BytesIO(expected)), options['repeat']),
+        }
+        self.stdout.write(json.dumps({
+            'trades': len(data['trades']), 'bytes': len(expected), 'serialize_ms': serialize_ms,
+            'render': render, 'parse': parse,
+        }))
@@ -0,0 +1,43 @@
+import time
+from datetime import datetime, time as day_start, timezone as dt_timezone
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from dashboard.synthetic import SYNTHETIC_PASSWORD, DatasetGenerator
+
+
+class Command(BaseCommand):
+    help = ('Fill the database with synthetic users, accounts, wallets, markets, robots, trades and transactions '
+            'for benchmarking. The same seed and --end give the same rows on an empty database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--trades', type=int, default=100000)
+        parser.add_argument('--wallet-transactions', type=int, default=None, help='Defaults to 5 per user')
+        parser.add_argument('--days', type=int, default=180, help='History window ending at --end')
+        parser.add_argument('--end', default=None, help='End of the window, YYYY-MM-DD (default: today, 00:00 UTC)')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=20000, help='History rows written per transaction')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('--users must be at least 1')
+        if options['end']:
+            end = datetime.strptime(options['end'], '%Y-%m-%d').replace(tzinfo=dt_timezone.utc)
+        else:
+            end = datetime.combine(timezone.now().date(), day_start(), tzinfo=dt_timezone.utc)
+        wallet_transactions = options['wallet_transactions']
+        if wallet_transactions is None:
+            wallet_transactions = options['users'] * 5
+
+        started = time.perf_counter()
+        generator = DatasetGenerator(options['seed'], end, options['days'], options['batch_size'], log=self.stdout.write)
+        generator.reference_data()
+        generator.users(options['users'])
+        generator.trades(options['trades'])
+        generator.wallet_transactions(wallet_transactions)
+        generator.settle_balances()
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {options['users']} users, {len(generator.accounts)} accounts, {options['trades']} trades and "
+            f"{wallet_transactions} wallet transactions in {time.perf_counter() - started:.1f}s. "
+            f"Users are syn{options['seed']}-<n>@example.com with password {SYNTHETIC_PASSWORD!r}."
+        ))
@@ -0,0 +1,22 @@
+# dashboard/metrics.py
+"""Process-local counters and gauges, exposed to staff through MetricsView."""
+import threading
+from collections import Counter
+
+_lock = threading.Lock()
+_counters = Counter()
+_gauges = {}
+
+
+def incr(name, amount=1):
+    with _lock:
+        _counters[name] += amount
+
+
+def set_gauge(name, value):
+    _gauges[name] = value
+
+
+def snapshot():
+    with _lock:
+        return {'counters': dict(_counters), 'gauges': dict(_gauges)}
@@ -17,4 +17,17 @@ class Transaction(models.Model):
         return f"{self.transaction_type} of {self.amount} for {self.account.user.username} ({self.account.account_type})"
 
     class Meta:
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+
+class ArchivedTransaction(models.Model):
+    """Cold copy of a Transaction moved out by the archive_history command; ids are preserved."""
+    id = models.BigIntegerField(primary_key=True)
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='+')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    transaction_type = models.CharField(max_length=20, choices=Transaction.TRANSACTION_TYPES)
+    description = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['account', 'created_at'])]
\ No newline at end of file
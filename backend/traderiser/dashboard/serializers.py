@@ -1,7 +1,8 @@
 from rest_framework import serializers
+from accounts.fieldsets import SparseFieldsMixin
 from .models import Transaction
 
-class TransactionSerializer(serializers.ModelSerializer):
+class TransactionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Transaction
         fields = ['id', 'amount', 'transaction_type', 'description', 'created_at']
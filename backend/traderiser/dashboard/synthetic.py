@@ -0,0 +1,333 @@
+# dashboard/synthetic.py
+"""
+Synthetic dataset for local benchmarking (the generate_dataset command).
+
+Everything is drawn from one random.Random(seed), so a seed and end date give
+the same rows on an empty database. The shape:
+- Signups accelerate towards the end of the window. Each user gets a real
+  account type, a demo account, or both.
+- Activity is heavy-tailed: each account's share of trades is a Pareto draw.
+- Trades fall between the account's signup and the end of the window, mostly
+  in market hours. Stakes are log-normal, market popularity follows Zipf's
+  law, and some trades use a robot or a martingale level.
+- Every trade gets the dashboard Transaction trading.placement writes.
+  Completed wallet deposits and withdrawals get theirs too.
+- Wallet balances are set from those totals at the end, so
+  check_wallet_integrity passes.
+
+Reference rows and users use bulk_create, users through
+accounts.provisioning. The history tables use plain INSERTs built from each
+model's columns. bulk_create would stamp auto_now_add fields with the current
+time, and its per-object work dominates at millions of rows. Neither path
+sends signals.
+"""
+import math
+import random
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from itertools import accumulate
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from accounts.models import User
+from accounts.provisioning import provision_users, starting_balance
+from trading.models import Market, MarketType, Robot, Trade, TradeType, UserRobot
+from wallet import conversion
+from wallet.integrity import usd_to_ksh_rate
+from wallet.models import ExchangeRate, Wallet, WalletTransaction
+from .models import Transaction
+
+SYNTHETIC_PASSWORD = 'synthetic-password'  # Every generated user can log in with it
+MARKETS = {
+    # market type: (profit multiplier, markets with a typical price)
+    'forex': ('1.85', {
+        'EURUSD': 1.08, 'GBPUSD': 1.27, 'USDJPY': 151.2, 'AUDUSD': 0.66, 'USDCAD': 1.36, 'USDCHF': 0.88,
+        'NZDUSD': 0.61, 'EURGBP': 0.85, 'EURJPY': 163.5, 'GBPJPY': 191.8, 'AUDCAD': 0.9, 'EURCHF': 0.95,
+    }),
+    'crypto': ('1.90', {
+        'BTCUSD': 64000.0, 'ETHUSD': 3100.0, 'SOLUSD': 145.0, 'XRPUSD': 0.52, 'LTCUSD': 82.0, 'ADAUSD': 0.45,
+    }),
+    'commodities': ('1.80', {'XAUUSD': 2350.0, 'XAGUSD': 28.4, 'WTIUSD': 78.5, 'BRENTUSD': 82.6}),
+    'indices': ('1.75', {'US30': 39000.0, 'US500': 5200.0, 'NAS100': 18200.0, 'GER40': 18100.0}),
+}
+TRADE_TYPES = ['rise/fall', 'buy/sell', 'touch/no touch']
+ROBOTS = [
+    # name, price, win rate, available for demo
+    ('Scalper Lite', '0.00', 52, True), ('Trend Rider', '49.00', 58, True), ('Grid Master', '79.00', 61, True),
+    ('Night Owl', '29.00', 48, True), ('Momentum Pro', '149.00', 66, False), ('Sashi Edge', '299.00', 72, False),
+]
+REAL_ACCOUNT_TYPES = ['standard', 'pro', 'islamic', 'options', 'crypto']
+REAL_ACCOUNT_WEIGHTS = [50, 20, 10, 10, 10]
+# Share of trades per UTC hour: quiet overnight, busiest over the London/New York overlap
+HOUR_WEIGHTS = [1, 1, 1, 1, 2, 3, 4, 6, 8, 9, 9, 9, 10, 11, 12, 12, 11, 9, 7, 6, 5, 4, 2, 1]
+
+
+def _money(cents):
+    return f'{cents / 100:.2f}'
+
+
+def _stamp(epoch):
+    """Naive UTC timestamp text, as Django stores DateTimeFields with USE_TZ."""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(epoch))
+
+
+def insert_rows(model, fields, rows):
+    """INSERT row tuples, values in `fields` order and ready for the database, into the model's table."""
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(model._meta.get_field(name).column) for name in fields)
+    row_sql = '(' + ', '.join(['%s'] * len(fields)) + ')'
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            # One prepared statement reused per row beats SQLite's small multi-row parameter limit
+            cursor.executemany(f'INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES {row_sql}', rows)
+            return
+        per_statement = max(1, (connection.features.max_query_params or 65535) // len(fields))
+        for start in range(0, len(rows), per_statement):
+            chunk = rows[start:start + per_statement]
+            cursor.execute(
+                f'INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES {", ".join([row_sql] * len(chunk))}',
+                [value for row in chunk for value in row],
+            )
+
+
+class SyntheticAccount:
+    __slots__ = ('id', 'user_id', 'is_demo', 'joined', 'robot_ids', 'main_wallet_id', 'trading_wallet_id',
+                 'balance_cents')
+
+    def __init__(self, account, joined, robot_ids):
+        self.id = account.id
+        self.user_id = account.user_id
+        self.is_demo = account.account_type == 'demo'
+        self.joined = joined
+        self.robot_ids = robot_ids
+        self.main_wallet_id = self.trading_wallet_id = None
+        self.balance_cents = int(starting_balance(account.account_type) * 100)
+
+
+class DatasetGenerator:
+    def __init__(self, seed, end, days, batch_size=20000, log=None):
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.end = end.timestamp()
+        self.start = (end - timedelta(days=days)).timestamp()
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        self.accounts = []
+
+    def reference_data(self):
+        """Market types, markets, trade types and robots, created if missing."""
+        MarketType.objects.bulk_create(
+            [MarketType(name=name, profit_multiplier=Decimal(multiplier)) for name, (multiplier, _) in MARKETS.items()],
+            ignore_conflicts=True,
+        )
+        market_types = MarketType.objects.in_bulk(MARKETS, field_name='name')
+        Market.objects.bulk_create([
+            Market(name=name, market_type=market_types[type_name])
+            for type_name, (_, markets) in MARKETS.items() for name in markets
+        ], ignore_conflicts=True)
+        TradeType.objects.bulk_create([TradeType(name=name) for name in TRADE_TYPES], ignore_conflicts=True)
+        Robot.objects.bulk_create([
+            Robot(name=name, description=f'{name} strategy', price=Decimal(price), win_rate=win_rate,
+                  available_for_demo=demo)
+            for name, price, win_rate, demo in ROBOTS
+        ], ignore_conflicts=True)
+
+        prices = {name: price for _, markets in MARKETS.values() for name, price in markets.items()}
+        markets = Market.objects.select_related('market_type').filter(name__in=prices).order_by('id')
+        # (id, typical price, payout multiplier minus the stake), most popular first
+        self.markets = [(market.id, prices[market.name], float(market.profit_multiplier) - 1) for market in markets]
+        self.market_weights = list(accumulate(1 / rank for rank in range(1, len(self.markets) + 1)))
+        self.trade_type_ids = list(TradeType.objects.filter(name__in=TRADE_TYPES).order_by('id').values_list('id', flat=True))
+        self.robots = {robot.id: robot for robot in Robot.objects.filter(name__in=[name for name, *_ in ROBOTS])}
+        self.demo_robot_ids = sorted(robot_id for robot_id, robot in self.robots.items() if robot.available_for_demo)
+        matrix = conversion.rates()
+        self.currencies = {code: matrix.currency_id(code) for code in ('USD', 'KSH')}
+        self.deposit_rate = self._rate(matrix, 'KSH', 'USD', 'live', Decimal('0.0078'))
+        self.withdrawal_rate = self._rate(matrix, 'USD', 'KSH', 'withdrawal', Decimal('131.578947'))
+        self.mirror_rate = usd_to_ksh_rate()
+
+    @staticmethod
+    def _rate(matrix, base, target, kind, default):
+        try:
+            return matrix.rate(base, target, kind).quantize(Decimal('0.000001'))
+        except ExchangeRate.DoesNotExist:
+            return default
+
+    def users(self, count, batch_size=1000):
+        rng = self.rng
+        password = make_password(SYNTHETIC_PASSWORD)  # Hashed once; every user shares it
+        robot_ids = sorted(self.robots)
+        span = self.end - self.start
+        for first in range(0, count, batch_size):
+            signups, joined_at, owned = [], [], []
+            for index in range(first, min(first + batch_size, count)):
+                # sqrt skews signups towards the end of the window: the user base grows
+                joined = self.start + span * math.sqrt(rng.random())
+                name = f'syn{self.seed}-{index}'
+                user = User(username=name, email=f'{name}@example.com', password=password,
+                            date_joined=datetime.fromtimestamp(joined, dt_timezone.utc))
+                kind = rng.random()
+                real = rng.choices(REAL_ACCOUNT_TYPES, REAL_ACCOUNT_WEIGHTS)[0]
+                signups.append((user, ['demo'] if kind < 0.3 else [real] if kind < 0.4 else [real, 'demo']))
+                joined_at.append(joined)
+                owned.append(rng.sample(robot_ids, rng.choice([1, 2])) if rng.random() < 0.1 else [])
+
+            with transaction.atomic():
+                users = provision_users(signups)
+                UserRobot.objects.bulk_create([
+                    UserRobot(user=user, robot_id=robot_id) for user, robots in zip(users, owned) for robot_id in robots
+                ])
+                created = [
+                    SyntheticAccount(account, joined, robots)
+                    for user, joined, robots in zip(users, joined_at, owned)
+                    for account in user.accounts.all()
+                ]
+                by_id = {account.id: account for account in created}
+                for account_id, wallet_id, wallet_type in Wallet.objects.filter(account_id__in=by_id).values_list(
+                    'account_id', 'id', 'wallet_type'
+                ):
+                    setattr(by_id[account_id], f'{wallet_type}_wallet_id', wallet_id)
+            self.accounts.extend(created)
+            self.log(f'Users: {min(first + batch_size, count)}/{count}')
+
+    def trades(self, count):
+        rng = self.rng
+        accounts = self.accounts
+        # Pareto(1.16) shares: roughly 20% of accounts place 80% of the trades
+        activity = list(accumulate(min(rng.paretovariate(1.16), 1000.0) for _ in accounts))
+        hours = list(accumulate(HOUR_WEIGHTS))
+        trade_fields = [
+            'user_id', 'account_id', 'market_id', 'trade_type_id', 'direction', 'amount', 'is_win', 'profit',
+            'timestamp', 'used_martingale', 'martingale_level', 'used_robot_id', 'session_profit_before', 'is_demo',
+            'entry_spot', 'exit_spot', 'current_spot',
+        ]
+        transaction_fields = ['account_id', 'amount', 'transaction_type', 'description', 'created_at']
+        market_names = dict(Market.objects.values_list('id', 'name'))
+        started = time.perf_counter()
+        done = 0
+        while done < count:
+            size = min(self.batch_size, count - done)
+            trade_rows, transaction_rows = [], []
+            picks = rng.choices(accounts, cum_weights=activity, k=size)
+            picks.sort(key=lambda account: account.id)  # Clustered inserts keep the per-user index writes local
+            markets = rng.choices(self.markets, cum_weights=self.market_weights, k=size)
+            trade_hours = rng.choices(range(24), cum_weights=hours, k=size)
+            for account, (market_id, price, payout), hour in zip(picks, markets, trade_hours):
+                moment = account.joined + rng.random() * (self.end - account.joined)
+                in_hours = moment - moment % 86400 + hour * 3600 + rng.random() * 3600
+                if account.joined <= in_hours <= self.end:
+                    moment = in_hours
+                stamp = _stamp(moment)
+
+                stake = max(100, min(500000, int(math.exp(rng.gauss(2.3, 1.0)) * 100)))  # Median about $10
+                level = 0
+                if rng.random() < 0.05:
+                    level = rng.randint(1, 3)
+                    stake *= 2 ** level
+                robot_id = None
+                robot_choices = self.demo_robot_ids if account.is_demo else account.robot_ids
+                if robot_choices and rng.random() < 0.3:
+                    robot_id = rng.choice(robot_choices)
+                win_rate = self.robots[robot_id].win_rate / 100 if robot_id else 0.45
+                is_win = rng.random() < win_rate
+                profit = int(stake * payout) if is_win else -stake
+                account.balance_cents += profit
+
+                direction = 'buy' if rng.random() < 0.5 else 'sell'
+                entry = price * (1 + rng.gauss(0, 0.01))
+                delta = price * rng.uniform(0.0001, 0.001)
+                exit_spot = entry + delta if is_win == (direction == 'buy') else entry - delta
+                trade_rows.append((
+                    account.user_id, account.id, market_id, rng.choice(self.trade_type_ids), direction,
+                    _money(stake), is_win, _money(profit), stamp, level > 0, level, robot_id, '0.00', account.is_demo,
+                    f'{entry:.2f}', f'{exit_spot:.2f}', f'{exit_spot:.2f}',
+                ))
+                transaction_rows.append((
+                    account.id, _money(profit), 'credit' if is_win else 'debit',
+                    f"{'Demo ' if account.is_demo else ''}Trade on {market_names[market_id]}: "
+                    f"{'Win' if is_win else 'Loss'} (Level {level})",
+                    stamp,
+                ))
+            with transaction.atomic():
+                insert_rows(Trade, trade_fields, trade_rows)
+                insert_rows(Transaction, transaction_fields, transaction_rows)
+            done += size
+            elapsed = time.perf_counter() - started
+            self.log(f'Trades: {done}/{count} ({done / elapsed:,.0f}/s)')
+
+    def wallet_transactions(self, count):
+        rng = self.rng
+        real = [account for account in self.accounts if not account.is_demo and account.main_wallet_id]
+        if not real or not count:
+            return
+        activity = list(accumulate(min(rng.paretovariate(1.5), 100.0) for _ in real))
+        usd, ksh = self.currencies['USD'], self.currencies['KSH']
+        fields = [
+            'wallet_id', 'transaction_type', 'amount', 'currency_id', 'target_currency_id', 'converted_amount',
+            'exchange_rate_used', 'status', 'reference_id', 'description', 'mpesa_phone', 'created_at',
+            'completed_at',
+        ]
+        transaction_fields = ['account_id', 'amount', 'transaction_type', 'description', 'created_at']
+        done = 0
+        while done < count:
+            size = min(self.batch_size, count - done)
+            rows, transaction_rows = [], []
+            for offset, account in enumerate(rng.choices(real, cum_weights=activity, k=size)):
+                reference = f'WT-SYN{self.seed}-{done + offset:09d}'
+                moment = account.joined + rng.random() * (self.end - account.joined)
+                roll = rng.random()
+                status = 'completed' if roll < 0.85 else 'failed' if roll < 0.95 else 'pending'
+                completed_at = _stamp(moment + rng.uniform(30, 3600)) if status == 'completed' else None
+                phone = f'2547{rng.randrange(10 ** 8):08d}'
+                if rng.random() < 0.7:
+                    amount = Decimal(max(100, int(math.exp(rng.gauss(7.6, 1.0))))).quantize(Decimal('0.01'))  # KSH
+                    converted = (amount * self.deposit_rate).quantize(Decimal('0.01'))
+                    rows.append((account.main_wallet_id, 'deposit', str(amount), ksh, usd, str(converted),
+                                 str(self.deposit_rate), status, reference, 'Deposit request', phone,
+                                 _stamp(moment), completed_at))
+                    if status == 'completed':
+                        cents = int(converted * 100)
+                        account.balance_cents += cents
+                        transaction_rows.append((account.id, _money(cents), 'deposit', f'Approved: {reference}',
+                                                 completed_at))
+                else:
+                    cents = max(500, int(math.exp(rng.gauss(3.9, 0.8)) * 100))  # USD, median about $50
+                    converted = (Decimal(cents) / 100 * self.withdrawal_rate).quantize(Decimal('0.01'))
+                    rows.append((account.main_wallet_id, 'withdrawal', _money(cents), usd, ksh, str(converted),
+                                 str(self.withdrawal_rate), status, reference, 'Withdrawal request', phone,
+                                 _stamp(moment), completed_at))
+                    if status == 'completed':
+                        account.balance_cents -= cents
+                        transaction_rows.append((account.id, _money(-cents), 'withdrawal', f'Paid: {reference}',
+                                                 completed_at))
+            with transaction.atomic():
+                insert_rows(WalletTransaction, fields, rows)
+                insert_rows(Transaction, transaction_fields, transaction_rows)
+            done += size
+            self.log(f'Wallet transactions: {done}/{count}')
+
+    def settle_balances(self):
+        """Top up accounts that ended below zero, then store every balance on its wallets."""
+        rng = self.rng
+        top_ups, updates = [], []
+        mirror_rate = float(self.mirror_rate) if self.mirror_rate else 0.0
+        for account in self.accounts:
+            if account.balance_cents < 0:
+                amount = -account.balance_cents + int(math.exp(rng.gauss(4.6, 0.7)) * 100)
+                account.balance_cents += amount
+                top_ups.append((account.id, _money(amount), 'deposit', 'Synthetic top-up', _stamp(account.joined)))
+            if account.main_wallet_id:
+                updates.append((_money(account.balance_cents), account.main_wallet_id))
+            if account.trading_wallet_id:
+                updates.append((f'{account.balance_cents / 100 * mirror_rate:.2f}', account.trading_wallet_id))
+        balance = connection.ops.quote_name(Wallet._meta.get_field('balance').column)
+        with transaction.atomic():
+            insert_rows(Transaction, ['account_id', 'amount', 'transaction_type', 'description', 'created_at'], top_ups)
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f'UPDATE {connection.ops.quote_name(Wallet._meta.db_table)} SET {balance} = %s WHERE id = %s',
+                    updates,
+                )
+        self.log(f'Balances: {len(updates)} wallets, {len(top_ups)} top-ups')
@@ -1,3 +1,78 @@
+import io
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management import call_command
+from django.db import transaction
 from django.test import TestCase
+from rest_framework.test import APITestCase
+from accounts.models import User, Account
+from trading.models import MarketType, Market, TradeType, Trade, ArchivedTrade
+from . import events
+from .archive import MergedHistory, archive_cutoff
+from .models import Transaction, ArchivedTransaction
 
-# Create your tests here.
+
+class ArchiveTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='trader', email='trader@example.com', password='pw12345!')
+        self.account = Account.objects.create(user=self.user, account_type='standard')
+        market = Market.objects.create(name='EURUSD', market_type=MarketType.objects.create(name='forex'))
+        trade_type = TradeType.objects.create(name='buy/sell')
+        old = archive_cutoff() - timedelta(days=1)
+        for index, profit in enumerate(['5.00', '-2.00', '7.50', '-1.00']):
+            trade = Trade.objects.create(
+                user=self.user, account=self.account, market=market, trade_type=trade_type,
+                direction='buy', amount=Decimal('10.00'), is_win=profit[0] != '-', profit=Decimal(profit),
+            )
+            Transaction.objects.create(account=self.account, amount=Decimal('100.00'), transaction_type='deposit')
+            if index < 2:  # The first two become old enough to archive
+                Trade.objects.filter(pk=trade.pk).update(timestamp=old + timedelta(minutes=index))
+        Transaction.objects.filter(pk__in=Transaction.objects.order_by('id').values('id')[:2]).update(created_at=old)
+        self.client.force_authenticate(self.user)
+
+    def totals(self):
+        response = self.client.get('/api/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        return response.data['accounts'][0]['totals']
+
+    def test_archive_moves_old_rows_and_history_merges_them_back(self):
+        before = self.totals()
+        call_command('archive_history', stdout=io.StringIO())
+
+        self.assertEqual(Trade.objects.count(), 2)
+        self.assertEqual(ArchivedTrade.objects.count(), 2)
+        self.assertEqual(ArchivedTransaction.objects.count(), 2)
+        merged = list(MergedHistory(Trade.objects.all(), ArchivedTrade.objects.all(), ('-timestamp', '-id')))
+        self.assertEqual([trade.profit for trade in merged], [Decimal('-1.00'), Decimal('7.50'), Decimal('-2.00'), Decimal('5.00')])
+
+        self.assertEqual(self.totals(), before)
+        self.assertEqual(before['trade_count'], 4)
+        self.assertEqual(before['trade_profit'], Decimal('9.50'))
+        self.assertEqual(before['deposits'], Decimal('400.00'))
+
+    def test_trade_history_pages_through_live_and_archived_rows(self):
+        call_command('archive_history', stdout=io.StringIO())
+
+        first = self.client.get('/api/trading/trades/history/', {'page_size': 3})
+        self.assertEqual(first.status_code, 200)
+        self.assertIsNone(first.data['previous'])
+        second = self.client.get(first.data['next'])
+        self.assertIsNone(second.data['next'])
+        profits = [trade['profit'] for trade in first.data['trades'] + second.data['trades']]
+        self.assertEqual(profits, ['-1.00', '7.50', '-2.00', '5.00'])
+
+
+class EventPublishingTests(TestCase):
+    def test_event_is_published_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                events.publish(9001, 'balance', {'balance': '1.00'})
+                self.assertNotIn(9001, events.bus._recent)
+        self.assertEqual(events.bus._recent[9001][-1][1:], ('balance', {'balance': '1.00'}))
+
+    def test_event_is_dropped_on_rollback(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ValueError), transaction.atomic():
+                events.publish(9002, 'balance', {'balance': '1.00'})
+                raise ValueError
+        self.assertNotIn(9002, events.bus._recent)
@@ -1,7 +1,10 @@
 from django.urls import path
-from .views import DashboardView, ResetDemoView
+from .views import DashboardView, TransactionHistoryView, MetricsView, ResetDemoView, event_stream
 
 urlpatterns = [
     path('', DashboardView.as_view(), name='dashboard'),
+    path('transactions/', TransactionHistoryView.as_view(), name='transaction_history'),
+    path('events/', event_stream, name='event_stream'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('reset-demo/', ResetDemoView.as_view(), name='reset_demo'),
 ]
\ No newline at end of file
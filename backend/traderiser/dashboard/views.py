@@ -1,45 +1,192 @@
+import asyncio
+import json
+from decimal import Decimal
+from asgiref.sync import sync_to_async
+from django.db.models import Count, F, Prefetch, Q, Sum, Window, prefetch_related_objects
+from django.db.models.functions import Coalesce, RowNumber
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework.exceptions import AuthenticationFailed
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from accounts.async_views import AsyncAPIView, serialize
+from accounts.authentication import ClaimsJWTAuthentication
+from accounts.fieldsets import requested_fields
 from accounts.models import User, Account
 from accounts.serializers import UserSerializer
-from .models import Transaction
+from . import events, metrics
+from .archive import MergedHistory
+from .models import Transaction, ArchivedTransaction
 from .serializers import TransactionSerializer
-from wallet.models import WalletTransaction  # Import to delete wallet transactions on reset
+from trading.models import Trade, ArchivedTrade
 
-class DashboardView(APIView):
+RECENT_TRANSACTIONS_DEFAULT = 10
+RECENT_TRANSACTIONS_MAX = 100
+EVENT_HEARTBEAT_SECONDS = 15
+
+def _account_totals(querysets, **aggregates):
+    """Per-account aggregates summed across querysets, e.g. a live table and its archive."""
+    totals = {}
+    for queryset in querysets:
+        for row in queryset.values('account_id').annotate(**aggregates):
+            account_totals = totals.setdefault(row.pop('account_id'), {})
+            for name, value in row.items():
+                account_totals[name] = account_totals.get(name, 0) + value
+    return totals
+
+class DashboardView(AsyncAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
-    def get(self, request):
+    async def get(self, request):
         user = request.user
-        user_serializer = UserSerializer(user)
-        accounts = Account.objects.filter(user=user)
+        try:
+            limit = int(request.query_params.get('limit', RECENT_TRANSACTIONS_DEFAULT))
+        except ValueError:
+            return Response({'error': 'Invalid limit'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(0, min(limit, RECENT_TRANSACTIONS_MAX))
+
+        def load():
+            # Accounts carry their main wallet balance and are shared with UserSerializer
+            prefetch_related_objects([user], Prefetch('accounts', queryset=Account.objects.with_balance()))
+            # Deposit/withdrawal and trade totals per account, computed in SQL over live and archived rows
+            totals = _account_totals(
+                [Transaction.objects.filter(account__user=user), ArchivedTransaction.objects.filter(account__user=user)],
+                total_deposits=Coalesce(Sum('amount', filter=Q(transaction_type='deposit')), Decimal('0.00')),
+                total_withdrawals=Coalesce(Sum('amount', filter=Q(transaction_type='withdrawal')), Decimal('0.00')),
+            )
+            trades = _account_totals(
+                [Trade.objects.filter(user=user), ArchivedTrade.objects.filter(user=user)],
+                trade_count=Count('id'),
+                trade_profit=Coalesce(Sum('profit'), Decimal('0.00')),
+            )
+            # Last `limit` transactions of every account in a single windowed query
+            recent = {}
+            if limit:
+                transactions = Transaction.objects.filter(account__user=user).annotate(
+                    row_number=Window(
+                        RowNumber(), partition_by=F('account_id'), order_by=[F('created_at').desc(), F('id').desc()]
+                    )
+                ).filter(row_number__lte=limit).order_by('account_id', 'row_number')
+                for transaction in transactions:
+                    recent.setdefault(transaction.account_id, []).append(transaction)
+            return totals, trades, recent
+
+        # One hop: thread-sensitive sync_to_async calls share a thread, so gathering them ran them in turn anyway
+        totals, trades, recent = await sync_to_async(load)()
+
         account_data = []
-        for account in accounts:
-            transactions = Transaction.objects.filter(account=account)
-            transaction_serializer = TransactionSerializer(transactions, many=True)
+        for account in user.accounts.all():
+            account_totals = totals.get(account.id, {})
+            account_trades = trades.get(account.id, {})
             account_data.append({
+                'id': account.id,
                 'account_type': account.account_type,
                 'balance': account.balance,
-                'transactions': transaction_serializer.data
+                'transactions': TransactionSerializer(recent.get(account.id, []), many=True).data,
+                'totals': {
+                    'deposits': account_totals.get('total_deposits', Decimal('0.00')),
+                    'withdrawals': account_totals.get('total_withdrawals', Decimal('0.00')),
+                    'trade_count': account_trades.get('trade_count', 0),
+                    'trade_profit': account_trades.get('trade_profit', Decimal('0.00')),
+                },
             })
         return Response({
-            'user': user_serializer.data,
+            'user': await serialize(UserSerializer, user),  # May load deferred user fields
             'accounts': account_data
         }, status=status.HTTP_200_OK)
 
+class TransactionPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-created_at', '-id')
+
+class TransactionHistoryView(APIView):
+    """Full transaction history, paginated by cursor so deep pages stay cheap."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        filters = {'account__user': request.user}
+        if 'account_type' in request.query_params:
+            filters['account__account_type'] = request.query_params['account_type']
+        if 'transaction_type' in request.query_params:
+            filters['transaction_type'] = request.query_params['transaction_type']
+        # Pages older than the archive cutoff continue into the archive table
+        selection = requested_fields(request)
+        transactions = TransactionSerializer.narrow(MergedHistory(
+            Transaction.objects.filter(**filters),
+            ArchivedTransaction.objects.filter(**filters),
+            TransactionPagination.ordering,
+        ), **selection)
+        paginator = TransactionPagination()
+        page = paginator.paginate_queryset(transactions, request, view=self)
+        return paginator.get_paginated_response(TransactionSerializer(page, many=True, **selection).data)
+
+class MetricsView(APIView):
+    """Staff-only view of this process's counters and gauges."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(metrics.snapshot(), status=status.HTTP_200_OK)
+
 class ResetDemoView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request):
         user = request.user
         try:
-            account = Account.objects.get(user=user, account_type='demo')
-            account.reset_demo_balance()
-            # Delete dashboard transactions
-            Transaction.objects.filter(account=account).delete()
-            # Also delete wallet transactions for full reset
-            WalletTransaction.objects.filter(wallet__account=account).delete()
+            account = Account.objects.owned_by(user, 'demo').get()
+            account.reset_demo_balance()  # Also clears dashboard and wallet transactions
             return Response({'message': 'Demo balance reset to 10,000 USD'}, status=status.HTTP_200_OK)
         except Account.DoesNotExist:
-            return Response({'error': 'Demo account not found'}, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+            return Response({'error': 'Demo account not found'}, status=status.HTTP_404_NOT_FOUND)
+
+def _authenticate_stream(request):
+    """JWT from the Authorization header, or ?token= since EventSource cannot set headers."""
+    auth = ClaimsJWTAuthentication()
+    try:
+        token = request.GET.get('token')
+        if token:
+            return auth.get_user(auth.get_validated_token(token))
+        result = auth.authenticate(request)
+        return result[0] if result else None
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+
+
+async def _event_stream(user_id, last_event_id):
+    # Subscribe once streaming starts so the finally clause always unsubscribes
+    subscriber = events.bus.subscribe(user_id, last_event_id)
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            for event_id, kind, data in subscriber.drain():
+                yield f'id: {event_id}\nevent: {kind}\ndata: {json.dumps(data, cls=JSONEncoder)}\n\n'
+            try:
+                await asyncio.wait_for(subscriber.wait(), timeout=EVENT_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+    finally:
+        events.bus.unsubscribe(subscriber)
+
+
+@require_GET
+async def event_stream(request):
+    """Server-Sent Events feed of the user's balance changes and trade settlements; serve under ASGI."""
+    user = await sync_to_async(_authenticate_stream)(request)
+    if user is None or not user.is_active:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return JsonResponse({'error': 'Invalid Last-Event-ID'}, status=400)
+
+    response = StreamingHttpResponse(_event_stream(user.id, last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Disable proxy buffering
+    return response
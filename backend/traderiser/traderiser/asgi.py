@@ -9,17 +9,21 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'traderiser.settings')
+
+# Set up Django before importing anything that loads models
+django_asgi_app = get_asgi_application()
+
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 import trading.routing
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'traderiser.settings')
-
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
+    "http": django_asgi_app,
     "websocket": AuthMiddlewareStack(
         URLRouter(
             trading.routing.websocket_urlpatterns
         )
     ),
-})
\ No newline at end of file
+})
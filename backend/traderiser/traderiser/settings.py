@@ -94,7 +94,7 @@ CHANNEL_LAYERS = {
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.ClaimsJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
         'rest_framework.authentication.TokenAuthentication',
@@ -102,6 +102,22 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson-backed application/json, byte-compatible with DRF's own (see accounts/fast_json.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'accounts.fast_json.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'accounts.fast_json.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # Token buckets for views using accounts.throttling.TokenBucketThrottle
+    'DEFAULT_THROTTLE_RATES': {
+        'trade': '60/min',
+        'deposit': '5/min',
+        'withdrawal': '3/min',
+    },
 }
 
 
@@ -137,8 +153,51 @@ TIME_ZONE = 'UTC'
 USE_I18N = True
 USE_TZ = True
 
+# Account types served by the in-process demo engine (trading/demo_engine.py)
+TRADING_IN_MEMORY_ACCOUNT_TYPES = ['demo']
+TRADING_SNAPSHOT_INTERVAL = 5  # Seconds between batched writes of in-memory state
+
+# Trades and transactions older than this are moved to the archive tables (manage.py archive_history)
+HISTORY_ARCHIVE_AFTER_DAYS = 365
+
+# How long a stored Idempotency-Key response can be replayed (manage.py purge_idempotency_keys)
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+
+# Seconds AccountDetailView, WalletListView and UserRobotListView responses are cached per user
+RESPONSE_CACHE_TTL = 5
+
+# Trade placement admission control per process (trading/admission.py): trades settling at once,
+# requests allowed to wait, slots one user may hold, and seconds a request waits before a 503
+TRADE_ADMISSION_LIMIT = 16
+TRADE_ADMISSION_QUEUE = 32
+TRADE_ADMISSION_PER_USER = 2
+TRADE_ADMISSION_WAIT = 2
+
+# Where token buckets live (accounts/throttling.py): 'memory' per process, or 'cache' shared via CACHES
+THROTTLE_BUCKET_BACKEND = 'memory'
+
+# Login CPU protection (accounts/login_guard.py): (attempts, seconds) per IP, (failures, seconds) per email,
+# seconds a failed email/password pair is refused without hashing, concurrent password hashes per process,
+# and seconds a login waits for a hashing slot before a 503
+LOGIN_IP_LIMIT = (30, 60)
+LOGIN_EMAIL_FAILURE_LIMIT = (5, 300)
+LOGIN_NEGATIVE_CACHE_TTL = 300
+LOGIN_HASH_WORKERS = 2
+LOGIN_HASH_WAIT = 2
+
+# Claims-based JWT authentication (accounts/authentication.py): full users kept per process for stale
+# tokens and deferred fields, seconds one stays cached, and seconds a cached token_version is trusted
+AUTH_USER_CACHE_SIZE = 1024
+AUTH_USER_CACHE_TTL = 60
+AUTH_TOKEN_VERSION_TTL = 300
+
+# Revoked refresh tokens (accounts/revocation.py): minimum entries per process before the filter grows,
+# and its false-positive rate (hits are confirmed against the RevokedToken table)
+REVOKED_TOKEN_FILTER_CAPACITY = 100000
+REVOKED_TOKEN_FILTER_ERROR_RATE = 0.001
+
 SIMPLE_JWT = {
-    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=15),  # Renewed through api/token/refresh/
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
@@ -1,9 +1,11 @@
 # traderiser/traderiser/urls.py
 from django.contrib import admin
 from django.urls import path, include
+from accounts.views import TokenRefreshView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/accounts/', include('accounts.urls')),
     path('api/trading/', include('trading.urls')),
     path('api/dashboard/', include('dashboard.urls')),
@@ -0,0 +1,150 @@
+# trading/admission.py
+"""
+Per-process admission control for trade placement.
+
+At most `limit` trades settle at once. Up to `queue_size` more wait, for no
+longer than `wait_timeout` seconds. Anything beyond that is shed straight away
+rather than left to stall behind the database write lock. Each user may hold at
+most `per_user` of the running and waiting slots. Freed slots go to waiting
+users in round-robin order, so one busy client cannot starve the rest.
+"""
+import asyncio
+import math
+import threading
+from collections import OrderedDict, deque
+from functools import wraps
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+from dashboard import metrics
+
+SATURATED = 'saturated'
+QUEUE_TIMEOUT = 'queue_timeout'
+USER_LIMIT = 'user_limit'
+
+
+class _Waiter:
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+        self.granted = False
+
+
+class AdmissionController:
+    def __init__(self, name, limit, queue_size, per_user, wait_timeout):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.per_user = per_user
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._active = 0
+        self._held = {}  # user_id -> running + waiting slots
+        self._queues = OrderedDict()  # user_id -> deque of _Waiter, in round-robin order
+        self._queued = 0
+
+    @property
+    def retry_after(self):
+        return max(1, math.ceil(self.wait_timeout))
+
+    async def acquire(self, user_id):
+        """Returns None once admitted (call release() afterwards), else the rejection reason."""
+        with self._lock:
+            if self._held.get(user_id, 0) >= self.per_user:
+                return self._reject(USER_LIMIT)
+            if self._active < self.limit and not self._queued:
+                self._active += 1
+                self._held[user_id] = self._held.get(user_id, 0) + 1
+                self._publish()
+                return None
+            if self._queued >= self.queue_size:
+                return self._reject(SATURATED)
+            waiter = _Waiter()
+            self._queues.setdefault(user_id, deque()).append(waiter)
+            self._queued += 1
+            self._held[user_id] = self._held.get(user_id, 0) + 1
+            self._publish()
+
+        try:
+            await asyncio.wait_for(waiter.event.wait(), self.wait_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            with self._lock:
+                if not waiter.granted:
+                    self._queues[user_id].remove(waiter)
+                    if not self._queues[user_id]:
+                        del self._queues[user_id]
+                    self._queued -= 1
+                    self._drop_hold(user_id)
+                    if isinstance(exc, asyncio.CancelledError):
+                        self._publish()
+                        raise
+                    return self._reject(QUEUE_TIMEOUT)
+            if isinstance(exc, asyncio.CancelledError):
+                self.release(user_id)  # Granted just as the request went away
+                raise
+        return None
+
+    def release(self, user_id):
+        with self._lock:
+            self._active -= 1
+            self._drop_hold(user_id)
+            if self._queues:
+                # Hand the slot to the longest-waiting request of the next user in turn
+                next_user, queue = next(iter(self._queues.items()))
+                waiter = queue.popleft()
+                if queue:
+                    self._queues.move_to_end(next_user)
+                else:
+                    del self._queues[next_user]
+                self._queued -= 1
+                self._active += 1
+                waiter.granted = True
+                waiter.loop.call_soon_threadsafe(waiter.event.set)
+            self._publish()
+
+    def _drop_hold(self, user_id):
+        held = self._held.get(user_id, 0) - 1
+        if held > 0:
+            self._held[user_id] = held
+        else:
+            self._held.pop(user_id, None)
+
+    def _reject(self, reason):
+        metrics.incr(f'admission.{self.name}.rejected.{reason}')
+        return reason
+
+    def _publish(self):
+        metrics.set_gauge(f'admission.{self.name}.active', self._active)
+        metrics.set_gauge(f'admission.{self.name}.queue_depth', self._queued)
+
+
+trade_admission = AdmissionController(
+    'trade',
+    limit=getattr(settings, 'TRADE_ADMISSION_LIMIT', 16),
+    queue_size=getattr(settings, 'TRADE_ADMISSION_QUEUE', 32),
+    per_user=getattr(settings, 'TRADE_ADMISSION_PER_USER', 2),
+    wait_timeout=getattr(settings, 'TRADE_ADMISSION_WAIT', 2),
+)
+
+
+def admission_controlled(controller):
+    """Shed a coroutine APIView handler's requests with 503 once `controller` is saturated."""
+    def decorator(handler):
+        @wraps(handler)
+        async def wrapper(self, request, *args, **kwargs):
+            user_id = request.user.id
+            reason = await controller.acquire(user_id)
+            if reason is not None:
+                if reason == USER_LIMIT:
+                    error = 'Too many trades in progress for this user'
+                else:
+                    error = 'Trading is busy; retry shortly'
+                response = Response({'error': error}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+                response['Retry-After'] = str(controller.retry_after)
+                return response
+            try:
+                return await handler(self, request, *args, **kwargs)
+            finally:
+                controller.release(user_id)
+        return wrapper
+    return decorator
@@ -0,0 +1,179 @@
+# trading/consumers.py
+"""
+WebSocket order entry at ws/trading/orders/.
+
+The connection authenticates with ?token=<access JWT> or a first
+{"type": "auth", "token": ...} message. Every order re-checks that session: once
+the token has expired, or the user's token_version has moved on (a changed
+Sashi flag, deactivation, a new account), the order is rejected with status 401
+and the socket closed with code 4401, so the client reconnects with a fresh
+token. After authenticating, each
+{"type": "place_trade", "seq": n, ...PlaceTradeView fields} is answered with an
+"ack" as soon as it is queued, then a "settlement" or "rejected" message
+carrying the same seq. Orders settle one at a time in seq order, and at most
+MAX_IN_FLIGHT may be queued or settling per connection. Each order spends a
+token from the user's 'trade' bucket, shared with PlaceTradeView; an order
+arriving to an empty bucket is rejected with status 429.
+
+When the socket closes, the order being settled runs to completion (its result
+is in the trade history), bounded by DRAIN_TIMEOUT for the disconnect handler.
+Orders still queued behind it are dropped without taking a stake, and logged
+with their seq.
+
+Each connection runs its ORM calls on its own sync thread (ThreadSensitiveContext),
+as Django does for each HTTP request, rather than queueing behind every other
+socket on the process-wide one.
+"""
+import asyncio
+import json
+import logging
+import math
+import time
+from urllib.parse import parse_qs
+from asgiref.sync import ThreadSensitiveContext
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from accounts.authentication import ClaimsJWTAuthentication, current_token_version
+from accounts.throttling import TokenBucketThrottle
+from dashboard import metrics
+from .admission import trade_admission
+from .placement import place_trade
+
+logger = logging.getLogger('trading')
+
+MAX_IN_FLIGHT = 10
+THROTTLE_SCOPE = 'trade'  # PlaceTradeView's scope, so both entry points share one bucket
+CLOSE_UNAUTHENTICATED = 4401
+DRAIN_TIMEOUT = 10  # Seconds disconnect() waits for the order being settled
+
+
+def _user_for_token(raw_token):
+    """(user, expiry timestamp) for a valid access token of an active user, else (None, None)."""
+    auth = ClaimsJWTAuthentication()
+    try:
+        token = auth.get_validated_token(raw_token)
+        user = auth.get_user(token)
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None, None
+    return (user, token['exp']) if user.is_active else (None, None)
+
+
+class OrderEntryConsumer(AsyncJsonWebsocketConsumer):
+    channel_layer_alias = None  # Replies go straight to this socket; no channel layer needed
+
+    async def __call__(self, scope, receive, send):
+        async with ThreadSensitiveContext():
+            await super().__call__(scope, receive, send)
+
+    async def connect(self):
+        self.user = None
+        self.expires_at = None
+        self.last_seq = 0
+        self.in_flight = 0
+        self.orders = asyncio.Queue()
+        self.worker = None
+        self.closed = False
+        await self.accept()
+        token = parse_qs(self.scope.get('query_string', b'').decode()).get('token')
+        if token:
+            await self._authenticate(token[0])
+
+    async def disconnect(self, code):
+        self.closed = True
+        if self.worker is None:
+            return
+        dropped = []
+        while not self.orders.empty():
+            dropped.append(self.orders.get_nowait()[0])
+        if dropped:
+            metrics.incr('order_entry.dropped', len(dropped))
+            logger.warning(f"Dropped queued orders {dropped} for user {self.user.id} on disconnect")
+        self.orders.put_nowait(None)  # Stops the worker once the current order settles
+        try:
+            await asyncio.wait_for(asyncio.shield(self.worker), DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Order for user {self.user.id} still settling {DRAIN_TIMEOUT}s after disconnect")
+
+    async def receive_json(self, content, **kwargs):
+        kind = content.get('type') if isinstance(content, dict) else None
+        if self.user is None:
+            if kind == 'auth' and await self._authenticate(content.get('token')):
+                return
+            await self.send_json({'type': 'error', 'error': 'Authentication required'})
+            await self.close(code=CLOSE_UNAUTHENTICATED)
+            return
+        if kind != 'place_trade':
+            await self.send_json({'type': 'error', 'error': f'Unknown message type: {kind}'})
+            return
+
+        seq = content.get('seq')
+        if not await self._session_valid():
+            await self._reject(seq, 'Session expired; reconnect with a new token', 401)
+            await self.close(code=CLOSE_UNAUTHENTICATED)
+            return
+        if not isinstance(seq, int) or isinstance(seq, bool) or seq <= self.last_seq:
+            await self._reject(seq, f'seq must be an integer greater than {self.last_seq}')
+            return
+        if self.in_flight >= MAX_IN_FLIGHT:
+            await self._reject(seq, 'Too many orders in flight')
+            return
+        wait = await database_sync_to_async(TokenBucketThrottle.take)(THROTTLE_SCOPE, self.user.id)
+        if wait:
+            await self._reject(seq, f'Request was throttled. Expected available in {math.ceil(wait)} seconds.', 429)
+            return
+        self.last_seq = seq
+        self.in_flight += 1
+        await self.orders.put((seq, content))
+        metrics.incr('order_entry.accepted')
+        await self.send_json({'type': 'ack', 'seq': seq, 'in_flight': self.in_flight})
+
+    async def _authenticate(self, token):
+        user, expires_at = await database_sync_to_async(_user_for_token)(token) if token else (None, None)
+        if user is None:
+            return False
+        self.user = user
+        self.expires_at = expires_at
+        self.worker = asyncio.create_task(self._settle_orders())
+        await self.send_json({'type': 'authenticated', 'user_id': user.id})
+        return True
+
+    async def _session_valid(self):
+        """False once the token has expired or the claims the user was authenticated with have changed."""
+        if time.time() >= self.expires_at:
+            return False
+        version = await database_sync_to_async(current_token_version)(self.user.id)
+        return version == self.user.token_version
+
+    async def _settle_orders(self):
+        while True:
+            item = await self.orders.get()
+            if item is None:
+                return
+            seq, order = item
+            if await trade_admission.acquire(self.user.id) is not None:
+                payload, code = {'error': 'Trading is busy; retry shortly'}, 503
+            else:
+                try:
+                    payload, code = await place_trade(self.user, order)
+                except Exception as e:
+                    payload, code = {'error': str(e)}, 400
+                finally:
+                    trade_admission.release(self.user.id)
+            self.in_flight -= 1
+            if self.closed:
+                continue  # Nobody to tell; the settled trade is in the history
+            if code == 201:
+                await self.send_json({'type': 'settlement', 'seq': seq, **payload})
+            else:
+                await self._reject(seq, payload.get('error'), code)
+
+    async def _reject(self, seq, error, code=400):
+        metrics.incr('order_entry.rejected')
+        await self.send_json({'type': 'rejected', 'seq': seq, 'status': code, 'error': error})
+
+    @classmethod
+    async def encode_json(cls, content):
+        return json.dumps(content, cls=JSONEncoder)
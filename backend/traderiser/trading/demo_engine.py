@@ -0,0 +1,246 @@
+# trading/demo_engine.py
+"""
+In-process state store for demo accounts.
+
+Balances and trades of the account types listed in
+settings.TRADING_IN_MEMORY_ACCOUNT_TYPES live in memory and are written to the
+database in batches every TRADING_SNAPSHOT_INTERVAL seconds, so demo traffic no
+longer competes with real-money writes for the database write lock.
+
+State is per process: run demo traffic on a single worker (or route users
+stickily) so two workers never hold the same account.
+
+Trade ids are reserved from the table's sequence in blocks of
+TRADE_ID_BLOCK, so a demo trade has its final id as soon as it is placed even
+though its row is inserted later. On database backends without a reservable
+sequence (anything but SQLite and PostgreSQL) the id is assigned on insert.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from decimal import Decimal
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from accounts.response_cache import bump_user_state
+from dashboard.events import publish_balance
+from dashboard.models import Transaction
+from wallet.models import Wallet
+from .models import Trade
+
+logger = logging.getLogger('trading')
+
+DEMO_INITIAL_BALANCE = Decimal('10000.00')
+TRADE_ID_BLOCK = 100
+
+
+def reserve_ids(model, count):
+    """Take `count` ids from `model`'s primary key sequence; an empty list when the backend has none to take."""
+    table, column = model._meta.db_table, model._meta.pk.column
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            # AUTOINCREMENT never hands out an id at or below sqlite_sequence.seq
+            bump = 'UPDATE sqlite_sequence SET seq = seq + %s WHERE name = %s'
+            cursor.execute(bump, [count, table])
+            if not cursor.rowcount:  # Nothing inserted yet, so no sequence row
+                cursor.execute(
+                    f'INSERT INTO sqlite_sequence (name, seq) SELECT %s, COALESCE(MAX("{column}"), 0) FROM "{table}"',
+                    [table],
+                )
+                cursor.execute(bump, [count, table])
+            cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = %s', [table])
+            last = cursor.fetchone()[0]
+            return list(range(last - count + 1, last + 1))
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+                           [table, column, count])
+            return [row[0] for row in cursor.fetchall()]
+    return []
+
+
+class DemoAccountState:
+    """Balance, recent trades and rolling stats for one in-memory account."""
+
+    def __init__(self, account_id, user_id, wallet_id, balance, recent_limit):
+        self.account_id = account_id
+        self.user_id = user_id
+        self.wallet_id = wallet_id
+        self.balance = balance
+        self.recent_trades = deque(maxlen=recent_limit)
+        self.pending_trades = []  # (Trade, Transaction, executed_at) not yet persisted
+        self.trade_count = 0
+        self.win_count = 0
+        self.net_profit = Decimal('0.00')
+        self.dirty = False
+
+    @property
+    def stats(self):
+        recent = list(self.recent_trades)
+        recent_wins = sum(1 for trade in recent if trade.is_win)
+        return {
+            'trade_count': self.trade_count,
+            'win_count': self.win_count,
+            'net_profit': self.net_profit,
+            'recent_win_rate': recent_wins / len(recent) if recent else 0.0,
+            'recent_profit': sum((trade.profit for trade in recent), Decimal('0.00')),
+        }
+
+
+class DemoTradingEngine:
+    def __init__(self, recent_limit=50):
+        self.recent_limit = recent_limit
+        self._states = {}
+        self._lock = threading.RLock()
+        self._flusher = None
+        self._trade_ids = deque()  # Reserved, not yet handed out
+
+    def manages(self, account):
+        return account.account_type in getattr(settings, 'TRADING_IN_MEMORY_ACCOUNT_TYPES', [])
+
+    def peek(self, account_id):
+        """Return the live state without loading it from the database."""
+        return self._states.get(account_id)
+
+    def get_state(self, account):
+        state = self._states.get(account.id)
+        if state is None:
+            state = self._load(account)
+            with self._lock:
+                state = self._states.setdefault(account.id, state)
+            self._ensure_flusher()
+        return state
+
+    def _load(self, account):
+        row = Wallet.objects.filter(
+            account=account, wallet_type='main', currency__code='USD'
+        ).values_list('id', 'balance').first()
+        if row is None:
+            account.balance = DEMO_INITIAL_BALANCE  # Setter creates the main wallet
+            row = Wallet.objects.filter(
+                account=account, wallet_type='main', currency__code='USD'
+            ).values_list('id', 'balance').first()
+        return DemoAccountState(account.id, account.user_id, row[0], row[1], self.recent_limit)
+
+    def debit(self, account, amount):
+        """Deduct a stake; returns False when the balance is insufficient."""
+        state = self.get_state(account)
+        with self._lock:
+            if state.balance < amount:
+                return False
+            state.balance -= amount
+            state.dirty = True
+            balance = state.balance
+        bump_user_state(state.user_id)
+        publish_balance(state.user_id, state.account_id, balance, wallet_id=state.wallet_id)
+        return True
+
+    def credit(self, account, amount):
+        state = self.get_state(account)
+        with self._lock:
+            state.balance += amount
+            state.dirty = True
+            balance = state.balance
+        bump_user_state(state.user_id)
+        publish_balance(state.user_id, state.account_id, balance, wallet_id=state.wallet_id)
+
+    def record_trade(self, account, trade, audit_transaction):
+        """Queue an unsaved Trade and its dashboard Transaction for the next snapshot.
+
+        Both are stamped with the execution time now. The trade also gets its
+        reserved id; the transaction's is only assigned when the snapshot inserts it.
+        """
+        state = self.get_state(account)
+        executed_at = timezone.now()
+        trade.timestamp = audit_transaction.created_at = executed_at
+        trade.pk = self._next_trade_id()
+        with self._lock:
+            state.pending_trades.append((trade, audit_transaction, executed_at))
+            state.recent_trades.append(trade)
+            state.trade_count += 1
+            state.win_count += int(trade.is_win)
+            state.net_profit += trade.profit
+            state.dirty = True
+
+    def _next_trade_id(self):
+        with self._lock:
+            if not self._trade_ids:
+                self._trade_ids.extend(reserve_ids(Trade, TRADE_ID_BLOCK))
+            return self._trade_ids.popleft() if self._trade_ids else None
+
+    def snapshot(self, account_ids=None):
+        """Persist dirty balances and pending trades in a handful of bulk statements."""
+        with self._lock:
+            states = [
+                state for state in self._states.values()
+                if state.dirty and (account_ids is None or state.account_id in account_ids)
+            ]
+            balances = [Wallet(pk=state.wallet_id, balance=state.balance) for state in states]
+            batches = []
+            for state in states:
+                batches.append((state, state.pending_trades))
+                state.pending_trades = []
+                state.dirty = False
+        if not states:
+            return 0
+        pending = [item for _, items in batches for item in items]
+        try:
+            with transaction.atomic():
+                Wallet.objects.bulk_update(balances, ['balance'])
+                if pending:
+                    trades = Trade.objects.bulk_create([trade for trade, _, _ in pending])
+                    audit = Transaction.objects.bulk_create([txn for _, txn, _ in pending])
+                    # auto_now_add stamps persistence time; restore the execution time
+                    for trade, txn, executed_at in pending:
+                        trade.timestamp = executed_at
+                        txn.created_at = executed_at
+                    Trade.objects.bulk_update(trades, ['timestamp'])
+                    Transaction.objects.bulk_update(audit, ['created_at'])
+        except Exception as e:
+            logger.error(f"Demo snapshot failed, requeueing {len(pending)} trades: {str(e)}")
+            with self._lock:
+                for state, items in batches:
+                    state.pending_trades[:0] = items
+                    state.dirty = True
+            raise
+        for user_id in {state.user_id for state in states}:
+            bump_user_state(user_id)  # Trade history and dashboard now read the persisted rows
+        return len(pending)
+
+    def snapshot_user(self, user_id):
+        """Persist one user's pending state before reading it back from the database."""
+        account_ids = {state.account_id for state in list(self._states.values()) if state.user_id == user_id}
+        if account_ids:
+            self.snapshot(account_ids)
+
+    def evict(self, account_id):
+        """Flush one account and drop it, so the next access reloads from the database."""
+        if account_id not in self._states:
+            return
+        self.snapshot({account_id})
+        with self._lock:
+            self._states.pop(account_id, None)
+
+    def _ensure_flusher(self):
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name='demo-snapshot', daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self):
+        interval = getattr(settings, 'TRADING_SNAPSHOT_INTERVAL', 5)
+        while True:
+            time.sleep(interval)
+            try:
+                self.snapshot()
+            except Exception:
+                pass  # Already logged; retried on the next tick
+            finally:
+                close_old_connections()
+
+
+demo_engine = DemoTradingEngine()
+atexit.register(demo_engine.snapshot)
@@ -0,0 +1,68 @@
+# trading/export.py
+"""Row encoders for streaming trade-history exports; rows are .values() dicts, not models."""
+import csv
+import json
+from datetime import datetime
+from decimal import Decimal
+
+EXPORT_COLUMNS = [
+    ('id', 'id'),
+    ('timestamp', 'timestamp'),
+    ('account_type', 'account__account_type'),
+    ('market', 'market__name'),
+    ('trade_type', 'trade_type__name'),
+    ('direction', 'direction'),
+    ('amount', 'amount'),
+    ('is_win', 'is_win'),
+    ('profit', 'profit'),
+    ('martingale_level', 'martingale_level'),
+    ('robot', 'used_robot__name'),
+    ('is_demo', 'is_demo'),
+    ('entry_spot', 'entry_spot'),
+    ('exit_spot', 'exit_spot'),
+]
+EXPORT_LOOKUPS = [lookup for _, lookup in EXPORT_COLUMNS]
+ROWS_PER_CHUNK = 500  # Rows joined into one chunk of the streamed response
+
+
+def _plain(value):
+    if isinstance(value, Decimal):
+        return str(value)  # Keep exact decimal places
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+class _LineBuffer:
+    """File-like object that hands back what csv.writer writes instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def _chunked(lines):
+    chunk = []
+    limit = 1  # Flush the first row on its own so the first byte is not held back
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= limit:
+            limit = ROWS_PER_CHUNK
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def encode_csv(rows):
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow([name for name, _ in EXPORT_COLUMNS])  # Header goes out before the first query
+    yield from _chunked(
+        writer.writerow([_plain(row[lookup]) for lookup in EXPORT_LOOKUPS]) for row in rows
+    )
+
+
+def encode_ndjson(rows):
+    yield from _chunked(
+        json.dumps({name: _plain(row[lookup]) for name, lookup in EXPORT_COLUMNS}, separators=(',', ':')) + '\n'
+        for row in rows
+    )
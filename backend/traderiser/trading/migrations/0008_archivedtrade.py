@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:47
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_remove_account_balance'),
+        ('trading', '0007_delete_marketchatmessage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTrade',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('direction', models.CharField(choices=[('buy', 'Buy/Rise/Touch'), ('sell', 'Sell/Fall/No Touch')], max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('is_win', models.BooleanField()),
+                ('profit', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('timestamp', models.DateTimeField()),
+                ('used_martingale', models.BooleanField(default=False)),
+                ('martingale_level', models.PositiveIntegerField(default=0)),
+                ('session_profit_before', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('is_demo', models.BooleanField(default=False)),
+                ('entry_spot', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('exit_spot', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('current_spot', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='accounts.account')),
+                ('market', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='trading.market')),
+                ('trade_type', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='trading.tradetype')),
+                ('used_robot', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='trading.robot')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'timestamp'], name='trading_arc_user_id_2d270d_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_remove_account_balance'),
+        ('trading', '0008_archivedtrade'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['user', 'timestamp'], name='trading_tra_user_id_da151c_idx'),
+        ),
+    ]
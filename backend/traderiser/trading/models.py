@@ -3,6 +3,7 @@ from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
 from accounts.models import Account
+from accounts.response_cache import bump_user_state
 
 class MarketType(models.Model):
     name = models.CharField(max_length=50, unique=True)  # e.g., 'forex', 'crypto'
@@ -53,6 +54,10 @@ class UserRobot(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.robot.name}"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        bump_user_state(self.user_id)
+
 class TradingSetting(models.Model):
     martingale_multiplier = models.PositiveIntegerField(default=2)
 
@@ -84,5 +89,39 @@ class Trade(models.Model):
     exit_spot = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)   # Added
     current_spot = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True) # Added
 
+    class Meta:
+        indexes = [models.Index(fields=['user', 'timestamp'])]  # History reads and exports
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        bump_user_state(self.user_id)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.market.name} - {self.direction} - {'Win' if self.is_win else 'Loss'}"
+
+class ArchivedTrade(models.Model):
+    """Cold copy of a Trade moved out by the archive_history command; ids are preserved."""
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    account = models.ForeignKey(Account, on_delete=models.PROTECT, related_name='+')
+    market = models.ForeignKey(Market, on_delete=models.PROTECT, related_name='+')
+    trade_type = models.ForeignKey(TradeType, on_delete=models.PROTECT, related_name='+')
+    direction = models.CharField(max_length=10, choices=Trade.DIRECTIONS)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    is_win = models.BooleanField()
+    profit = models.DecimalField(max_digits=12, decimal_places=2)
+    timestamp = models.DateTimeField()
+    used_martingale = models.BooleanField(default=False)
+    martingale_level = models.PositiveIntegerField(default=0)
+    used_robot = models.ForeignKey(Robot, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    session_profit_before = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    is_demo = models.BooleanField(default=False)
+    entry_spot = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    exit_spot = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    current_spot = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'timestamp'])]
+
     def __str__(self):
-        return f"{self.user.username} - {self.market.name} - {self.direction} - {'Win' if self.is_win else 'Loss'}"
\ No newline at end of file
+        return f"{self.user.username} - {self.market.name} - {self.direction} - {'Win' if self.is_win else 'Loss'} (archived)"
\ No newline at end of file
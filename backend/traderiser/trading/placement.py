@@ -0,0 +1,217 @@
+# trading/placement.py
+"""
+Trade placement shared by PlaceTradeView and the WebSocket order-entry consumer.
+"""
+import asyncio
+import random
+from decimal import Decimal
+from asgiref.sync import sync_to_async
+from rest_framework import status
+from accounts import idempotency
+from accounts.async_views import serialize
+from accounts.models import Account
+from dashboard import events
+from dashboard.models import Transaction
+from .demo_engine import demo_engine
+from .quotes import quote_table
+from .models import Market, TradeType, Robot, UserRobot, TradingSetting, Trade
+from .serializers import TradeSerializer
+
+
+async def place_trade(user, data):
+    """Place and settle one trade; returns (payload, HTTP status code)."""
+    market_id = data.get('market_id')
+    trade_type_id = data.get('trade_type_id')
+    direction = data.get('direction')  # 'buy' or 'sell'
+    amount = Decimal(data.get('amount'))
+    use_martingale = data.get('use_martingale', False)
+    martingale_level = data.get('martingale_level', 0)  # New: current martingale level
+    robot_id = data.get('robot_id')
+    account_type = data.get('account_type', 'standard')
+    target_profit = data.get('target_profit')  # Optional Decimal
+    stop_loss = data.get('stop_loss')  # Optional Decimal
+
+    if target_profit is not None:
+        try:
+            target_profit = Decimal(target_profit)
+        except:
+            return {'error': 'Invalid target profit'}, status.HTTP_400_BAD_REQUEST
+    
+    if stop_loss is not None:
+        try:
+            stop_loss = Decimal(stop_loss)
+        except:
+            return {'error': 'Invalid stop loss'}, status.HTTP_400_BAD_REQUEST
+
+    if amount <= 0:
+        return {'error': 'Amount must be positive'}, status.HTTP_400_BAD_REQUEST
+
+    in_memory = False
+    charged = False
+    try:
+        market, trade_type, account, trading_setting = await asyncio.gather(
+            Market.objects.select_related('market_type').aget(id=market_id),
+            TradeType.objects.aget(id=trade_type_id),
+            Account.objects.with_balance().owned_by(user, account_type).aget(),
+            sync_to_async(TradingSetting.get_instance)(),
+        )
+        is_demo = account.account_type == 'demo'
+        effective_sashi = user.is_sashi or is_demo
+        # Demo balances and trades are kept in memory and persisted in batches
+        in_memory = demo_engine.manages(account)
+
+        used_robot = None
+        if robot_id:
+            robot = await Robot.objects.aget(id=robot_id)
+            if is_demo:
+                if not robot.available_for_demo:
+                    return {'error': 'Robot not available for demo'}, status.HTTP_400_BAD_REQUEST
+            else:
+                await UserRobot.objects.aget(user=user, robot=robot)  # Check ownership for real
+            used_robot = robot
+
+        # Martingale setup
+        martingale_mult = trading_setting.martingale_multiplier
+        session_profit_before = Decimal('0.00')  # Could query sum of today's profits if needed
+        if in_memory:
+            session_profit_before = (await sync_to_async(demo_engine.get_state)(account)).net_profit
+
+        # Calculate current amount for this level
+        current_amount = amount * (martingale_mult ** martingale_level)
+
+        # Deduct stake instantly
+        if in_memory:
+            if not await sync_to_async(demo_engine.debit)(account, current_amount):
+                return {'error': 'Insufficient balance for this trade'}, status.HTTP_400_BAD_REQUEST
+        else:
+            # Checked and applied in one UPDATE; the balance loaded above may already be stale
+            if await sync_to_async(account.adjust_balance)(-current_amount) is None:
+                return {'error': 'Insufficient balance for this trade'}, status.HTTP_400_BAD_REQUEST
+        charged = True
+
+        # Determine win probability (updated for realism)
+        if use_martingale and not effective_sashi:
+            win_prob = 0.1  # Keep 10% for non-Sashi with martingale
+        elif used_robot:
+            if effective_sashi:
+                # Base 80% for Sashi with robot; boost to 95% on martingale recovery levels
+                win_prob = 0.8 if martingale_level == 0 else 0.95
+            else:
+                robot_wr = used_robot.win_rate
+                if robot_wr >= 90:
+                    win_prob = 0.8  # Adjusted down for more realism, but still high
+                elif robot_wr >= 50:
+                    win_prob = robot_wr / 100.0
+                else:
+                    win_prob = 0.2  # Adjusted up to 20% for occasional wins
+        else:
+            if effective_sashi:
+                # Base 80% for Sashi; boost to 95% on martingale recovery levels
+                win_prob = 0.8 if martingale_level == 0 else 0.95
+            else:
+                win_prob = 0.2  # Adjusted up to 20% for non-Sashi (occasional 1-2 wins, but more losses)
+
+        # Simulate delay for realism (1-5s)
+        await asyncio.sleep(random.uniform(1, 5))
+
+        is_win = random.random() < win_prob
+
+        # Simulate spots, continuing from the market's latest quote
+        last_price = quote_table.price(market.id)
+        entry_spot = float(last_price) if last_price else random.uniform(1.0, 100.0)
+        delta = random.uniform(0.01, 0.1)
+        if direction == 'buy':
+            exit_spot = entry_spot + delta if is_win else entry_spot - delta
+        else:
+            exit_spot = entry_spot - delta if is_win else entry_spot + delta
+        current_spot = exit_spot
+        quote_table.update(market.id, current_spot)
+
+        if is_win:
+            gross_payout = current_amount * market.profit_multiplier
+            net_profit = gross_payout - current_amount
+        else:
+            gross_payout = Decimal('0.00')
+            net_profit = -current_amount
+
+        # Create Trade record
+        trade = Trade(
+            user=user,
+            account=account,
+            market=market,
+            trade_type=trade_type,
+            direction=direction,
+            amount=current_amount,
+            is_win=is_win,
+            profit=net_profit,
+            used_martingale=use_martingale and martingale_level > 0,
+            martingale_level=martingale_level,
+            used_robot=used_robot,
+            session_profit_before=session_profit_before,
+            is_demo=is_demo,
+            entry_spot=Decimal(entry_spot).quantize(Decimal('0.00')),
+            exit_spot=Decimal(exit_spot).quantize(Decimal('0.00')),
+            current_spot=Decimal(current_spot).quantize(Decimal('0.00'))
+        )
+
+        # Create Transaction
+        audit_transaction = Transaction(
+            account=account,
+            amount=net_profit,
+            transaction_type='credit' if is_win else 'debit',
+            description=f"{'Demo ' if is_demo else ''}Trade on {market.name}: {'Win' if is_win else 'Loss'} (Level {martingale_level})"
+        )
+        # Shielded: once the outcome is drawn, a client disconnect still pays out and records the trade
+        charged = False
+        settlement = asyncio.ensure_future(_settle(user, account, in_memory, gross_payout, trade, audit_transaction))
+        idempotency.settling(settlement)
+
+        # No loop, so no internal stop_loss or target_profit checks; handled in frontend
+        return await asyncio.shield(settlement)
+
+    except asyncio.CancelledError:
+        # A client disconnect cancels the request while the trade is pending; hand the stake back
+        if charged:
+            await asyncio.shield(_refund(account, in_memory, current_amount))
+        raise
+    except (Market.DoesNotExist, TradeType.DoesNotExist, Account.DoesNotExist, Robot.DoesNotExist, UserRobot.DoesNotExist) as e:
+        if charged:
+            await _refund(account, in_memory, current_amount)
+        return {'error': str(e)}, status.HTTP_404_NOT_FOUND
+    except Exception as e:
+        if charged:
+            await _refund(account, in_memory, current_amount)
+        return {'error': str(e)}, status.HTTP_400_BAD_REQUEST
+
+
+async def _settle(user, account, in_memory, payout, trade, audit_transaction):
+    """Credit any payout, record the trade and return the response to the placement."""
+    if in_memory:
+        if payout:
+            await sync_to_async(demo_engine.credit)(account, payout)
+        await sync_to_async(demo_engine.record_trade)(account, trade, audit_transaction)
+    else:
+        if payout:
+            await sync_to_async(account.adjust_balance)(payout)
+        await trade.asave()
+        await audit_transaction.asave()
+
+    trade_data = await serialize(TradeSerializer, [trade], many=True)
+    if trade.pk is None:
+        del trade_data[0]['id']  # Demo trade on a backend without reserved ids; see demo_engine
+    await sync_to_async(events.publish)(user.id, 'trade', trade_data[0])
+
+    return {
+        'trades': trade_data,
+        'total_profit': trade.profit,
+        'message': 'Trade completed.',
+        'is_demo': trade.is_demo
+    }, status.HTTP_201_CREATED
+
+
+async def _refund(account, in_memory, amount):
+    """Return a stake taken before the trade failed to settle."""
+    if in_memory:
+        await sync_to_async(demo_engine.credit)(account, amount)
+    else:
+        await sync_to_async(account.adjust_balance)(amount)
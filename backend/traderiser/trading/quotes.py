@@ -0,0 +1,56 @@
+# trading/quotes.py
+"""
+In-memory latest-quote table behind QuoteSnapshotView.
+
+Each market keeps one ready-to-render quote dict, replaced whole on every
+update, so reads need neither a lock nor the database. A process-wide sequence
+number stamps each update; clients pass the highest one they have seen to get
+only newer quotes, or revalidate with the ETag. Prices come from trade
+settlements (trading.placement), the only price source in the app.
+"""
+import threading
+from decimal import Decimal
+from django.utils import timezone
+
+CENT = Decimal('0.01')
+
+
+class QuoteTable:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._quotes = {}  # market_id -> quote dict (never mutated once stored)
+        self._prices = {}  # market_id -> Decimal price, for the next change
+        self.seq = 0
+
+    def update(self, market_id, price, timestamp=None):
+        price = Decimal(price).quantize(CENT)
+        timestamp = timestamp or timezone.now()
+        with self._lock:
+            previous = self._prices.get(market_id, price)
+            self.seq += 1
+            self._prices[market_id] = price
+            self._quotes[market_id] = {
+                'market_id': market_id,
+                'price': str(price),
+                'change': str(price - previous),
+                'timestamp': timestamp.isoformat(),
+                'seq': self.seq,
+            }
+
+    def price(self, market_id):
+        return self._prices.get(market_id)
+
+    def snapshot(self, market_ids=None, since=0):
+        """Returns (latest seq among the requested quotes, quotes with seq > since)."""
+        quotes = self._quotes
+        if market_ids is None:
+            found = list(quotes.values())
+        else:
+            found = [quote for quote in map(quotes.get, market_ids) if quote is not None]
+        latest = max((quote['seq'] for quote in found), default=0)
+        if since:
+            found = [quote for quote in found if quote['seq'] > since]
+        return latest, found
+
+
+quote_table = QuoteTable()
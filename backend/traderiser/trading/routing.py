@@ -0,0 +1,7 @@
+# trading/routing.py
+from django.urls import path
+from .consumers import OrderEntryConsumer
+
+websocket_urlpatterns = [
+    path('ws/trading/orders/', OrderEntryConsumer.as_asgi()),
+]
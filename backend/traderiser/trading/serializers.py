@@ -1,5 +1,6 @@
 # trading/serializers.py
 from rest_framework import serializers
+from accounts.fieldsets import SparseFieldsMixin
 from .models import MarketType, Market, TradeType, Robot, UserRobot, Trade
 
 class MarketTypeSerializer(serializers.ModelSerializer):
@@ -25,7 +26,7 @@ class TradeTypeSerializer(serializers.ModelSerializer):
         model = TradeType
         fields = '__all__'
 
-class RobotSerializer(serializers.ModelSerializer):
+class RobotSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Robot
         fields = '__all__'
@@ -37,7 +38,7 @@ class UserRobotSerializer(serializers.ModelSerializer):
         model = UserRobot
         fields = ['id', 'robot', 'purchased_at']
 
-class TradeSerializer(serializers.ModelSerializer):
+class TradeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     market = MarketSerializer(read_only=True)
     trade_type = TradeTypeSerializer(read_only=True)
     used_robot = RobotSerializer(read_only=True)  # If needed for history
@@ -1,3 +1,201 @@
-from django.test import TestCase
+import asyncio
+import json
+from decimal import Decimal
+from unittest import mock
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+from accounts.authentication import bump_token_version, issue_tokens
+from accounts.models import User, Account
+from accounts.response_cache import state_version
+from wallet.models import Wallet
+from .admission import AdmissionController, QUEUE_TIMEOUT, SATURATED, USER_LIMIT, trade_admission
+from .consumers import OrderEntryConsumer
+from .demo_engine import DemoTradingEngine
+from dashboard.models import Transaction
+from .models import MarketType, Market, TradeType, Trade
+from .serializers import TradeSerializer
+from .placement import place_trade
 
-# Create your tests here.
+
+class PlaceTradeConcurrencyTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='trader', email='trader@example.com', password='pw12345!')
+        self.account = Account.objects.create(user=self.user, account_type='standard')
+        self.account.balance = Decimal('100.00')
+        market_type = MarketType.objects.create(name='forex')  # profit_multiplier 1.85
+        self.market = Market.objects.create(name='EURUSD', market_type=market_type)
+        self.trade_type = TradeType.objects.create(name='buy/sell')
+
+    async def test_overlapping_trades_keep_each_others_balance_changes(self):
+        both_staked = asyncio.Barrier(2)
+
+        async def sleep(delay):
+            await both_staked.wait()  # Neither settles until both stakes are taken
+
+        order = {'market_id': self.market.id, 'trade_type_id': self.trade_type.id, 'direction': 'buy', 'amount': '10.00'}
+        with mock.patch('trading.placement.asyncio.sleep', sleep), \
+                mock.patch('trading.placement.random.random', side_effect=[0.0, 0.99]):  # One win, one loss
+            results = await asyncio.gather(place_trade(self.user, dict(order)), place_trade(self.user, dict(order)))
+
+        self.assertEqual([code for _, code in results], [201, 201])
+        account = await Account.objects.with_balance().aget(pk=self.account.pk)
+        self.assertEqual(account.balance, Decimal('98.50'))  # 100 - 10 - 10 + 18.50
+
+    async def test_stake_beyond_the_balance_is_refused(self):
+        with mock.patch('trading.placement.asyncio.sleep'):
+            payload, code = await place_trade(self.user, {
+                'market_id': self.market.id, 'trade_type_id': self.trade_type.id,
+                'direction': 'buy', 'amount': '100.01',
+            })
+        self.assertEqual(code, 400)
+        account = await Account.objects.with_balance().aget(pk=self.account.pk)
+        self.assertEqual(account.balance, Decimal('100.00'))
+
+
+class PlaceTradeCancellationTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='trader', email='trader@example.com', password='pw12345!')
+        self.account = Account.objects.create(user=self.user, account_type='standard')
+        self.account.balance = Decimal('360.43')
+        market_type = MarketType.objects.create(name='forex')
+        self.market = Market.objects.create(name='EURUSD', market_type=market_type)
+        self.trade_type = TradeType.objects.create(name='buy/sell')
+
+    async def test_cancel_during_sleep_refunds_stake(self):
+        sleeping = asyncio.Event()
+
+        async def sleep(delay):
+            sleeping.set()
+            await asyncio.Event().wait()  # Until cancelled
+
+        with mock.patch('trading.placement.asyncio.sleep', sleep):
+            task = asyncio.create_task(place_trade(self.user, {
+                'market_id': self.market.id, 'trade_type_id': self.trade_type.id,
+                'direction': 'buy', 'amount': '1.00',
+            }))
+            await sleeping.wait()
+            account = await Account.objects.with_balance().aget(pk=self.account.pk)
+            self.assertEqual(account.balance, Decimal('359.43'))  # Stake taken
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        account = await Account.objects.with_balance().aget(pk=self.account.pk)
+        self.assertEqual(account.balance, Decimal('360.43'))
+        self.assertFalse(await Trade.objects.filter(user=self.user).aexists())
+
+
+class DemoEngineSnapshotTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='trader', email='trader@example.com', password='pw12345!')
+        self.account = Account.objects.create(user=self.user, account_type='demo')
+        self.engine = DemoTradingEngine()
+        self.engine._ensure_flusher = lambda: None  # Snapshots only when the test asks
+
+    def test_snapshot_persists_the_in_memory_balance_and_invalidates_cached_responses(self):
+        self.assertTrue(self.engine.debit(self.account, Decimal('25.00')))
+        self.engine.credit(self.account, Decimal('5.00'))
+        version = state_version(self.user.id)
+
+        self.engine.snapshot()
+
+        wallet = Wallet.objects.get(account=self.account, wallet_type='main', currency__code='USD')
+        self.assertEqual(wallet.balance, Decimal('9980.00'))
+        self.assertGreater(state_version(self.user.id), version)
+
+    def test_demo_trade_keeps_the_id_reserved_when_it_was_placed(self):
+        market = Market.objects.create(name='EURUSD', market_type=MarketType.objects.create(name='forex'))
+        trade_type = TradeType.objects.create(name='buy/sell')
+        fields = {'user': self.user, 'account': self.account, 'market': market, 'trade_type': trade_type,
+                  'direction': 'buy', 'amount': Decimal('10.00'), 'is_win': False, 'profit': Decimal('-10.00')}
+        trade = Trade(is_demo=True, **fields)
+        self.engine.record_trade(self.account, trade, Transaction(account=self.account, amount=Decimal('-10.00')))
+        reserved = trade.pk
+        self.assertIsNotNone(reserved)
+
+        other = Trade.objects.create(**fields)  # Inserted before the snapshot, outside the engine
+        self.engine.snapshot()
+
+        self.assertNotEqual(other.pk, reserved)
+        self.assertTrue(Trade.objects.filter(pk=reserved, is_demo=True).exists())
+
+
+class OrderEntrySessionTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='trader', email='trader@example.com', password='pw12345!')
+        Account.objects.create(user=self.user, account_type='standard')
+        self.token = str(issue_tokens(self.user).access_token)
+
+    async def test_order_after_the_claims_change_closes_the_socket(self):
+        socket = ApplicationCommunicator(OrderEntryConsumer.as_asgi(), {
+            'type': 'websocket', 'path': '/ws/trading/orders/', 'headers': [], 'subprotocols': [],
+            'query_string': f'token={self.token}'.encode(),
+        })
+        await socket.send_input({'type': 'websocket.connect'})
+        self.assertEqual((await socket.receive_output())['type'], 'websocket.accept')
+        self.assertEqual(json.loads((await socket.receive_output())['text'])['type'], 'authenticated')
+
+        await sync_to_async(bump_token_version)(self.user.id)  # E.g. the user was made Sashi
+        await socket.send_input({'type': 'websocket.receive', 'text': json.dumps({'type': 'place_trade', 'seq': 1})})
+
+        rejected = json.loads((await socket.receive_output())['text'])
+        self.assertEqual((rejected['type'], rejected['seq'], rejected['status']), ('rejected', 1, 401))
+        self.assertEqual(await socket.receive_output(), {'type': 'websocket.close', 'code': 4401})
+        await socket.send_input({'type': 'websocket.disconnect', 'code': 4401})
+        await socket.wait()
+
+
+class AdmissionControllerTests(TestCase):
+    async def test_excess_requests_are_shed_and_freed_slots_handed_on(self):
+        controller = AdmissionController('test', limit=1, queue_size=1, per_user=1, wait_timeout=0.5)
+        self.assertIsNone(await controller.acquire(1))
+        self.assertEqual(await controller.acquire(1), USER_LIMIT)
+
+        waiting = asyncio.ensure_future(controller.acquire(2))
+        await asyncio.sleep(0)
+        self.assertEqual(await controller.acquire(3), SATURATED)  # Queue already full
+
+        controller.release(1)
+        self.assertIsNone(await waiting)  # Granted the freed slot
+        controller.release(2)
+
+    async def test_waiter_times_out_when_no_slot_frees(self):
+        controller = AdmissionController('test', limit=1, queue_size=1, per_user=1, wait_timeout=0.05)
+        self.assertIsNone(await controller.acquire(1))
+        self.assertEqual(await controller.acquire(2), QUEUE_TIMEOUT)
+        controller.release(1)
+
+    def test_shed_trade_is_answered_with_503_and_retry_after(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='trader', email='trader@example.com', password='pw12345!'))
+        with mock.patch.object(trade_admission, 'acquire', mock.AsyncMock(return_value=SATURATED)):
+            response = client.post('/api/trading/trades/place/', {'amount': '1.00'}, format='json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], str(trade_admission.retry_after))
+
+
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='trader', email='trader@example.com', password='pw12345!')
+        account = Account.objects.create(user=self.user, account_type='standard')
+        self.market = Market.objects.create(name='EURUSD', market_type=MarketType.objects.create(name='forex'))
+        Trade.objects.create(user=self.user, account=account, market=self.market, trade_type=TradeType.objects.create(name='buy/sell'),
+                             direction='buy', amount=Decimal('10.00'), is_win=True, profit=Decimal('8.50'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_fields_and_expand_narrow_the_rendered_rows(self):
+        response = self.client.get('/api/trading/trades/history/', {'fields': 'id,profit,market', 'expand': ''})
+        self.assertEqual(response.status_code, 200)
+        [trade] = response.data['trades']
+        self.assertEqual(set(trade), {'id', 'profit', 'market'})
+        self.assertEqual(trade['market'], self.market.id)  # Not expanded, so just its key
+
+        [trade] = self.client.get('/api/trading/trades/history/', {'fields': 'market', 'expand': 'market'}).data['trades']
+        self.assertEqual(trade['market']['name'], 'EURUSD')
+
+    def test_narrow_loads_only_the_selected_columns(self):
+        queryset = TradeSerializer.narrow(Trade.objects.all(), fields={'id', 'profit'}, expand=set())
+        self.assertEqual(queryset.query.deferred_loading, ({'id', 'profit'}, False))
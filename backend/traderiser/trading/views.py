@@ -1,16 +1,29 @@
-import time
-import random
+import asyncio
 from decimal import Decimal
 from datetime import date
 from rest_framework.views import APIView
+from asgiref.sync import sync_to_async
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from .models import Market, TradeType, Robot, UserRobot, TradingSetting, Trade
+from rest_framework.pagination import CursorPagination
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_date
+from .models import Market, TradeType, Robot, UserRobot, Trade, ArchivedTrade
 from .serializers import MarketSerializer, TradeTypeSerializer, RobotSerializer, UserRobotSerializer, TradeSerializer
+from .demo_engine import demo_engine
+from .placement import place_trade
+from .quotes import quote_table
+from .admission import admission_controlled, trade_admission
+from .export import EXPORT_LOOKUPS, encode_csv, encode_ndjson
+from accounts.async_views import AsyncAPIView, serialize
+from accounts.fieldsets import requested_fields
 from accounts.models import Account
+from accounts.idempotency import IdempotencyMixin, idempotent
+from accounts.throttling import TokenBucketThrottle
+from accounts.response_cache import cached_per_user
 from dashboard.models import Transaction
-from decimal import Decimal, InvalidOperation
+from dashboard.archive import MergedHistory, archive_cutoff
 
 class MarketListView(APIView):
     permission_classes = [IsAuthenticated]
@@ -20,6 +33,37 @@ class MarketListView(APIView):
         serializer = MarketSerializer(markets, many=True)
         return Response(serializer.data)
 
+class QuoteSnapshotView(APIView):
+    """Latest price, change and timestamp for ?ids=1,2,3 (default all), served from memory.
+
+    ?since=<seq> returns only quotes updated after that sequence number, and the
+    ETag carries the latest one so an unchanged snapshot revalidates to 304.
+    """
+    permission_classes = [IsAuthenticated]
+    max_ids = 1000
+
+    def get(self, request):
+        params = request.query_params
+        market_ids = None
+        try:
+            if params.get('ids'):
+                market_ids = [int(market_id) for market_id in params['ids'].split(',')]
+            since = int(params.get('since', 0))
+        except ValueError:
+            return Response({'error': 'ids and since must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if market_ids is not None and len(market_ids) > self.max_ids:
+            return Response({'error': f'At most {self.max_ids} ids per request'}, status=status.HTTP_400_BAD_REQUEST)
+
+        latest, quotes = quote_table.snapshot(market_ids, since)
+        etag = f'"{latest}"'
+        if request.headers.get('If-None-Match') == etag:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response({'seq': latest, 'quotes': quotes})
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
+
 class TradeTypeListView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -32,8 +76,9 @@ class RobotListView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        robots = Robot.objects.all()
-        serializer = RobotSerializer(robots, many=True)
+        selection = requested_fields(request)
+        robots = RobotSerializer.narrow(Robot.objects.all(), **selection)
+        serializer = RobotSerializer(robots, many=True, **selection)
         return Response(serializer.data)
 
 class PurchaseRobotView(APIView):
@@ -44,7 +89,7 @@ class PurchaseRobotView(APIView):
         account_type = request.data.get('account_type', 'standard')
         try:
             robot = Robot.objects.get(id=robot_id)
-            account = Account.objects.get(user=request.user, account_type=account_type)
+            account = Account.objects.owned_by(request.user, account_type).get()
             if account.account_type == 'demo':
                 if robot.available_for_demo:
                     UserRobot.objects.get_or_create(user=request.user, robot=robot)
@@ -70,220 +115,140 @@ class PurchaseRobotView(APIView):
 class UserRobotListView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @cached_per_user('user_robots')
     def get(self, request):
         user_robots = UserRobot.objects.filter(user=request.user)
         serializer = UserRobotSerializer(user_robots, many=True)
         return Response(serializer.data)
 
+
 # trading/views.py (relevant part: PlaceTradeView)
 
-class PlaceTradeView(APIView):
+class PlaceTradeView(IdempotencyMixin, AsyncAPIView):
     permission_classes = [IsAuthenticated]
-
-    def post(self, request):
-        data = request.data
-        user = request.user
-        market_id = data.get('market_id')
-        trade_type_id = data.get('trade_type_id')
-        direction = data.get('direction')  # 'buy' or 'sell'
-        amount = Decimal(data.get('amount'))
-        use_martingale = data.get('use_martingale', False)
-        martingale_level = data.get('martingale_level', 0)  # New: current martingale level
-        robot_id = data.get('robot_id')
-        account_type = data.get('account_type', 'standard')
-        target_profit = data.get('target_profit')  # Optional Decimal
-        stop_loss = data.get('stop_loss')  # Optional Decimal
-
-        if target_profit is not None:
-            try:
-                target_profit = Decimal(target_profit)
-            except:
-                return Response({'error': 'Invalid target profit'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        if stop_loss is not None:
-            try:
-                stop_loss = Decimal(stop_loss)
-            except:
-                return Response({'error': 'Invalid stop loss'}, status=status.HTTP_400_BAD_REQUEST)
-
-        if amount <= 0:
-            return Response({'error': 'Amount must be positive'}, status=status.HTTP_400_BAD_REQUEST)
-
-        try:
-            market = Market.objects.get(id=market_id)
-            trade_type = TradeType.objects.get(id=trade_type_id)
-            account = Account.objects.get(user=user, account_type=account_type)
-            is_demo = account.account_type == 'demo'
-            effective_sashi = user.is_sashi or is_demo
-
-            used_robot = None
-            if robot_id:
-                robot = Robot.objects.get(id=robot_id)
-                if is_demo:
-                    if not robot.available_for_demo:
-                        return Response({'error': 'Robot not available for demo'}, status=status.HTTP_400_BAD_REQUEST)
-                else:
-                    UserRobot.objects.get(user=user, robot=robot)  # Check ownership for real
-                used_robot = robot
-
-            # Martingale setup
-            martingale_mult = TradingSetting.get_instance().martingale_multiplier
-            trades = []
-            total_net_profit = Decimal('0.00')
-            session_profit_before = Decimal('0.00')  # Could query sum of today's profits if needed
-
-            # Calculate current amount for this level
-            current_amount = amount * (martingale_mult ** martingale_level)
-
-            if account.balance < current_amount:
-                return Response({'error': 'Insufficient balance for this trade'}, status=status.HTTP_400_BAD_REQUEST)
-
-            # Deduct stake instantly
-            account.balance -= current_amount
-            account.save()
-
-            # Determine win probability (updated for realism)
-            if use_martingale and not effective_sashi:
-                win_prob = 0.1  # Keep 10% for non-Sashi with martingale
-            elif used_robot:
-                if effective_sashi:
-                    # Base 80% for Sashi with robot; boost to 95% on martingale recovery levels
-                    win_prob = 0.8 if martingale_level == 0 else 0.95
-                else:
-                    robot_wr = used_robot.win_rate
-                    if robot_wr >= 90:
-                        win_prob = 0.8  # Adjusted down for more realism, but still high
-                    elif robot_wr >= 50:
-                        win_prob = robot_wr / 100.0
-                    else:
-                        win_prob = 0.2  # Adjusted up to 20% for occasional wins
-            else:
-                if effective_sashi:
-                    # Base 80% for Sashi; boost to 95% on martingale recovery levels
-                    win_prob = 0.8 if martingale_level == 0 else 0.95
-                else:
-                    win_prob = 0.2  # Adjusted up to 20% for non-Sashi (occasional 1-2 wins, but more losses)
-
-            # Simulate delay for realism (1-5s)
-            time.sleep(random.uniform(1, 5))
-
-            is_win = random.random() < win_prob
-
-            # Simulate spots
-            entry_spot = random.uniform(1.0, 100.0)
-            delta = random.uniform(0.01, 0.1)
-            if direction == 'buy':
-                exit_spot = entry_spot + delta if is_win else entry_spot - delta
-            else:
-                exit_spot = entry_spot - delta if is_win else entry_spot + delta
-            current_spot = exit_spot
-
-            if is_win:
-                gross_payout = current_amount * market.profit_multiplier
-                net_profit = gross_payout - current_amount
-                account.balance += gross_payout
-            else:
-                gross_payout = Decimal('0.00')
-                net_profit = -current_amount
-
-            account.save()
-
-            total_net_profit = net_profit
-
-            # Create Trade record
-            trade = Trade.objects.create(
-                user=user,
-                account=account,
-                market=market,
-                trade_type=trade_type,
-                direction=direction,
-                amount=current_amount,
-                is_win=is_win,
-                profit=net_profit,
-                used_martingale=use_martingale and martingale_level > 0,
-                martingale_level=martingale_level,
-                used_robot=used_robot,
-                session_profit_before=session_profit_before,
-                is_demo=is_demo,
-                entry_spot=Decimal(entry_spot).quantize(Decimal('0.00')),
-                exit_spot=Decimal(exit_spot).quantize(Decimal('0.00')),
-                current_spot=Decimal(current_spot).quantize(Decimal('0.00'))
-            )
-            trades.append(trade)
-
-            # Create Transaction
-            Transaction.objects.create(
-                account=account,
-                amount=net_profit,
-                transaction_type='credit' if is_win else 'debit',
-                description=f"{'Demo ' if is_demo else ''}Trade on {market.name}: {'Win' if is_win else 'Loss'} (Level {martingale_level})"
-            )
-
-            # No loop, so no internal stop_loss or target_profit checks; handled in frontend
-
-            message = 'Trade completed.'
-
-            return Response({
-                'trades': TradeSerializer(trades, many=True).data,
-                'total_profit': total_net_profit,
-                'message': message,
-                'is_demo': is_demo
-            }, status=status.HTTP_201_CREATED)
-
-        except (Market.DoesNotExist, TradeType.DoesNotExist, Account.DoesNotExist, Robot.DoesNotExist, UserRobot.DoesNotExist) as e:
-            # Rollback current deduction on error
-            current_amount = amount * (TradingSetting.get_instance().martingale_multiplier ** martingale_level)
-            account.balance += current_amount
-            account.save()
-            return Response({'error': str(e)}, status=status.HTTP_404_NOT_FOUND)
-        except Exception as e:
-            current_amount = amount * (TradingSetting.get_instance().martingale_multiplier ** martingale_level)
-            account.balance += current_amount
-            account.save()
-            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
-             
-class TradeHistoryView(APIView):
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'trade'
+
+    @idempotent
+    @admission_controlled(trade_admission)
+    async def post(self, request):
+        payload, code = await place_trade(request.user, request.data)
+        return Response(payload, status=code)
+
+class TradeHistoryPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-timestamp', '-id')  # Newest first, whichever tables the rows come from
+
+class TradeHistoryView(AsyncAPIView):
+    """The user's trades newest first, paginated by cursor across the live and archived tables."""
     permission_classes = [IsAuthenticated]
 
-    def get(self, request):
+    async def get(self, request):
         try:
             params = request.query_params
-            trades = Trade.objects.filter(user=request.user)
-            
+            await sync_to_async(demo_engine.snapshot_user)(request.user.id)  # Include in-memory demo trades
+            filters = {'user': request.user}
+
             if 'asset_id' in params:
-                trades = trades.filter(market_id=params['asset_id'])
+                filters['market_id'] = params['asset_id']
             if 'account_type' in params:
-                trades = trades.filter(account__account_type=params['account_type'])
+                filters['account__account_type'] = params['account_type']
             if 'is_demo' in params:
-                trades = trades.filter(is_demo=params['is_demo'].lower() == 'true')
-
-            serializer = TradeSerializer(trades, many=True)
-            # Calculate total session profit for the day
+                filters['is_demo'] = params['is_demo'].lower() == 'true'
+            since = None
+            if 'since' in params:
+                since = parse_date(params['since'])
+                if since is None:
+                    return Response({'error': 'Invalid since date'}, status=status.HTTP_400_BAD_REQUEST)
+                filters['timestamp__date__gte'] = since
+            trades = Trade.objects.filter(**filters)
+
+            history = trades.order_by(*TradeHistoryPagination.ordering)
+            if since is None or since < archive_cutoff().date():
+                # The query reaches past the cutoff, so merge in archived trades
+                history = MergedHistory(trades, ArchivedTrade.objects.filter(**filters), TradeHistoryPagination.ordering)
+            selection = requested_fields(request)
+            history = TradeSerializer.narrow(history, **selection)
+            paginator = TradeHistoryPagination()
+            page = await sync_to_async(paginator.paginate_queryset)(history, request, view=self)
+            # Calculate total session profit for the day alongside the history
             today = date.today()
-            session_trades = trades.filter(timestamp__date=today)
-            total_session_profit = sum(trade.profit for trade in session_trades)
+            session_trades = trades.filter(timestamp__date=today).values_list('profit', flat=True)
+
+            async def session_profits():
+                return [profit async for profit in session_trades]
+
+            data, profits = await asyncio.gather(
+                serialize(TradeSerializer, page, many=True, **selection),
+                session_profits(),
+            )
             return Response({
-                'trades': serializer.data,
-                'total_session_profit': total_session_profit
+                'trades': data,
+                'total_session_profit': sum(profits),
+                'next': paginator.get_next_link(),
+                'previous': paginator.get_previous_link(),
             }, status=status.HTTP_200_OK)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
 
+class TradeExportView(APIView):
+    """Stream the user's trade history as NDJSON (default) or CSV without building it in memory."""
+    permission_classes = [IsAuthenticated]
+    encoders = {
+        'ndjson': (encode_ndjson, 'application/x-ndjson'),
+        'csv': (encode_csv, 'text/csv'),
+    }
+
+    def get(self, request):
+        params = request.query_params
+        output = params.get('output', 'ndjson')
+        if output not in self.encoders:
+            return Response({'error': 'output must be ndjson or csv'}, status=status.HTTP_400_BAD_REQUEST)
+
+        filters = {'user': request.user}
+        if 'market_id' in params:
+            try:
+                filters['market_id'] = int(params['market_id'])
+            except ValueError:
+                return Response({'error': 'Invalid market_id'}, status=status.HTTP_400_BAD_REQUEST)
+        if 'account_type' in params:
+            filters['account__account_type'] = params['account_type']
+        if 'is_demo' in params:
+            filters['is_demo'] = params['is_demo'].lower() == 'true'
+        since = until = None
+        if 'since' in params:
+            since = parse_date(params['since'])
+            if since is None:
+                return Response({'error': 'Invalid since date'}, status=status.HTTP_400_BAD_REQUEST)
+            filters['timestamp__date__gte'] = since
+        if 'until' in params:
+            until = parse_date(params['until'])
+            if until is None:
+                return Response({'error': 'Invalid until date'}, status=status.HTTP_400_BAD_REQUEST)
+            filters['timestamp__date__lte'] = until
+
+        demo_engine.snapshot_user(request.user.id)
+        rows = Trade.objects.filter(**filters).order_by('timestamp', 'id').values(*EXPORT_LOOKUPS)
+        if since is None or since < archive_cutoff().date():
+            rows = MergedHistory(
+                Trade.objects.filter(**filters), ArchivedTrade.objects.filter(**filters), ('timestamp', 'id')
+            ).values(*EXPORT_LOOKUPS)
+
+        encode, content_type = self.encoders[output]
+        response = StreamingHttpResponse(encode(rows.iterator(chunk_size=2000)), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="trades.{output}"'
+        return response
+
 class ResetDemoBalanceView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
         try:
-            demo_account = Account.objects.get(user=request.user, account_type='demo')
-            demo_account.balance = Decimal('10000.00')
-            demo_account.save()
-            Transaction.objects.create(
-                account=demo_account,
-                amount=Decimal('10000.00'),
-                transaction_type='credit',
-                description='Demo balance reset'
-            )
+            demo_account = Account.objects.owned_by(request.user, 'demo').get()
+            demo_account.reset_demo_balance()
             return Response({'message': 'Demo balance reset to $10,000'}, status=status.HTTP_200_OK)
         except Account.DoesNotExist:
             return Response({'error': 'Demo account not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -7,8 +7,9 @@ from django.contrib import messages
 from django.core.mail import send_mail
 from django.conf import settings
 from django.http import HttpResponseRedirect
-from .models import Currency, ExchangeRate, Wallet, WalletTransaction, MpesaNumber, OTPCode
+from .models import Currency, ExchangeRate, ExchangeRateHistory, Wallet, WalletTransaction, MpesaNumber, OTPCode
 from dashboard.models import Transaction
+from . import conversion
 import logging
 
 logger = logging.getLogger('wallet')  # Logger for email failures
@@ -18,10 +19,36 @@ class CurrencyAdmin(admin.ModelAdmin):
     list_display = ('code', 'name', 'symbol', 'is_fiat', 'is_active')
     list_editable = ('is_active',)
 
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        conversion.invalidate()  # Bulk deletes skip Currency.delete()
+
 @admin.register(ExchangeRate)
 class ExchangeRateAdmin(admin.ModelAdmin):
     list_display = ('base_currency', 'target_currency', 'live_rate', 'admin_withdrawal_rate', 'updated_at')
     list_editable = ('live_rate', 'admin_withdrawal_rate')
+    list_select_related = ('base_currency', 'target_currency')
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        conversion.invalidate()  # Bulk deletes skip ExchangeRate.delete()
+
+@admin.register(ExchangeRateHistory)
+class ExchangeRateHistoryAdmin(admin.ModelAdmin):
+    list_display = ('base_currency', 'target_currency', 'live_rate', 'admin_withdrawal_rate', 'effective_at')
+    list_filter = ('base_currency', 'target_currency')
+    list_select_related = ('base_currency', 'target_currency')
+    date_hierarchy = 'effective_at'
+
+    # Append-only: rows are written by ExchangeRate.save()
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 @admin.register(Wallet)
 class WalletAdmin(admin.ModelAdmin):
@@ -43,6 +70,7 @@ class WalletTransactionAdmin(admin.ModelAdmin):
     )
     date_hierarchy = 'created_at'
     list_editable = ('status',)
+    list_select_related = ('wallet__account__user',)
     actions = ['approve_selected', 'fail_selected']
 
     def has_add_permission(self, request):
@@ -66,20 +94,21 @@ class WalletTransactionAdmin(admin.ModelAdmin):
         return obj.transaction_type.capitalize()
     type.short_description = "Type"
 
-    def kes(self, obj):
-        if obj.currency.code == 'KSH':
-            return f"{obj.amount} KSH"
-        elif obj.target_currency and obj.target_currency.code == 'KSH':
-            return f"{obj.converted_amount} KSH"
+    def _amount_in(self, obj, code):
+        # Codes come from the rate matrix, so the changelist does not load each row's currencies
+        matrix = conversion.rates()
+        if matrix.code(obj.currency_id) == code:
+            return f"{obj.amount} {code}"
+        elif obj.target_currency_id and matrix.code(obj.target_currency_id) == code:
+            return f"{obj.converted_amount} {code}"
         return "-"
+
+    def kes(self, obj):
+        return self._amount_in(obj, 'KSH')
     kes.short_description = "KES"
 
     def usd(self, obj):
-        if obj.currency.code == 'USD':
-            return f"{obj.amount} USD"
-        elif obj.target_currency and obj.target_currency.code == 'USD':
-            return f"{obj.converted_amount} USD"
-        return "-"
+        return self._amount_in(obj, 'USD')
     usd.short_description = "USD"
 
     def phone(self, obj):
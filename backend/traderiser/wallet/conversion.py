@@ -0,0 +1,227 @@
+# wallet/conversion.py
+"""
+Currency conversion from an in-memory cross-rate matrix.
+
+rates() returns a RateMatrix holding a rate for every pair of active
+currencies, for both kinds of quote an ExchangeRate row stores ('live' and
+'withdrawal', its admin_withdrawal_rate). The pairs come from:
+- the stored rows, which always win
+- their inverses, where only the opposite direction is stored
+- triangulation through a third currency, where neither direction is stored
+
+The matrix is built from two queries and shared by every request in the
+process. ExchangeRate and Currency saves and deletes call invalidate(), which
+bumps a version in the cache so every process rebuilds on its next use;
+queryset update() and bulk writes bypass those hooks and must call it
+themselves. Use a shared CACHES backend when running more than one worker.
+
+Conversions return the exact product; callers quantize to the precision they
+store.
+
+rate_history() answers the same questions for a point in time, from the
+append-only ExchangeRateHistory table. Each stored pair keeps its entries as
+sorted arrays of timestamps and rates, searched with bisect; pairs are inverted
+and triangulated as above, with every leg read at the same instant. Only rows
+added since the last use are fetched when the version moves.
+"""
+import threading
+from bisect import bisect_right
+from decimal import Decimal
+from django.core.cache import cache
+from django.db import transaction
+from .models import Currency, ExchangeRate, ExchangeRateHistory
+
+KINDS = ('live', 'withdrawal')
+_VERSION_KEY = 'exchange_rates:version'
+_lock = threading.Lock()
+_matrix = None
+
+
+class RateMatrix:
+    def __init__(self, version, currencies, quotes):
+        """currencies: (id, code, is_active) rows; quotes: (base id, target id, live, withdrawal) rows."""
+        self.version = version
+        self.ids = {code: currency_id for currency_id, code, _ in currencies}
+        self.codes = {currency_id: code for currency_id, code, _ in currencies}
+        active = sorted(code for _, code, is_active in currencies if is_active)
+        self._index = {code: position for position, code in enumerate(active)}
+        size = len(active)
+        self._rates = {kind: [[None] * size for _ in range(size)] for kind in KINDS}
+
+        for base_id, target_id, *values in quotes:
+            base = self._index.get(self.codes.get(base_id))
+            target = self._index.get(self.codes.get(target_id))
+            if base is None or target is None:
+                continue  # Involves an inactive currency
+            for kind, value in zip(KINDS, values):
+                if value:
+                    self._rates[kind][base][target] = value
+
+        for matrix in self._rates.values():
+            for position in range(size):
+                matrix[position][position] = Decimal('1')
+            for base in range(size):
+                for target in range(size):
+                    if matrix[base][target] is None and matrix[target][base]:
+                        matrix[base][target] = Decimal('1') / matrix[target][base]
+            # Floyd-Warshall order: a pair still missing goes through any currency quoted against both sides
+            for via in range(size):
+                for base in range(size):
+                    first = matrix[base][via]
+                    if first is None:
+                        continue
+                    row = matrix[base]
+                    for target, second in enumerate(matrix[via]):
+                        if row[target] is None and second is not None:
+                            row[target] = first * second
+
+    def currency_id(self, code):
+        """Primary key of the currency, active or not, for assigning foreign keys without a query."""
+        try:
+            return self.ids[code]
+        except KeyError:
+            raise Currency.DoesNotExist(f'Currency {code} not found')
+
+    def code(self, currency_id):
+        return self.codes.get(currency_id)
+
+    def rate(self, base, target, kind='live'):
+        """Units of `target` per unit of `base`; raises ExchangeRate.DoesNotExist when the pair cannot be priced."""
+        if base == target:
+            return Decimal('1')
+        try:
+            rate = self._rates[kind][self._index[base]][self._index[target]]
+        except KeyError:
+            rate = None
+        if rate is None:
+            raise ExchangeRate.DoesNotExist(f'No {kind} rate from {base} to {target}')
+        return rate
+
+    def convert(self, amount, base, target, kind='live'):
+        return amount * self.rate(base, target, kind)
+
+    def convert_many(self, amounts, target, kind='live'):
+        """Convert (amount, currency code) pairs into `target`; returns the amounts in order."""
+        rates = {}
+        converted = []
+        for amount, base in amounts:
+            rate = rates.get(base)
+            if rate is None:
+                rate = rates[base] = self.rate(base, target, kind)
+            converted.append(amount * rate)
+        return converted
+
+
+class RateHistory:
+    def __init__(self):
+        self.version = None
+        self.last_id = 0
+        self.codes = {}
+        # (base code, target code) -> (timestamps, entries); each entry is (timestamp, id, live, withdrawal).
+        # Replaced whole when rows arrive, so readers never see a half-merged pair.
+        self._pairs = {}
+
+    def extend(self, version, codes, rows):
+        """Add (id, base id, target id, effective_at, live, withdrawal) rows newer than those already held."""
+        added = {}
+        for row_id, base_id, target_id, effective_at, live, withdrawal in rows:
+            pair = (codes.get(base_id), codes.get(target_id))
+            added.setdefault(pair, []).append((effective_at.timestamp(), row_id, live, withdrawal))
+            self.last_id = max(self.last_id, row_id)
+        pairs = dict(self._pairs)
+        for pair, entries in added.items():
+            merged = sorted(pairs.get(pair, ((), []))[1] + entries)
+            pairs[pair] = ([entry[0] for entry in merged], merged)
+        self.codes = codes
+        self._pairs = pairs
+        self.version = version
+
+    def _stored(self, base, target, when, kind):
+        pair = self._pairs.get((base, target))
+        if pair is None:
+            return None
+        index = bisect_right(pair[0], when) - 1
+        return pair[1][index][2 + KINDS.index(kind)] if index >= 0 else None
+
+    def _direct(self, base, target, when, kind):
+        rate = self._stored(base, target, when, kind)
+        if rate is None:
+            inverse = self._stored(target, base, when, kind)
+            rate = Decimal('1') / inverse if inverse else None
+        return rate
+
+    def rate_at(self, base, target, when, kind='live'):
+        """Rate in force at datetime `when`, or None when the pair had no rate yet."""
+        if base == target:
+            return Decimal('1')
+        when = when.timestamp()
+        rate = self._direct(base, target, when, kind)
+        if rate is None:
+            for via in sorted(set(self.codes.values()) - {base, target}):
+                first = self._direct(base, via, when, kind)
+                second = self._direct(via, target, when, kind) if first else None
+                if second:
+                    return first * second
+        return rate
+
+    def convert_many(self, amounts, kind='live'):
+        """Convert a stream of (amount, base code, target code, datetime) tuples lazily; yields None where unpriced."""
+        for amount, base, target, when in amounts:
+            rate = self.rate_at(base, target, when, kind)
+            yield amount * rate if rate is not None else None
+
+
+_history = RateHistory()
+_history_lock = threading.Lock()
+
+
+def _version():
+    return cache.get_or_set(_VERSION_KEY, 1, timeout=None)
+
+
+def rates():
+    """The current RateMatrix, rebuilt when invalidate() has run anywhere since it was built."""
+    global _matrix
+    version = _version()
+    matrix = _matrix
+    if matrix is not None and matrix.version == version:
+        return matrix
+    with _lock:
+        if _matrix is None or _matrix.version != version:
+            _matrix = RateMatrix(
+                version,
+                list(Currency.objects.values_list('id', 'code', 'is_active')),
+                list(ExchangeRate.objects.values_list(
+                    'base_currency_id', 'target_currency_id', 'live_rate', 'admin_withdrawal_rate')),
+            )
+        return _matrix
+
+
+def rate_history():
+    """The process's RateHistory, topped up with any entries recorded since its last use."""
+    version = _version()
+    if _history.version != version:
+        with _history_lock:
+            if _history.version != version:
+                _history.extend(
+                    version,
+                    dict(Currency.objects.values_list('id', 'code')),
+                    ExchangeRateHistory.objects.filter(id__gt=_history.last_id).values_list(
+                        'id', 'base_currency_id', 'target_currency_id', 'effective_at',
+                        'live_rate', 'admin_withdrawal_rate',
+                    ).iterator(),
+                )
+    return _history
+
+
+def _bump():
+    try:
+        cache.incr(_VERSION_KEY)
+    except ValueError:
+        cache.set(_VERSION_KEY, 2, timeout=None)
+
+
+def invalidate():
+    """Make every process rebuild its matrix, now and again once the current transaction commits."""
+    _bump()
+    transaction.on_commit(_bump)
@@ -0,0 +1,75 @@
+# wallet/integrity.py
+"""
+Wallet balance integrity checks, run by account-id range so ranges can be spread
+over a process pool (see the check_wallet_integrity command).
+
+For every account in a range the main USD wallet must equal the starting balance
+plus its summed transaction history, and the KSH trading wallet must mirror the
+USD balance at the current USD->KSH rate.
+"""
+from decimal import Decimal
+from django.db.models import Sum
+from dashboard.models import Transaction, ArchivedTransaction
+from . import conversion
+from .models import Wallet, ExchangeRate
+
+CENT = Decimal('0.01')
+
+
+def usd_to_ksh_rate():
+    """USD->KSH live rate from the rate matrix, or None when it cannot be priced."""
+    try:
+        return conversion.rates().rate('USD', 'KSH')
+    except ExchangeRate.DoesNotExist:
+        return None
+
+
+def account_ranges(start, end, size):
+    """Split the inclusive id span [start, end] into half-open ranges of `size` ids."""
+    return [(low, min(low + size, end + 1)) for low in range(start, end + 1, size)]
+
+
+def check_range(start, end, rate, tolerance=CENT):
+    """Return (findings, stats) for accounts with start <= id < end."""
+    in_range = {'account_id__gte': start, 'account_id__lt': end}
+    totals = {}
+    for model in (Transaction, ArchivedTransaction):
+        rows = model.objects.filter(**in_range).order_by().values('account_id').annotate(total=Sum('amount'))
+        for row in rows:
+            totals[row['account_id']] = totals.get(row['account_id'], Decimal('0.00')) + row['total']
+
+    wallets = {}
+    for account_id, account_type, wallet_id, wallet_type, code, balance in Wallet.objects.filter(
+        **in_range
+    ).values_list('account_id', 'account__account_type', 'id', 'wallet_type', 'currency__code', 'balance'):
+        entry = wallets.setdefault(account_id, {'account_type': account_type})
+        entry[(wallet_type, code)] = (wallet_id, balance)
+
+    findings = []
+    stats = {'accounts': len(wallets), 'wallets': 0, 'balance_mismatches': 0, 'mirror_mismatches': 0, 'missing_wallets': 0}
+    for account_id, entry in wallets.items():
+        account_type = entry.pop('account_type')
+        stats['wallets'] += len(entry)
+        main = entry.get(('main', 'USD'))
+        if main is None:
+            stats['missing_wallets'] += 1
+            findings.append({'issue': 'missing_main_wallet', 'account_id': account_id, 'account_type': account_type})
+            continue
+        wallet_id, balance = main
+        initial = Decimal('10000.00') if account_type == 'demo' else Decimal('0.00')
+        expected = (initial + totals.get(account_id, Decimal('0.00'))).quantize(CENT)
+        if abs(balance - expected) > tolerance:
+            stats['balance_mismatches'] += 1
+            findings.append({'issue': 'balance_mismatch', 'account_id': account_id, 'account_type': account_type,
+                             'wallet_id': wallet_id, 'balance': balance, 'expected': expected})
+
+        mirror = entry.get(('trading', 'KSH'))
+        if mirror is not None and rate is not None:
+            mirror_id, mirror_balance = mirror
+            expected_mirror = (balance * rate).quantize(CENT)
+            # Allow one cent of rounding per side of the conversion
+            if abs(mirror_balance - expected_mirror) > tolerance * (rate + 1):
+                stats['mirror_mismatches'] += 1
+                findings.append({'issue': 'mirror_mismatch', 'account_id': account_id, 'account_type': account_type,
+                                 'wallet_id': mirror_id, 'balance': mirror_balance, 'expected': expected_mirror})
+    return findings, stats
@@ -0,0 +1,61 @@
+import json
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Max, Min
+from accounts.models import Account
+from wallet.integrity import account_ranges, check_range, usd_to_ksh_rate
+
+logger = logging.getLogger('wallet')
+
+
+def _init_worker():
+    django.setup()
+    connections.close_all()  # Never share the parent's database connection
+
+
+def _check_range(args):
+    start, end, rate = args
+    try:
+        return check_range(start, end, rate)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Recompute every wallet balance from transaction history and report mismatches as NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Worker processes (1 runs inline)')
+        parser.add_argument('--range-size', type=int, default=5000, help='Accounts per unit of work')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        bounds = Account.objects.aggregate(low=Min('id'), high=Max('id'))
+        rate = usd_to_ksh_rate()
+        totals = {'accounts': 0, 'wallets': 0, 'balance_mismatches': 0, 'mirror_mismatches': 0, 'missing_wallets': 0}
+        if bounds['low'] is not None:
+            work = [(start, end, rate) for start, end in account_ranges(bounds['low'], bounds['high'], options['range_size'])]
+            if options['workers'] > 1:
+                connections.close_all()
+                with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+                    results = (future.result() for future in as_completed(pool.submit(_check_range, item) for item in work))
+                    self._collect(results, totals)
+            else:
+                self._collect(map(_check_range, work), totals)
+
+        elapsed = time.monotonic() - started
+        metrics = dict(totals, duration_seconds=round(elapsed, 3),
+                       accounts_per_second=round(totals['accounts'] / elapsed, 1) if elapsed else None)
+        logger.info('wallet_integrity %s', ' '.join(f'{key}={value}' for key, value in metrics.items()))
+        self.stderr.write(self.style.SUCCESS(json.dumps(metrics)))
+
+    def _collect(self, results, totals):
+        for findings, stats in results:
+            for key, value in stats.items():
+                totals[key] += value
+            for finding in findings:
+                self.stdout.write(json.dumps(finding, default=str))
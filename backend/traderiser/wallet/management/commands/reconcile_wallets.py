@@ -0,0 +1,29 @@
+from collections import Counter
+from django.core.management.base import BaseCommand
+from wallet.reconciliation import reconcile, encode_report
+
+
+class Command(BaseCommand):
+    help = 'Stream a discrepancy report of wallet transactions, audit rows and wallet balances as NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Write the report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        counts = Counter()
+
+        def counted(discrepancies):
+            for row in discrepancies:
+                counts[row['issue']] += 1
+                yield row
+
+        out = open(options['output'], 'w') if options['output'] else self.stdout
+        try:
+            for line in encode_report(counted(reconcile())):
+                out.write(line.rstrip('\n') if out is self.stdout else line)
+        finally:
+            if out is not self.stdout:
+                out.close()
+
+        summary = ', '.join(f"{issue}: {count}" for issue, count in sorted(counts.items())) or 'no discrepancies'
+        self.stderr.write(self.style.SUCCESS(f"Reconciliation complete ({summary})"))
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0003_seed_currency_exchange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedWalletTransaction',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('transaction_type', models.CharField(choices=[('deposit', 'Deposit'), ('withdrawal', 'Withdrawal')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('converted_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True)),
+                ('exchange_rate_used', models.DecimalField(blank=True, decimal_places=6, max_digits=12, null=True)),
+                ('status', models.CharField(max_length=10)),
+                ('reference_id', models.CharField(max_length=50, unique=True)),
+                ('description', models.TextField(blank=True)),
+                ('mpesa_phone', models.CharField(blank=True, max_length=15, null=True)),
+                ('checkout_request_id', models.CharField(blank=True, max_length=40, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('currency', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='wallet.currency')),
+                ('target_currency', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='wallet.currency')),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='wallet.wallet')),
+            ],
+            options={
+                'verbose_name': 'Archived Wallet Transaction',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['wallet', 'created_at'], name='wallet_arch_wallet__7e3c8f_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:47
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def seed_history(apps, schema_editor):
+    """Start each pair's history at its current rate, effective from its last update."""
+    ExchangeRate = apps.get_model('wallet', 'ExchangeRate')
+    ExchangeRateHistory = apps.get_model('wallet', 'ExchangeRateHistory')
+    ExchangeRateHistory.objects.bulk_create([
+        ExchangeRateHistory(
+            base_currency_id=rate.base_currency_id, target_currency_id=rate.target_currency_id,
+            live_rate=rate.live_rate, admin_withdrawal_rate=rate.admin_withdrawal_rate,
+            effective_at=rate.updated_at,
+        )
+        for rate in ExchangeRate.objects.all()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0004_archivedwallettransaction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRateHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('live_rate', models.DecimalField(decimal_places=6, max_digits=12)),
+                ('admin_withdrawal_rate', models.DecimalField(decimal_places=6, max_digits=12)),
+                ('effective_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('base_currency', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='wallet.currency')),
+                ('target_currency', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='wallet.currency')),
+            ],
+            options={
+                'verbose_name_plural': 'Exchange Rate History',
+                'ordering': ['effective_at', 'id'],
+            },
+        ),
+        migrations.RunPython(seed_history, migrations.RunPython.noop),
+    ]
@@ -6,6 +6,8 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from accounts.models import Account
+from accounts.response_cache import bump_user_state
+from dashboard.events import publish_balance
 
 User = get_user_model()
 
@@ -15,6 +17,10 @@ def generate_reference_id():
 def generate_otp():
     return ''.join([str(random.randint(0, 9)) for _ in range(6)])
 
+def invalidate_rates():
+    from .conversion import invalidate  # conversion imports these models
+    invalidate()
+
 # --------------------------------------------------------------
 # 1. Currency
 # --------------------------------------------------------------
@@ -31,6 +37,15 @@ class Currency(models.Model):
     def __str__(self):
         return self.code
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        invalidate_rates()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        invalidate_rates()
+        return result
+
 
 # --------------------------------------------------------------
 # 2. ExchangeRate
@@ -53,6 +68,44 @@ class ExchangeRate(models.Model):
     def __str__(self):
         return f"{self.base_currency} to {self.target_currency}: {self.live_rate}"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        ExchangeRateHistory.objects.create(
+            base_currency_id=self.base_currency_id, target_currency_id=self.target_currency_id,
+            live_rate=self.live_rate, admin_withdrawal_rate=self.admin_withdrawal_rate,
+            effective_at=self.updated_at,
+        )
+        invalidate_rates()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        invalidate_rates()
+        return result
+
+
+class ExchangeRateHistory(models.Model):
+    """Every rate an ExchangeRate has held, from effective_at until the pair's next entry; append-only."""
+    base_currency = models.ForeignKey(Currency, on_delete=models.PROTECT, related_name='+')
+    target_currency = models.ForeignKey(Currency, on_delete=models.PROTECT, related_name='+')
+    live_rate = models.DecimalField(max_digits=12, decimal_places=6)
+    admin_withdrawal_rate = models.DecimalField(max_digits=12, decimal_places=6)
+    effective_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['effective_at', 'id']
+        verbose_name_plural = "Exchange Rate History"
+
+    def __str__(self):
+        return f"{self.base_currency} to {self.target_currency} from {self.effective_at}: {self.live_rate}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Exchange rate history is append-only")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Exchange rate history is append-only")
+
 
 # --------------------------------------------------------------
 # 3. MpesaNumber
@@ -96,6 +149,12 @@ class Wallet(models.Model):
     def __str__(self):
         return f"{self.account.user.username} - {self.wallet_type} {self.currency}"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        bump_user_state(self.account.user_id)
+        publish_balance(self.account.user_id, self.account_id, self.balance,
+                        wallet_type=self.wallet_type, wallet_id=self.pk)
+
 
 # --------------------------------------------------------------
 # 5. OTPCode
@@ -163,4 +222,36 @@ class WalletTransaction(models.Model):
         ordering = ['-created_at']
 
     def __str__(self):
-        return f"{self.get_transaction_type_display()} - {self.amount} {self.currency}"
\ No newline at end of file
+        return f"{self.get_transaction_type_display()} - {self.amount} {self.currency}"
+
+
+# --------------------------------------------------------------
+# 7. ArchivedWalletTransaction
+# --------------------------------------------------------------
+class ArchivedWalletTransaction(models.Model):
+    """Settled WalletTransaction moved out by the archive_history command; ids are preserved."""
+    id = models.BigIntegerField(primary_key=True)
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name='+')
+    transaction_type = models.CharField(max_length=20, choices=WalletTransaction.TRANSACTION_TYPES)
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    currency = models.ForeignKey(Currency, on_delete=models.PROTECT, related_name='+')
+    target_currency = models.ForeignKey(
+        Currency, on_delete=models.PROTECT, related_name='+', null=True, blank=True
+    )
+    converted_amount = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True)
+    exchange_rate_used = models.DecimalField(max_digits=12, decimal_places=6, null=True, blank=True)
+    status = models.CharField(max_length=10)
+    reference_id = models.CharField(max_length=50, unique=True)
+    description = models.TextField(blank=True)
+    mpesa_phone = models.CharField(max_length=15, blank=True, null=True)
+    checkout_request_id = models.CharField(max_length=40, blank=True, null=True)
+    created_at = models.DateTimeField()
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Archived Wallet Transaction"
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['wallet', 'created_at'])]
+
+    def __str__(self):
+        return f"{self.get_transaction_type_display()} - {self.amount} {self.currency} (archived)"
\ No newline at end of file
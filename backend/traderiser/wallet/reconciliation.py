@@ -0,0 +1,197 @@
+# wallet/reconciliation.py
+"""
+Streaming reconciliation of wallet transactions against the dashboard audit trail.
+
+Every input is read as an ordered, chunked iterator and merge-joined, so memory
+stays bounded by the largest group of rows sharing one reference id (or one
+account), however many rows the tables hold. Live and archived tables are
+merged on the fly. Demo wallets are not money and are skipped.
+
+A last pass reprices each converted transaction at the rate in force when it
+was created (wallet.conversion.rate_history) and reports any that disagree by
+more than a cent. Transactions older than the recorded history are skipped.
+"""
+import heapq
+import json
+from decimal import Decimal
+from itertools import groupby, tee
+from operator import itemgetter
+from django.db import connection
+from django.db.models import Q, Sum, Value
+from django.db.models.functions import Collate, StrIndex, Substr
+from dashboard.models import Transaction, ArchivedTransaction
+from . import conversion
+from .models import Wallet, WalletTransaction, ArchivedWalletTransaction
+
+CHUNK_SIZE = 5000
+AUDIT_PREFIXES = ('Approved', 'Paid', 'Pending')  # Descriptions written as "<Prefix>: <reference_id>"
+DEBIT_PREFIXES = ('Paid', 'Pending')
+RATE_KINDS = {'deposit': 'live', 'withdrawal': 'withdrawal'}  # Rate each transaction type converts at
+CENT = Decimal('0.01')
+# Byte-wise collations so the database sorts strings the way Python compares them
+BINARY_COLLATIONS = {'sqlite': 'BINARY', 'postgresql': 'C', 'mysql': 'utf8mb4_bin'}
+
+
+def _binary(expression):
+    collation = BINARY_COLLATIONS.get(connection.vendor)
+    return Collate(expression, collation) if collation else expression
+
+
+def _merged(*iterators):
+    return heapq.merge(*iterators, key=itemgetter(0))
+
+
+def _wallet_transactions():
+    return _merged(*(
+        model.objects.order_by(_binary('reference_id')).values_list(
+            'reference_id', 'transaction_type', 'status', 'amount', 'converted_amount', 'wallet__account_id'
+        ).iterator(chunk_size=CHUNK_SIZE)
+        for model in (WalletTransaction, ArchivedWalletTransaction)
+    ))
+
+
+def _audit_rows():
+    """Dashboard transactions that reference a wallet transaction, ordered by that reference."""
+    separator = StrIndex('description', Value(': '))
+    return _merged(*(
+        model.objects.filter(
+            Q(*[Q(description__startswith=f'{prefix}: ') for prefix in AUDIT_PREFIXES], _connector=Q.OR)
+        ).annotate(
+            reference=Substr('description', separator + 2),
+            prefix=Substr('description', 1, separator - 1),
+        ).order_by(_binary('reference'), 'id').values_list(
+            'reference', 'prefix', 'amount', 'account_id', 'id'
+        ).iterator(chunk_size=CHUNK_SIZE)
+        for model in (Transaction, ArchivedTransaction)
+    ))
+
+
+def _merge_by_key(left, right):
+    """Merge-join two iterators sorted on their first column; yields (key, left_rows, right_rows)."""
+    left_groups = groupby(left, key=lambda row: row[0])
+    right_groups = groupby(right, key=lambda row: row[0])
+    left_key, left_rows = next(left_groups, (None, None))
+    right_key, right_rows = next(right_groups, (None, None))
+    while left_rows is not None or right_rows is not None:
+        if right_rows is None or (left_rows is not None and left_key < right_key):
+            yield left_key, list(left_rows), []
+            left_key, left_rows = next(left_groups, (None, None))
+        elif left_rows is None or right_key < left_key:
+            yield right_key, [], list(right_rows)
+            right_key, right_rows = next(right_groups, (None, None))
+        else:
+            yield left_key, list(left_rows), list(right_rows)
+            left_key, left_rows = next(left_groups, (None, None))
+            right_key, right_rows = next(right_groups, (None, None))
+
+
+def _check_reference(reference, wallet_rows, audit_rows):
+    if not wallet_rows:
+        yield {'issue': 'orphan_audit', 'reference_id': reference, 'audit_ids': [row[4] for row in audit_rows]}
+        return
+    _, transaction_type, status, amount, converted_amount, account_id = wallet_rows[0]
+    audit_ids = [row[4] for row in audit_rows]
+    if any(row[3] != account_id for row in audit_rows):
+        yield {'issue': 'account_mismatch', 'reference_id': reference, 'audit_ids': audit_ids}
+
+    if status == 'failed':
+        if audit_rows:
+            yield {'issue': 'audit_for_failed', 'reference_id': reference, 'audit_ids': audit_ids}
+        return
+
+    if transaction_type == 'deposit':
+        credits = [row for row in audit_rows if row[1] == 'Approved']
+        if status == 'pending':
+            if credits:
+                yield {'issue': 'credit_before_completion', 'reference_id': reference, 'audit_ids': audit_ids}
+        elif not credits:
+            yield {'issue': 'missing_audit', 'reference_id': reference, 'expected': converted_amount}
+        elif len(credits) > 1:
+            yield {'issue': 'double_credit', 'reference_id': reference, 'audit_ids': audit_ids,
+                   'credited': sum(row[2] for row in credits), 'expected': converted_amount}
+        elif credits[0][2] != converted_amount:
+            yield {'issue': 'amount_mismatch', 'reference_id': reference, 'audit_ids': audit_ids,
+                   'recorded': credits[0][2], 'expected': converted_amount}
+    else:
+        debits = [row for row in audit_rows if row[1] in DEBIT_PREFIXES]
+        if status == 'completed' and not debits:
+            yield {'issue': 'missing_audit', 'reference_id': reference, 'expected': -amount}
+        elif len(debits) > 1:
+            yield {'issue': 'double_debit', 'reference_id': reference, 'audit_ids': audit_ids,
+                   'debited': sum(row[2] for row in debits), 'expected': -amount}
+        elif debits and debits[0][2] != -amount:
+            yield {'issue': 'amount_mismatch', 'reference_id': reference, 'audit_ids': audit_ids,
+                   'recorded': debits[0][2], 'expected': -amount}
+
+
+def _wallet_balances():
+    return Wallet.objects.filter(
+        wallet_type='main', currency__code='USD'
+    ).exclude(account__account_type='demo').order_by('account_id').values_list(
+        'account_id', 'id', 'balance'
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+def _history_totals():
+    """Summed history per account, aggregated in SQL per table and combined in order."""
+    totals = _merged(*(
+        model.objects.order_by('account_id').values('account_id').annotate(
+            total=Sum('amount')
+        ).values_list('account_id', 'total').iterator(chunk_size=CHUNK_SIZE)
+        for model in (Transaction, ArchivedTransaction)
+    ))
+    for account_id, rows in groupby(totals, key=itemgetter(0)):
+        yield account_id, sum((row[1] for row in rows), Decimal('0.00')).quantize(Decimal('0.01'))
+
+
+def _check_drift(account_id, wallet_rows, total_rows):
+    if not wallet_rows:
+        return
+    _, wallet_id, balance = wallet_rows[0]
+    expected = total_rows[0][1] if total_rows else Decimal('0.00')
+    if balance != expected:
+        yield {'issue': 'wallet_drift', 'account_id': account_id, 'wallet_id': wallet_id,
+               'balance': balance, 'expected': expected, 'drift': balance - expected}
+
+
+def _converted_transactions(transaction_type):
+    """Converted transactions of one type, oldest first, so consecutive lookups hit the same rate entry."""
+    return _merged(*(
+        model.objects.filter(
+            transaction_type=transaction_type, target_currency__isnull=False, converted_amount__isnull=False
+        ).exclude(status='failed').order_by('created_at').values_list(
+            'created_at', 'reference_id', 'amount', 'currency_id', 'target_currency_id', 'converted_amount'
+        ).iterator(chunk_size=CHUNK_SIZE)
+        for model in (WalletTransaction, ArchivedWalletTransaction)
+    ))
+
+
+def _check_conversions():
+    history = conversion.rate_history()
+    codes = conversion.rates().codes
+    for transaction_type, kind in RATE_KINDS.items():
+        rows, priced = tee(_converted_transactions(transaction_type))
+        expected = history.convert_many(
+            ((amount, codes.get(base), codes.get(target), created_at)
+             for created_at, _, amount, base, target, _ in priced),
+            kind=kind,
+        )
+        for (_, reference, _, _, _, converted_amount), value in zip(rows, expected):
+            if value is not None and abs(value - converted_amount) > CENT:
+                yield {'issue': 'conversion_mismatch', 'reference_id': reference,
+                       'recorded': converted_amount, 'expected': value.quantize(CENT)}
+
+
+def reconcile():
+    """Yield one dict per discrepancy, in three passes: references, balances, then conversions."""
+    for reference, wallet_rows, audit_rows in _merge_by_key(_wallet_transactions(), _audit_rows()):
+        yield from _check_reference(reference, wallet_rows, audit_rows)
+    for account_id, wallet_rows, total_rows in _merge_by_key(_wallet_balances(), _history_totals()):
+        yield from _check_drift(account_id, wallet_rows, total_rows)
+    yield from _check_conversions()
+
+
+def encode_report(discrepancies):
+    """NDJSON lines; Decimals are written as exact strings."""
+    for row in discrepancies:
+        yield json.dumps(row, default=str) + '\n'
@@ -1,6 +1,10 @@
 # wallet/serializers.py
+from django.db.models import Prefetch
 from rest_framework import serializers
+from . import conversion
 from .models import Wallet, WalletTransaction, MpesaNumber, Currency, ExchangeRate, OTPCode
+from accounts.fieldsets import SparseFieldsMixin
+from accounts.models import Account, User
 from accounts.serializers import UserSerializer
 
 class CurrencySerializer(serializers.ModelSerializer):
@@ -30,7 +34,7 @@ class WalletSerializer(serializers.ModelSerializer):
         fields = ['id', 'account', 'wallet_type', 'currency', 'balance', 'account_type', 'user', 'created_at', 'updated_at']
         read_only_fields = ['id', 'balance', 'created_at', 'updated_at']
 
-class WalletTransactionSerializer(serializers.ModelSerializer):
+class WalletTransactionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     wallet = WalletSerializer(read_only=True)
     currency = CurrencySerializer(read_only=True)
     target_currency = CurrencySerializer(read_only=True)
@@ -44,6 +48,74 @@ class WalletTransactionSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'status', 'created_at', 'completed_at', 'checkout_request_id']
 
+class CurrencyCodeField(serializers.Field):
+    """A currency foreign key rendered as its code, read from the rate matrix instead of a join."""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return conversion.rates().code(value)
+
+class WalletListSerializer(serializers.ModelSerializer):
+    """Wallet row for lists: currency by code and user by id, side-loaded once by wallet_list()."""
+    account_type = serializers.CharField(source='account.account_type', read_only=True)
+    user = serializers.IntegerField(source='account.user_id', read_only=True)
+    currency = CurrencyCodeField(source='currency_id')
+    class Meta:
+        model = Wallet
+        fields = ['id', 'account', 'wallet_type', 'currency', 'balance', 'account_type', 'user', 'created_at', 'updated_at']
+        read_only_fields = fields
+
+class WalletTransactionListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Transaction row for lists: wallet by id and currencies by code, side-loaded once by wallet_transaction_list().
+
+    Nothing is nested, so `expand` has no effect.
+    """
+    wallet = serializers.IntegerField(source='wallet_id', read_only=True)
+    currency = CurrencyCodeField(source='currency_id')
+    target_currency = CurrencyCodeField(source='target_currency_id')
+    class Meta:
+        model = WalletTransaction
+        fields = WalletTransactionSerializer.Meta.fields
+        read_only_fields = fields
+
+def wallet_list(wallets, currency_ids=()):
+    """Lean rows for wallets loaded with select_related('account'), plus each currency and user they reference.
+
+    Takes three queries however many wallets there are.
+    """
+    wallets = list(wallets)
+    currency_ids = set(currency_ids) | {wallet.currency_id for wallet in wallets}
+    users = User.objects.filter(id__in={wallet.account.user_id for wallet in wallets}).prefetch_related(
+        Prefetch('accounts', queryset=Account.objects.with_balance())
+    ).order_by('id')
+    return {
+        'wallets': WalletListSerializer(wallets, many=True).data,
+        'currencies': CurrencySerializer(Currency.objects.filter(id__in=currency_ids).order_by('code'), many=True).data,
+        'users': UserSerializer(users, many=True).data,
+    }
+
+def wallet_transaction_list(transactions, fields=None):
+    """Lean transaction rows plus each distinct wallet, currency and user they reference.
+
+    With `fields`, only the selected columns are rendered, and only what they reference is side-loaded.
+    """
+    transactions = list(transactions)
+    rows = WalletTransactionListSerializer(transactions, many=True, fields=fields)
+    selected = rows.child.fields
+    wallet_ids = {row.wallet_id for row in transactions} if 'wallet' in selected else set()
+    currency_ids = set()
+    for name in ('currency', 'target_currency'):
+        if name in selected:
+            currency_ids |= {getattr(row, f'{name}_id') for row in transactions}
+    wallets = Wallet.objects.filter(id__in=wallet_ids).select_related('account').order_by('id')
+    return {
+        'transactions': rows.data,
+        **wallet_list(wallets, currency_ids - {None}),
+    }
+
 class OTPRequestSerializer(serializers.Serializer):
     amount = serializers.DecimalField(max_digits=14, decimal_places=2)
     wallet_type = serializers.CharField(default='main')
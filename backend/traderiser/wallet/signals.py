@@ -1,6 +1,7 @@
 from django.db.models.signals import pre_save, post_save
 from django.dispatch import receiver
-from .models import Wallet, WalletTransaction, Currency, ExchangeRate
+from .models import Wallet, WalletTransaction, Currency
+from . import conversion
 from django.db import transaction
 from django.conf import settings
 from accounts.models import Account
@@ -35,18 +36,11 @@ def sync_all_wallets(sender, instance, **kwargs):
         with transaction.atomic():
             user = instance.account.user
             reference_balance = instance.balance  # Use changed wallet's balance as reference
-            reference_currency = instance.currency.code
+            matrix = conversion.rates()
+            reference_currency = matrix.code(instance.currency_id)
 
             # Get all wallets for the user (across all their accounts)
-            user_wallets = Wallet.objects.filter(account__user=user)
-
-            # Get exchange rates for conversions
-            usd = Currency.objects.get(code='USD')
-            ksh = Currency.objects.get(code='KSH')
-            usd_to_ksh_rate = ExchangeRate.objects.get(
-                base_currency=usd, target_currency=ksh
-            ).live_rate
-            ksh_to_usd_rate = Decimal('1.0') / usd_to_ksh_rate
+            user_wallets = Wallet.objects.filter(account__user=user).select_related('account')
 
             for wallet in user_wallets:
                 # Skip the wallet that triggered the update to avoid recursion
@@ -54,20 +48,17 @@ def sync_all_wallets(sender, instance, **kwargs):
                     continue
 
                 # Convert balance to wallet's currency
-                new_balance = reference_balance
-                if reference_currency == 'USD' and wallet.currency.code == 'KSH':
-                    new_balance = reference_balance * usd_to_ksh_rate
-                elif reference_currency == 'KSH' and wallet.currency.code == 'USD':
-                    new_balance = reference_balance * ksh_to_usd_rate
+                wallet_currency = matrix.code(wallet.currency_id)
+                new_balance = matrix.convert(reference_balance, reference_currency, wallet_currency)
 
                 # Update wallet balance
                 if wallet.balance != new_balance:
                     wallet.balance = new_balance
                     wallet.save(update_fields=['balance'])
-                    logger.info(f"Synced Wallet {wallet.id} ({wallet.currency.code}) to {new_balance}")
+                    logger.info(f"Synced Wallet {wallet.id} ({wallet_currency}) to {new_balance}")
 
                 # Sync corresponding account balance (for main USD wallet)
-                if wallet.wallet_type == 'main' and wallet.currency.code == 'USD':
+                if wallet.wallet_type == 'main' and wallet_currency == 'USD':
                     if wallet.account.balance != new_balance:
                         wallet.account.balance = new_balance
                         wallet.account.save(update_fields=['balance'])
@@ -84,25 +75,17 @@ def sync_account_to_wallets(sender, instance, **kwargs):
             user = instance.user
             reference_balance = instance.balance  # Use account balance as reference
             user_wallets = Wallet.objects.filter(account__user=user)
-
-            # Get exchange rates
-            usd = Currency.objects.get(code='USD')
-            ksh = Currency.objects.get(code='KSH')
-            usd_to_ksh_rate = ExchangeRate.objects.get(
-                base_currency=usd, target_currency=ksh
-            ).live_rate
-            ksh_to_usd_rate = Decimal('1.0') / usd_to_ksh_rate
+            matrix = conversion.rates()
 
             for wallet in user_wallets:
-                # Convert balance to wallet's currency
-                new_balance = reference_balance
-                if wallet.currency.code == 'KSH':
-                    new_balance = reference_balance * usd_to_ksh_rate
+                # Convert balance to wallet's currency (account balances are USD)
+                currency = matrix.code(wallet.currency_id)
+                new_balance = matrix.convert(reference_balance, 'USD', currency)
 
                 if wallet.balance != new_balance:
                     wallet.balance = new_balance
                     wallet.save(update_fields=['balance'])
-                    logger.info(f"Synced Wallet {wallet.id} ({wallet.currency.code}) to {new_balance}")
+                    logger.info(f"Synced Wallet {wallet.id} ({currency}) to {new_balance}")
 
     except Exception as e:
         logger.error(f"Failed to sync account {instance.id} to wallets: {str(e)}")
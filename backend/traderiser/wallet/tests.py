@@ -1,3 +1,57 @@
-from django.test import TestCase
+from decimal import Decimal
+from django.test import SimpleTestCase, TestCase
+from accounts.models import User, Account
+from dashboard.models import Transaction
+from .conversion import RateMatrix
+from .integrity import check_range
+from .models import ExchangeRate, Wallet
+from .reconciliation import reconcile
 
-# Create your tests here.
+
+class DriftedWalletTests(TestCase):
+    def setUp(self):
+        self.accounts = []
+        for name, balance in (('steady', '100.00'), ('drifted', '150.00')):
+            user = User.objects.create_user(username=name, email=f'{name}@example.com', password='pw12345!')
+            account = Account.objects.create(user=user, account_type='standard')
+            Transaction.objects.create(account=account, amount=Decimal('60.00'), transaction_type='deposit')
+            Transaction.objects.create(account=account, amount=Decimal('40.00'), transaction_type='deposit')
+            Wallet.objects.filter(account=account, wallet_type='main', currency__code='USD').update(balance=Decimal(balance))
+            self.accounts.append(account)
+        self.drifted = self.accounts[1]
+
+    def test_reconciliation_reports_the_drifted_wallet(self):
+        drift = [row for row in reconcile() if row['issue'] == 'wallet_drift']
+        self.assertEqual(len(drift), 1)
+        self.assertEqual((drift[0]['account_id'], drift[0]['drift']), (self.drifted.id, Decimal('50.00')))
+
+    def test_integrity_check_reports_the_drifted_wallet(self):
+        ids = [account.id for account in self.accounts]
+        findings, stats = check_range(min(ids), max(ids) + 1, rate=None)
+        self.assertEqual(stats['balance_mismatches'], 1)
+        self.assertEqual([(row['issue'], row['account_id'], row['expected']) for row in findings],
+                         [('balance_mismatch', self.drifted.id, Decimal('100.00'))])
+
+
+class RateMatrixTests(SimpleTestCase):
+    def setUp(self):
+        currencies = [(1, 'USD', True), (2, 'KSH', True), (3, 'EUR', True), (4, 'GBP', False)]
+        quotes = [
+            (1, 2, Decimal('130'), Decimal('125')),  # USD->KSH
+            (3, 1, Decimal('1.10'), Decimal('1.05')),  # EUR->USD
+            (4, 1, Decimal('1.25'), Decimal('1.20')),  # GBP is inactive
+        ]
+        self.matrix = RateMatrix(1, currencies, quotes)
+
+    def test_unquoted_direction_uses_the_inverse(self):
+        self.assertEqual(self.matrix.rate('KSH', 'USD'), Decimal('1') / Decimal('130'))
+        self.assertEqual(self.matrix.rate('KSH', 'USD', kind='withdrawal'), Decimal('1') / Decimal('125'))
+
+    def test_pair_without_a_quote_is_triangulated_through_a_common_currency(self):
+        self.assertEqual(self.matrix.rate('EUR', 'KSH'), Decimal('143.00'))
+        self.assertAlmostEqual(self.matrix.rate('KSH', 'EUR'), Decimal('1') / Decimal('143'), places=20)
+        self.assertEqual(self.matrix.convert(Decimal('2'), 'EUR', 'KSH'), Decimal('286.00'))
+
+    def test_inactive_currency_cannot_be_priced(self):
+        with self.assertRaises(ExchangeRate.DoesNotExist):
+            self.matrix.rate('GBP', 'USD')
@@ -2,7 +2,7 @@
 from django.urls import path
 from .views import (
     WalletListView, MpesaNumberView, DepositView, WithdrawalOTPView,
-    VerifyWithdrawalOTPView, TransactionListView, MpesaCallbackView
+    VerifyWithdrawalOTPView, TransactionListView, MpesaCallbackView, ReconciliationReportView
 )
 
 urlpatterns = [
@@ -13,4 +13,5 @@ urlpatterns = [
     path('withdraw/verify/', VerifyWithdrawalOTPView.as_view(), name='verify_withdrawal'),
     path('transactions/', TransactionListView.as_view(), name='transaction_list'),
     path('callback/', MpesaCallbackView.as_view(), name='mpesa_callback'),
+    path('reconciliation/', ReconciliationReportView.as_view(), name='reconciliation_report'),
 ]
\ No newline at end of file
@@ -3,22 +3,32 @@ import string
 import json
 import logging
 from decimal import Decimal
+from asgiref.sync import sync_to_async
 from django.utils import timezone
 from django.core.mail import send_mail
 from django.conf import settings
 from django.db import transaction
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.pagination import CursorPagination
 from rest_framework import status, permissions
-from .models import Wallet, WalletTransaction, MpesaNumber, Currency, ExchangeRate, OTPCode
+from .models import Wallet, WalletTransaction, ArchivedWalletTransaction, MpesaNumber, Currency, ExchangeRate, OTPCode
 from .serializers import (
-    WalletSerializer, WalletTransactionSerializer, MpesaNumberSerializer,
-    OTPRequestSerializer, OTPVerifySerializer
+    MpesaNumberSerializer, OTPRequestSerializer, OTPVerifySerializer, WalletTransactionListSerializer,
+    wallet_list, wallet_transaction_list,
 )
+from accounts.async_views import AsyncAPIView
+from accounts.fieldsets import requested_fields
 from accounts.models import Account
+from accounts.idempotency import IdempotencyMixin, idempotent
+from accounts.throttling import TokenBucketThrottle
+from accounts.response_cache import cached_per_user
 from dashboard.models import Transaction
+from dashboard.archive import MergedHistory
+from . import conversion
 from .payment import PaymentClient
+from .reconciliation import reconcile, encode_report
 
 def generate_reference_id(length: int = 12) -> str:
     """Generate a random alphanumeric reference ID."""
@@ -34,13 +44,13 @@ def generate_otp(length: int = 6) -> str:
     """
     return ''.join(random.choices(string.digits, k=length))
 
-class WalletListView(APIView):
+class WalletListView(AsyncAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
-    def get(self, request):
-        wallets = Wallet.objects.filter(account__user=request.user)
-        serializer = WalletSerializer(wallets, many=True)
-        return Response({'wallets': serializer.data})
+    @cached_per_user('wallet_list')
+    async def get(self, request):
+        wallets = Wallet.objects.filter(account__user=request.user).select_related('account').order_by('id')
+        return Response(await sync_to_async(wallet_list)(wallets))
 
 class MpesaNumberView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -62,9 +72,12 @@ class MpesaNumberView(APIView):
             return Response(MpesaNumberSerializer(mpesa).data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class DepositView(APIView):
+class DepositView(IdempotencyMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'deposit'
 
+    @idempotent
     def post(self, request):
         data = request.data
         account_type = data.get('account_type', 'standard')
@@ -80,27 +93,28 @@ class DepositView(APIView):
             if amount <= 0:
                 return Response({'error': 'Amount must be positive'}, status=status.HTTP_400_BAD_REQUEST)
 
-            account = Account.objects.get(user=request.user, account_type=account_type)
+            account = Account.objects.owned_by(request.user, account_type).get()
             if account.account_type == 'demo':
                 return Response({'error': 'Deposits not allowed on demo accounts'}, status=status.HTTP_400_BAD_REQUEST)
 
-            ksh = Currency.objects.get(code='KSH')
-            usd = Currency.objects.get(code='USD')
+            matrix = conversion.rates()
+            ksh = matrix.currency_id('KSH')
+            usd = matrix.currency_id('USD')
 
             if currency_code != 'KSH':
                 return Response({'error': 'Deposits must be in KSH'}, status=status.HTTP_400_BAD_REQUEST)
 
-            exchange_rate = ExchangeRate.objects.get(base_currency=ksh, target_currency=usd).live_rate
+            exchange_rate = matrix.rate('KSH', 'USD')
             converted_amount = amount * exchange_rate
 
-            wallet = Wallet.objects.get(account=account, wallet_type='main', currency=usd)
+            wallet = Wallet.objects.get(account=account, wallet_type='main', currency_id=usd)
 
             trans = WalletTransaction.objects.create(
                 wallet=wallet,
                 transaction_type='deposit',
                 amount=amount,
-                currency=ksh,
-                target_currency=usd,
+                currency_id=ksh,
+                target_currency_id=usd,
                 converted_amount=converted_amount,
                 exchange_rate_used=exchange_rate,
                 status='pending',
@@ -138,9 +152,12 @@ class DepositView(APIView):
             logger.error(f"Deposit error: {str(e)}")
             return Response({'error': 'Internal error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class WithdrawalOTPView(APIView):
+class WithdrawalOTPView(IdempotencyMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'withdrawal'
 
+    @idempotent
     def post(self, request):
         serializer = OTPRequestSerializer(data=request.data)
         if not serializer.is_valid():
@@ -154,12 +171,13 @@ class WithdrawalOTPView(APIView):
             return Response({'error': 'Amount must be positive'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            account = Account.objects.get(user=request.user, account_type=account_type)
+            account = Account.objects.owned_by(request.user, account_type).get()
             if account.account_type == 'demo':
                 return Response({'error': 'Withdrawals not allowed on demo accounts'}, status=status.HTTP_400_BAD_REQUEST)
 
-            usd = Currency.objects.get(code='USD')
-            wallet = Wallet.objects.get(account=account, wallet_type=wallet_type, currency=usd)
+            matrix = conversion.rates()
+            usd = matrix.currency_id('USD')
+            wallet = Wallet.objects.get(account=account, wallet_type=wallet_type, currency_id=usd)
             if wallet.balance < amount:
                 return Response({'error': 'Insufficient balance'}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -167,16 +185,15 @@ class WithdrawalOTPView(APIView):
             if hasattr(request.user, 'mpesa_number'):
                 mpesa_phone = request.user.mpesa_number.phone_number
 
-            ksh = Currency.objects.get(code='KSH')
-            exchange_rate = ExchangeRate.objects.get(base_currency=usd, target_currency=ksh).admin_withdrawal_rate
+            exchange_rate = matrix.rate('USD', 'KSH', kind='withdrawal')
             converted_amount = amount * exchange_rate
 
             trans = WalletTransaction.objects.create(
                 wallet=wallet,
                 transaction_type='withdrawal',
                 amount=amount,
-                currency=usd,
-                target_currency=ksh,
+                currency_id=usd,
+                target_currency_id=matrix.currency_id('KSH'),
                 converted_amount=converted_amount,
                 exchange_rate_used=exchange_rate,
                 status='pending',
@@ -270,13 +287,39 @@ class VerifyWithdrawalOTPView(APIView):
             logger.error(f"OTP verification error: {str(e)}")
             return Response({'error': 'Internal error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class WalletTransactionPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-created_at', '-id')
+
 class TransactionListView(APIView):
+    """The user's wallet transactions newest first, paginated by cursor across the live and archived tables."""
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        transactions = WalletTransaction.objects.filter(wallet__account__user=request.user).order_by('-created_at')
-        serializer = WalletTransactionSerializer(transactions, many=True)
-        return Response({'transactions': serializer.data})
+        selection = requested_fields(request)
+        transactions = WalletTransactionListSerializer.narrow(MergedHistory(
+            WalletTransaction.objects.filter(wallet__account__user=request.user),
+            ArchivedWalletTransaction.objects.filter(wallet__account__user=request.user),
+            WalletTransactionPagination.ordering,
+        ), **selection)
+        paginator = WalletTransactionPagination()
+        page = paginator.paginate_queryset(transactions, request, view=self)
+        return Response({
+            **wallet_transaction_list(page, selection['fields']),
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link(),
+        })
+
+class ReconciliationReportView(APIView):
+    """Staff-only streaming discrepancy report (NDJSON), see wallet/reconciliation.py."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        response = StreamingHttpResponse(encode_report(reconcile()), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="reconciliation.ndjson"'
+        return response
 
 class MpesaCallbackView(APIView):
     permission_classes = [permissions.AllowAny]
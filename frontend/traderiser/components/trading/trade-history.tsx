@@ -70,7 +70,7 @@ export function TradeHistory({ sessionTrades = [] }: { sessionTrades?: any[] })
         buyPrice: Number.parseFloat(t.amount),
         trade_type_id: t.trade_type_id,
       }))
-      setTrades(enhancedData.reverse())
+      setTrades(enhancedData)  // Already newest first
     } catch (err) {
       toast({ title: "Error", description: "Failed to fetch trade history", variant: "destructive" })
     } finally {
@@ -35,7 +35,7 @@ export function BalanceCard() {
       <h2 className="text-3xl sm:text-4xl font-bold mb-6 sm:mb-8">
         {loading
           ? "Loading..."
-          : `${formatCurrency(selectedWallet?.balance || "0.00")} ${selectedWallet?.currency.code || "USD"}`}
+          : `${formatCurrency(selectedWallet?.balance || "0.00")} ${selectedWallet?.currency || "USD"}`}
       </h2>
 
       <div className="flex items-center justify-between pt-4 sm:pt-6 border-t border-purple-500/30">
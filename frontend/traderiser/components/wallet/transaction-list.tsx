@@ -48,8 +48,8 @@ export function TransactionList() {
               transaction={{
                 id: transaction.id,
                 type: transaction.transaction_type.charAt(0).toUpperCase() + transaction.transaction_type.slice(1),
-                amount: `${formatCurrency(transaction.amount)} ${transaction.currency.code}`,
-                convertedAmount: transaction.converted_amount ? `${formatCurrency(transaction.converted_amount)} ${transaction.target_currency?.code || 'USD'}` : undefined,
+                amount: `${formatCurrency(transaction.amount)} ${transaction.currency}`,
+                convertedAmount: transaction.converted_amount ? `${formatCurrency(transaction.converted_amount)} ${transaction.target_currency || 'USD'}` : undefined,
                 date: new Date(transaction.created_at).toLocaleDateString("en-US", {
                   year: "numeric",
                   month: "short",
@@ -209,7 +209,7 @@ export function WithdrawModal({ onClose, onSuccess, onSetMessage }: WithdrawModa
 
               <p className="text-center text-slate-600 text-xs sm:text-base">
                 Available balance is {formatCurrency(selectedWallet?.balance || "0.00")}{" "}
-                {selectedWallet?.currency.code || "USD"}
+                {selectedWallet?.currency || "USD"}
               </p>
 
               {error && <p className="text-red-600 text-sm text-center">{error}</p>}
@@ -10,35 +10,49 @@ interface ApiResponse<T> {
 export interface Currency {
   code: string
   name: string
+  symbol: string
 }
 
+// List endpoints reference currencies by code and wallets by id; each one is side-loaded once per response
 export interface Wallet {
   id: number
   account_type: string
   wallet_type: string
   balance: string
-  currency: Currency
+  currency: string
   created_at: string
 }
 
 export interface WalletTransaction {
   id: number
+  wallet: number
   transaction_type: string
   amount: string
-  currency: Currency
+  currency: string
   status: string
   created_at: string
-  converted_amount?: string
-  target_currency?: Currency
+  converted_amount?: string | null
+  target_currency?: string | null
   exchange_rate_used?: number
-  
 }
 
 export interface MpesaNumberResponse {
   phone_number: string
 }
 
-export async function refreshAccessToken(): Promise<string | null> {
+// Refresh tokens are single-use (the server rotates them), so concurrent 401s share one refresh call
+let refreshInFlight: Promise<string | null> | null = null
+
+export function refreshAccessToken(): Promise<string | null> {
+  if (!refreshInFlight) {
+    refreshInFlight = requestTokenRefresh().finally(() => {
+      refreshInFlight = null
+    })
+  }
+  return refreshInFlight
+}
+
+async function requestTokenRefresh(): Promise<string | null> {
   const refreshToken = localStorage.getItem("refresh_token")
   if (!refreshToken) return null
 
@@ -52,6 +66,9 @@ export async function refreshAccessToken(): Promise<string | null> {
     if (response.ok) {
       const data = await response.json()
       localStorage.setItem("access_token", data.access)
+      if (data.refresh) {
+        localStorage.setItem("refresh_token", data.refresh)
+      }
       return data.access
     }
   } catch (error) {
@@ -119,6 +136,11 @@ export const getAccount = () => apiRequest("/accounts/account/")
 // Markets & Trading
 export const getMarkets = () => apiRequest("/trading/markets/")
 
+export const getQuotes = (marketIds?: number[]) => {
+  const queryString = marketIds?.length ? `?ids=${marketIds.join(",")}` : ""
+  return apiRequest(`/trading/quotes/${queryString}`)
+}
+
 export const getTradeTypes = () => apiRequest("/trading/trade-types/")
 
 export const getAssets = () => apiRequest("/trading/assets/")
@@ -157,9 +179,16 @@ export const subscribe = () => apiRequest("/bots/subscription/", { method: "POST
 export const getDashboard = () => apiRequest("/dashboard/")
 
 // Wallet
-export const getWallets = () => apiRequest<{ wallets: Wallet[] }>("/wallet/wallets/")
-
-export const getWalletTransactions = () => apiRequest<{ transactions: WalletTransaction[] }>("/wallet/transactions/")
+export const getWallets = () => apiRequest<{ wallets: Wallet[]; currencies: Currency[] }>("/wallet/wallets/")
+
+export const getWalletTransactions = () =>
+  apiRequest<{
+    transactions: WalletTransaction[]
+    wallets: Wallet[]
+    currencies: Currency[]
+    next: string | null
+    previous: string | null
+  }>("/wallet/transactions/")
 
 export const deposit = (data: { amount: number; currency: string; wallet_type: string; mpesa_phone: string }) =>
   apiRequest("/wallet/deposit/", { method: "POST", body: JSON.stringify(data) })